@@ -0,0 +1,10 @@
+// heartbeats over the page's live connection, for the dropout detection (see unpop/heartbeat.py)
+(function () {
+    var seconds = Number(document.currentScript.dataset.seconds);
+    if (typeof window.liveRecv === 'undefined') {
+        window.liveRecv = function () {};
+    }
+    setInterval(function () {
+        liveSend({type: 'heartbeat'});
+    }, seconds * 1000);
+})();
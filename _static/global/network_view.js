@@ -0,0 +1,49 @@
+// draws the admin report's network view: the cached layout of the network file with the
+// colors of one round (one character per node, see unpop/layout.py)
+(function () {
+    var COLORS = {r: '#c8281e', b: '#1e64c8', R: '#c8281e', B: '#1e64c8', '-': '#999999', x: '#dddddd'};
+    var HOLLOW = {R: true, B: true};
+
+    document.querySelectorAll('canvas[data-network-layout]').forEach(function (canvas) {
+        var state = canvas.dataset.networkState || '';
+        // the layout file is named by the hash of the network file, so the browser can keep it
+        fetch(canvas.dataset.networkLayout, {cache: 'force-cache'})
+            .then(function (response) { return response.json(); })
+            .then(function (layout) { draw(canvas, layout, state); });
+    });
+
+    function draw(canvas, layout, state) {
+        var ctx = canvas.getContext('2d');
+        var n = layout.x.length;
+        var radius = Math.max(1.5, Math.min(6, 120 / Math.sqrt(n)));
+        var margin = radius + 2;
+        var scale = (Math.min(canvas.width, canvas.height) - 2 * margin) / 1000;
+        function x(i) { return margin + layout.x[i] * scale; }
+        function y(i) { return margin + layout.y[i] * scale; }
+
+        ctx.strokeStyle = 'rgba(0, 0, 0, ' + Math.max(0.03, Math.min(0.3, 30 / layout.edges.length)) + ')';
+        ctx.lineWidth = 1;
+        ctx.beginPath();
+        layout.edges.forEach(function (edge) {
+            ctx.moveTo(x(edge[0]), y(edge[0]));
+            ctx.lineTo(x(edge[1]), y(edge[1]));
+        });
+        ctx.stroke();
+
+        for (var i = 0; i < n; i++) {
+            var code = state.charAt(i) || 'x';
+            ctx.beginPath();
+            ctx.arc(x(i), y(i), radius, 0, 2 * Math.PI);
+            if (HOLLOW[code]) {
+                ctx.fillStyle = '#ffffff';
+                ctx.fill();
+                ctx.strokeStyle = COLORS[code];
+                ctx.lineWidth = Math.max(1, radius / 2);
+                ctx.stroke();
+            } else {
+                ctx.fillStyle = COLORS[code] || COLORS.x;
+                ctx.fill();
+            }
+        }
+    }
+})();
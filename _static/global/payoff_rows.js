@@ -0,0 +1,6 @@
+// fills the payoff table rows that are served as a static file (payoff_table_asset, see shared/payoff_tables.py)
+document.querySelectorAll('[data-payoff-rows]').forEach(function (tbody) {
+    fetch(tbody.dataset.payoffRows)
+        .then(function (response) { return response.text(); })
+        .then(function (html) { tbody.innerHTML = html; });
+});
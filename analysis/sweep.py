@@ -0,0 +1,205 @@
+"""
+Parameter sweep: expected earnings, bonuses and cascades under simulated play.
+
+Every combination of the given parameter values (s, e, z, w, lambda1, lambda2 and the
+points-per-euro conversions) is simulated on every given network. Simulated players
+follow the payoffs of shared.payoffs.compute_utility: in round 1 everybody picks their
+own preference (minority Blue, majority Red), from round 2 on the best response to
+their neighbors' choices of the previous round; with probability --noise a player picks
+the other color instead. All repetitions of a combination run together as one sparse
+matrix product per round. Earnings are converted to euros as on the final results page
+(points / points_per_euro, between base_payment and max_payment; the bonus is what is
+above base_payment).
+
+Combinations run in a process pool. Results are cached on disk (--cache, one JSON file
+per combination), keyed by the parameters, the simulation settings and the hash of the
+network file, so rerunning a grid with a few new values only simulates those.
+
+python analysis/sweep.py --networks test_n20,test_n100_random --z 40,50,60 --lambda1 3,4.3
+python analysis/sweep.py --networks test_n100 --ppe-majority 150,200,250 --csv sweep.csv
+
+Needs numpy and scipy (pip install scipy); does not touch the oTree database.
+"""
+import argparse
+import csv
+import hashlib
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from tipping_points import PARAMETERS, Analysis, blue_payoff, load_network_file, project_dir, red_payoff, settings
+
+CONVERSIONS = ("points_per_euro_majority", "points_per_euro_minority")
+SIMULATION_VERSION = 1  # bump when the simulation changes, so cached results are not reused
+
+
+def network_digest(condition):
+    with open(os.path.join(project_dir, "networks", f"network_{condition}.json"), "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()[:12]
+
+
+def cache_key(task):
+    return hashlib.sha1(json.dumps(dict(task, version=SIMULATION_VERSION), sort_keys=True).encode()).hexdigest()
+
+
+def round_payoffs(analysis, blue, blue_neighbors):
+    """points of every node (rows) in every repetition (columns) for one round of choices"""
+    params = analysis.params
+    degree = analysis.degree[:, None]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p_blue = np.where(degree > 0, blue_neighbors / degree, 0.0)
+    majority = np.where(
+        blue,
+        np.where(degree > 0, blue_payoff(p_blue, params), 0.0),
+        # isolated nodes get s for Red, as in compute_utility
+        np.where(degree > 0, red_payoff(1 - p_blue, params), params["s"]),
+    )
+    minority = np.where(blue, params["e"], 0.0)
+    return np.where(analysis.is_minority[:, None], minority, majority)
+
+
+def simulate(task):
+    """earnings per node and final choices over the repetitions of one task"""
+    adjacency, is_minority = load_network_file(task["network"])
+    params = {name: task[name] for name in PARAMETERS}
+    analysis = Analysis(adjacency, is_minority, params)
+    n, repetitions = len(analysis), task["repetitions"]
+    rng = np.random.default_rng(task["seed"])
+
+    points = np.zeros((n, repetitions))
+    blue = np.repeat(is_minority[:, None], repetitions, axis=1)
+    blue_neighbors = None
+    for round_number in range(1, task["rounds"] + 1):
+        if round_number > 1:
+            # best response to last round: Blue for the minority, threshold for the majority
+            blue = blue_neighbors >= analysis.threshold[:, None]
+        blue ^= rng.random((n, repetitions)) < task["noise"]
+        blue_neighbors = analysis.adjacency @ blue.astype(np.int32)
+        points += round_payoffs(analysis, blue, blue_neighbors)
+    return analysis, points, blue
+
+
+def summarize(task, analysis, points, blue):
+    base, maximum = task["base_payment"], task["max_payment"]
+    row = {}
+    for role, members, conversion in (
+        ("majority", ~analysis.is_minority, task["points_per_euro_majority"]),
+        ("minority", analysis.is_minority, task["points_per_euro_minority"]),
+    ):
+        role_points = points[members].ravel()
+        euros = np.clip(role_points / conversion, base, maximum)
+        bonus = euros - base
+        row.update({
+            f"{role}_points": role_points.mean() if len(role_points) else 0.0,
+            f"{role}_euros": euros.mean() if len(euros) else 0.0,
+            f"{role}_bonus_p10": np.percentile(bonus, 10) if len(bonus) else 0.0,
+            f"{role}_bonus_p50": np.percentile(bonus, 50) if len(bonus) else 0.0,
+            f"{role}_bonus_p90": np.percentile(bonus, 90) if len(bonus) else 0.0,
+            f"{role}_at_base": (euros <= base).mean() if len(euros) else 0.0,
+            f"{role}_at_max": (euros >= maximum).mean() if len(euros) else 0.0,
+        })
+    majority_blue = blue[~analysis.is_minority].mean(axis=0)
+    row["final_blue_majority"] = majority_blue.mean()
+    row["cascade_rate"] = (majority_blue >= task["cascade_share"]).mean()
+    return {key: round(float(value), 4) for key, value in row.items()}
+
+
+def run(task):
+    return summarize(task, *simulate(task))
+
+
+def tasks_for(args):
+    grid = {name: getattr(args, name) for name in PARAMETERS + CONVERSIONS}
+    common = dict(
+        rounds=args.rounds,
+        repetitions=args.repetitions,
+        noise=args.noise,
+        seed=args.seed,
+        cascade_share=args.cascade_share,
+        base_payment=settings.base_payment,
+        max_payment=settings.max_payment,
+    )
+    for network in args.networks:
+        digest = network_digest(network)
+        for values in itertools.product(*grid.values()):
+            yield dict(common, network=network, network_digest=digest, **dict(zip(grid, values)))
+
+
+def sweep(tasks, cache_dir, processes):
+    """results of all tasks, in order; only the ones not in the cache are simulated"""
+    os.makedirs(cache_dir, exist_ok=True)
+    results = {}
+    todo = []
+    for task in tasks:
+        path = os.path.join(cache_dir, cache_key(task) + ".json")
+        if os.path.exists(path):
+            with open(path) as f:
+                results[path] = json.load(f)
+        else:
+            todo.append((path, task))
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        for (path, task), result in zip(todo, pool.map(run, [task for _, task in todo])):
+            with open(path + ".tmp", "w") as f:
+                json.dump(result, f)
+            os.replace(path + ".tmp", path)
+            results[path] = result
+    return [(task, results[os.path.join(cache_dir, cache_key(task) + ".json")]) for task in tasks], len(todo)
+
+
+def print_results(rows, varied):
+    columns = ["network"] + varied + [
+        "majority_euros", "majority_bonus_p50", "majority_at_max",
+        "minority_euros", "minority_bonus_p50", "minority_at_max",
+        "final_blue_majority", "cascade_rate",
+    ]
+    table = [[str(dict(task, **result)[column]) for column in columns] for task, result in rows]
+    widths = [max(len(cell) for cell in cells) for cells in zip(columns, *table)]
+    for cells in [columns] + table:
+        print("  ".join(cell.rjust(width) for cell, width in zip(cells, widths)))
+
+
+def float_list(value):
+    return [float(v) for v in value.split(",")]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--networks", required=True, type=lambda v: v.split(","),
+                        help="comma-separated network conditions, e.g. test_n20,test_n100_random")
+    for name in PARAMETERS + CONVERSIONS:
+        flag = name.replace("points_per_euro_", "ppe-")
+        parser.add_argument(f"--{flag}", dest=name, type=float_list, default=[getattr(settings, name)],
+                            help="comma-separated values")
+    parser.add_argument("--rounds", type=int, default=settings.num_rounds)
+    parser.add_argument("--repetitions", type=int, default=100, help="simulated sessions per combination")
+    parser.add_argument("--noise", type=float, default=0.05, help="probability of not playing the best response")
+    parser.add_argument("--cascade-share", type=float, default=0.9,
+                        help="share of the majority on Blue in the last round that counts as a cascade")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None, help="default: one per CPU")
+    parser.add_argument("--cache", default=os.path.join(project_dir, "analysis", "sweep_cache"))
+    parser.add_argument("--csv", help="also write all results to this CSV file")
+    args = parser.parse_args()
+
+    tasks = list(tasks_for(args))
+    start = time.perf_counter()
+    rows, simulated = sweep(tasks, args.cache, args.processes)
+    print(f"{len(tasks)} combinations, {simulated} simulated, {len(tasks) - simulated} from the cache "
+          f"({time.perf_counter() - start:.1f} s)")
+    varied = [name for name in PARAMETERS + CONVERSIONS if len(getattr(args, name)) > 1]
+    print_results(rows, varied)
+
+    if args.csv:
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0][0]) + list(rows[0][1]))
+            writer.writeheader()
+            for task, result in rows:
+                writer.writerow(dict(task, **result))
+
+
+if __name__ == "__main__":
+    main()
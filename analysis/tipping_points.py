@@ -0,0 +1,300 @@
+"""
+Tipping points of a network under the game's payoffs.
+
+A majority player with degree d switches to Blue when Blue pays more than Red given
+how many of their d neighbors choose Blue (the payoffs of shared.payoffs.compute_utility,
+with the parameters of settings.py unless overridden). That gives every majority node a
+threshold: the smallest number of Blue neighbors k*(d) for which Blue is the best response.
+Minority players always choose Blue (e > 0), majority players start on Red.
+
+Starting from that, best-response dynamics run until nothing changes: every iteration
+adds the rows of the sparse adjacency of the nodes that just turned Blue to the Blue
+neighbor counts, and turns Blue whoever reached their threshold. The share of the
+majority that ends up Blue is the cascade size. A seed set is a set of majority nodes
+forced to Blue; the greedy search adds, one at a time, the candidate that grows the
+cascade most and then drops every seed that is not needed, so the result is a minimal
+(not necessarily minimum) seed set reaching the target cascade size.
+
+python analysis/tipping_points.py --network test_n100_random
+python analysis/tipping_points.py --random 10000 --mean-degree 8 --minority 0.1 --target 0.9
+python analysis/tipping_points.py --random 5000 --mean-degree 8 --seed 1 --save mass_n5000
+python analysis/tipping_points.py --network test_n20 --z 60 --lambda1 3
+
+Needs numpy and scipy (pip install scipy); does not touch the oTree database.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+try:
+    import scipy.sparse as sp
+except ImportError:
+    sys.exit("tipping_points.py needs scipy: pip install scipy")
+
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_dir)
+import settings  # noqa: E402
+from shared.payoffs import wstar, zstar  # noqa: E402
+
+PARAMETERS = ("s", "e", "z", "w", "lambda1", "lambda2")
+
+
+def default_parameters():
+    return {name: getattr(settings, name) for name in PARAMETERS}
+
+
+def blue_payoff(p_blue, params):
+    """majority payoff for Blue with a share p_blue of Blue neighbors (as compute_utility)"""
+    return zstar(p_blue, exp=np.exp, z=params["z"], lambda1=params["lambda1"])
+
+
+def red_payoff(p_red, params):
+    """majority payoff for Red with a share p_red of Red neighbors (as compute_utility)"""
+    return params["s"] + wstar(p_red, exp=np.exp, w=params["w"], lambda2=params["lambda2"])
+
+
+def degree_thresholds(degrees, params):
+    """
+    {degree: k*} for these degrees: the fewest Blue neighbors (all others Red) for which
+    a majority player prefers Blue; degree + 1 if they never do (e.g. isolated nodes,
+    which get s for Red and nothing for Blue)
+    """
+    thresholds = {}
+    for d in np.unique(degrees):
+        d = int(d)
+        if d == 0:
+            thresholds[d] = 1
+            continue
+        k = np.arange(d + 1)
+        prefers_blue = blue_payoff(k / d, params) > red_payoff((d - k) / d, params)
+        thresholds[d] = int(np.argmax(prefers_blue)) if prefers_blue.any() else d + 1
+    return thresholds
+
+
+def critical_share(params, tolerance=1e-9):
+    """share of Blue neighbors above which Blue is the best response (None if never)"""
+    low, high = 0.0, 1.0
+    if blue_payoff(high, params) <= red_payoff(0.0, params):
+        return None
+    while high - low > tolerance:
+        mid = (low + high) / 2
+        if blue_payoff(mid, params) > red_payoff(1 - mid, params):
+            high = mid
+        else:
+            low = mid
+    return high
+
+
+class Analysis:
+    """a network (sparse adjacency, roles) with the per-node thresholds under params"""
+
+    def __init__(self, adjacency, is_minority, params):
+        self.adjacency = sp.csr_matrix(adjacency, dtype=np.int32)
+        self.is_minority = np.asarray(is_minority, dtype=bool)
+        self.params = params
+        self.degree = np.diff(self.adjacency.indptr)
+        by_degree = degree_thresholds(self.degree, params)
+        self.threshold = np.array([by_degree[d] for d in self.degree], dtype=np.int64)
+        self.threshold[self.is_minority] = 0  # always Blue
+
+    def __len__(self):
+        return len(self.is_minority)
+
+    def neighbors_of(self, nodes):
+        """the neighbors of these nodes, concatenated (their rows of the sparse adjacency)"""
+        starts = self.adjacency.indptr[nodes]
+        lengths = self.degree[nodes]
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        return self.adjacency.indices[offsets]
+
+    def cascade(self, seeds=(), start=None):
+        """
+        fixed point of the best-response dynamics with the seeds on Blue, starting from the
+        minority alone or from start, the (blue, blue_neighbors) of an earlier fixed point;
+        returns (blue, blue_neighbors, iterations)
+        """
+        n = len(self)
+        seeds = np.asarray(seeds, dtype=np.int64)
+        if start is None:
+            blue = np.zeros(n, dtype=bool)
+            blue_neighbors = np.zeros(n, dtype=np.int64)
+            new = np.union1d(np.flatnonzero(self.threshold == 0), seeds)
+        else:
+            blue, blue_neighbors = start[0].copy(), start[1].copy()
+            new = seeds[~blue[seeds]]
+        iterations = 0
+        # nodes only ever turn Blue, so each round of the dynamics only has to look at the
+        # neighbors of the nodes that turned Blue in the previous one
+        while len(new):
+            blue[new] = True
+            reached = self.neighbors_of(new)
+            np.add.at(blue_neighbors, reached, 1)
+            new = np.unique(reached[~blue[reached] & (blue_neighbors[reached] >= self.threshold[reached])])
+            iterations += 1
+        # the first wave are the minority and the seeds themselves
+        return blue, blue_neighbors, max(iterations - 1, 0)
+
+    def cascade_share(self, blue):
+        majority = ~self.is_minority
+        return blue[majority].sum() / max(majority.sum(), 1)
+
+    def candidates(self, blue, blue_neighbors, limit):
+        """
+        Red majority nodes most likely to tip others: the ones with the most Red majority
+        neighbors that are a single Blue neighbor away from their threshold
+        """
+        red_majority = ~blue & ~self.is_minority
+        one_short = (red_majority & (self.threshold - blue_neighbors == 1)).astype(np.int32)
+        score = (self.adjacency @ one_short).astype(np.float64)
+        score += self.degree / (self.degree.max() + 1)  # ties: the better connected node
+        score[~red_majority] = -1
+        order = np.argsort(-score)[:limit]
+        return order[score[order] >= 0]
+
+    def greedy_seeds(self, target=1.0, max_seeds=None, candidates=50):
+        """a minimal seed set whose cascade reaches the target share of the majority"""
+        max_seeds = len(self) if max_seeds is None else max_seeds
+        seeds = []
+        blue, blue_neighbors, _ = self.cascade()
+        while self.cascade_share(blue) < target and len(seeds) < max_seeds:
+            best = None
+            for node in self.candidates(blue, blue_neighbors, candidates):
+                # adding a seed can only grow the cascade, so continue from the current one
+                result = self.cascade([node], (blue, blue_neighbors))
+                if best is None or result[0].sum() > best[1][0].sum():
+                    best = int(node), result
+            if best is None:
+                break
+            seeds.append(best[0])
+            blue, blue_neighbors, _ = best[1]
+        if self.cascade_share(blue) < target:
+            return seeds, False
+
+        # drop the seeds the target does not need (later seeds may have made earlier ones redundant)
+        for node in list(seeds):
+            rest = [seed for seed in seeds if seed != node]
+            if self.cascade_share(self.cascade(rest)[0]) >= target:
+                seeds = rest
+        return seeds, True
+
+
+def network_file(condition):
+    return os.path.join(project_dir, "networks", f"network_{condition}.json")
+
+
+def load_network_file(condition):
+    with open(network_file(condition)) as f:
+        net = json.load(f)
+    is_minority = np.asarray(net["role_vector"]) == 1
+    if "edges" in net:
+        # sparse network file (see unpop/network.py)
+        n = len(is_minority)
+        edges = np.asarray(net["edges"], dtype=np.int64).reshape(-1, 2)
+        i, j = edges[:, 0], edges[:, 1]
+        adjacency = sp.coo_matrix((np.ones(2 * len(i), dtype=np.int8), (np.r_[i, j], np.r_[j, i])), shape=(n, n))
+        adjacency = adjacency.tocsr()
+        adjacency.data[:] = 1
+    else:
+        adjacency = sp.csr_matrix(np.asarray(net["adj_matrix"], dtype=np.int8))
+    return adjacency, is_minority
+
+
+def save_network_file(condition, adjacency, is_minority):
+    """write the network as a sparse network file (an edge list), for large networks"""
+    upper = sp.triu(adjacency, k=1).tocoo()
+    net = dict(
+        edges=np.column_stack([upper.row, upper.col]).tolist(),
+        role_vector=is_minority.astype(int).tolist(),
+    )
+    path = network_file(condition)
+    with open(path, "w") as f:
+        json.dump(net, f, separators=(",", ":"))
+    return path
+
+
+def random_network(n, mean_degree, minority_share, seed):
+    """undirected random graph with n nodes and about mean_degree neighbors per node"""
+    rng = np.random.default_rng(seed)
+    m = int(n * mean_degree / 2)
+    i = rng.integers(0, n, m)
+    j = rng.integers(0, n, m)
+    keep = i != j
+    i, j = i[keep], j[keep]
+    adjacency = sp.coo_matrix((np.ones(2 * len(i), dtype=np.int8), (np.r_[i, j], np.r_[j, i])), shape=(n, n))
+    adjacency = adjacency.tocsr()
+    adjacency.data[:] = 1  # duplicate pairs were summed
+    is_minority = np.zeros(n, dtype=bool)
+    is_minority[rng.choice(n, int(round(minority_share * n)), replace=False)] = True
+    return adjacency, is_minority
+
+
+def report(analysis, target, max_seeds, candidates):
+    n = len(analysis)
+    majority = ~analysis.is_minority
+    print(f"{n} nodes, {analysis.adjacency.nnz // 2} edges, {analysis.is_minority.sum()} minority")
+    print("parameters: " + ", ".join(f"{name}={analysis.params[name]}" for name in PARAMETERS))
+    share = critical_share(analysis.params)
+    if share is None:
+        print("Blue is never the best response for the majority")
+    else:
+        print(f"majority prefers Blue above {share:.3f} Blue neighbors")
+
+    print(f"{'degree':>8} {'nodes':>7} {'threshold':>10}")
+    degrees, counts = np.unique(analysis.degree[majority], return_counts=True)
+    by_degree = degree_thresholds(degrees, analysis.params)
+    for d, count in zip(degrees, counts):
+        k = by_degree[int(d)]
+        print(f"{d:>8} {count:>7} {k if k <= d else 'never':>10}")
+
+    start = time.perf_counter()
+    blue, _, iterations = analysis.cascade()
+    print(f"cascade from the minority alone: {analysis.cascade_share(blue):.1%} of the majority "
+          f"Blue after {iterations} iterations ({(time.perf_counter() - start) * 1000:.1f} ms)")
+
+    start = time.perf_counter()
+    seeds, reached = analysis.greedy_seeds(target, max_seeds, candidates)
+    elapsed = time.perf_counter() - start
+    if reached:
+        print(f"minimal seed set for {target:.0%} of the majority: {len(seeds)} nodes ({elapsed:.2f} s)")
+        if len(seeds) <= 50:
+            print(f"  seeds: {sorted(seeds)}")
+        degrees, counts = np.unique(analysis.degree[seeds], return_counts=True)
+        if seeds:
+            print("  seeds by degree: " + ", ".join(f"{d}: {c}" for d, c in zip(degrees[::-1], counts[::-1])))
+    else:
+        print(f"no seed set of at most {max_seeds} nodes reaches {target:.0%} of the majority "
+              f"({len(seeds)} tried, {elapsed:.2f} s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--network", help="network condition, e.g. test_n100_random (networks/network_<condition>.json)")
+    source.add_argument("--random", type=int, metavar="N", help="a random network with N nodes instead")
+    parser.add_argument("--mean-degree", type=float, default=8)
+    parser.add_argument("--minority", type=float, default=settings.p_minority, help="minority share (--random)")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random network")
+    parser.add_argument("--save", metavar="CONDITION", help="save the random network as networks/network_<CONDITION>.json (--random)")
+    parser.add_argument("--target", type=float, default=1.0, help="cascade size the seed set must reach")
+    parser.add_argument("--max-seeds", type=int, default=None)
+    parser.add_argument("--candidates", type=int, default=50, help="candidates evaluated per greedy step")
+    for name in PARAMETERS:
+        parser.add_argument(f"--{name}", type=float, default=getattr(settings, name))
+    args = parser.parse_args()
+
+    if args.network:
+        adjacency, is_minority = load_network_file(args.network)
+    else:
+        adjacency, is_minority = random_network(args.random, args.mean_degree, args.minority, args.seed)
+        if args.save:
+            print(f"saved {save_network_file(args.save, adjacency, is_minority)}")
+    params = {name: getattr(args, name) for name in PARAMETERS}
+    report(Analysis(adjacency, is_minority, params), args.target, args.max_seeds, args.candidates)
+
+
+if __name__ == "__main__":
+    main()
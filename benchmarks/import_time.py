@@ -0,0 +1,81 @@
+"""
+Cold-start import time of the apps and per-call time of the payoff model.
+
+Every app is imported in fresh interpreters (the median of --runs), which is what a
+server restart or an "otree test" run pays for it on top of oTree itself; the time of
+"import otree.api" alone is reported for comparison, and so are the packages of the project
+each import loads (an app should not load the other apps). The payoff functions
+(shared/payoffs.py) are timed with timeit.
+
+python benchmarks/import_time.py --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import timeit
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT = (
+    "import sys, time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start); "
+    "print(*sorted(name for name in sys.modules if '.' not in name and name in {packages!r}))"
+)
+
+
+def project_packages():
+    return {
+        name for name in os.listdir(REPO)
+        if os.path.exists(os.path.join(REPO, name, "__init__.py"))
+    }
+
+
+def import_seconds(workdir, module, runs):
+    """median import time of module, and the packages of the project it imported"""
+    times = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", IMPORT.format(module=module, packages=project_packages())],
+            cwd=workdir, capture_output=True, text=True, check=True,
+        ).stdout
+        seconds, packages = out.splitlines()[-2:]
+        times.append(float(seconds))
+    return statistics.median(times), packages.split()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--modules", default="otree.api,shared.payoffs,unpop,comprehension,consent")
+    args = parser.parse_args()
+
+    # importing oTree creates db.sqlite3 in the working directory: link the project
+    # into a scratch directory, as round_close.py does
+    workdir = tempfile.mkdtemp(prefix="import_time_")
+    for name in os.listdir(REPO):
+        if name not in ("db.sqlite3", "otree_log"):
+            os.symlink(os.path.join(REPO, name), os.path.join(workdir, name))
+
+    for module in args.modules.split(","):
+        seconds, packages = import_seconds(workdir, module, args.runs)
+        print(f"{'import ' + module:>28}: median {1000 * seconds:7.1f} ms | imports {', '.join(packages)}")
+    created = sorted(set(os.listdir(workdir)) - set(os.listdir(REPO)))
+    print(f"{'files created by imports':>28}: {', '.join(created) or 'none'}")
+
+    os.chdir(workdir)
+    sys.path.insert(0, workdir)
+    from shared.payoffs import compute_utility, payoff_table
+
+    neighbors = [True, False, True, True, False, True, False, True]
+    for label, stmt in [
+        ("compute_utility (majority)", lambda: compute_utility(True, "Red", neighbors)),
+        ("payoff_table(8)", lambda: payoff_table(8)),
+    ]:
+        number, total = timeit.Timer(stmt).autorange()
+        print(f"{label:>28}: {1e6 * total / number:7.2f} us per call")
+
+
+if __name__ == "__main__":
+    main()
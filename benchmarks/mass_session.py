@@ -0,0 +1,157 @@
+"""
+Simulate rounds of a mass session (5,000 participants) and check them against a latency budget.
+
+Every round, a sample of the participants goes through the round's page methods
+(DecisionPage, its submission, ResultsWaitPage, ResultsPage), every call in a request of
+its own as in query_count.py, and the round is closed. With --live, the sample sends its
+choices to LiveRoundPage.live_method instead (unpop/live.py) and the last choice closes
+the round. Reported per round: the median and 95th percentile of every page method, the
+round close, and the server time the round costs (mean page time x participants + round
+close), which is what one server process has to get through within the round (a session
+stays on one process, see deploy/multiserver.py). The script exits with status 1 if a 95th
+percentile exceeds --page-budget-ms, the round close exceeds --close-budget-ms or the
+server time of a round exceeds --round-budget-s (by default the decision timeout of a
+round).
+
+python benchmarks/mass_session.py --network mass_n5000 --rounds 3 --sample 500
+python benchmarks/mass_session.py --network mass_n5000 --rounds 3 --sample 500 --live
+
+Uses SQLite by default (a fresh db.sqlite3 in a temporary directory); set DATABASE_URL
+to run on PostgreSQL (use a scratch database: sessions are created in it).
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+from round_close import prepare_session, setup_otree
+
+
+def timed_request(func, player_id):
+    """seconds of func(player) in a request of its own, commit included"""
+    from otree.database import db
+
+    import unpop
+
+    db.commit()
+    db.close()
+    start = time.perf_counter()
+    func(unpop.Player.objects_get(id=player_id))
+    db.commit()
+    return time.perf_counter() - start
+
+
+def page_methods(round_number, live):
+    import unpop
+
+    def submit_decision(player):
+        player.choice = random.random() < 0.5
+        unpop.DecisionPage.before_next_page(player, False)
+
+    def send_choice(player):
+        unpop.live.live_method(player, dict(type="choice", round=round_number, choice=random.random() < 0.5))
+
+    if live:
+        return {"LiveRoundPage.live_method (choice)": send_choice}
+    return {
+        "DecisionPage.vars_for_template": unpop.DecisionPage.vars_for_template,
+        "DecisionPage.before_next_page": submit_decision,
+        "ResultsWaitPage.vars_for_template": unpop.ResultsWaitPage.vars_for_template,
+        "ResultsPage.vars_for_template": unpop.ResultsPage.vars_for_template,
+    }
+
+
+def open_live_round(first_group_id, group_id, sample):
+    """make group's round the one being played, with the sample yet to choose"""
+    from otree.database import db
+
+    import unpop
+
+    unpop.Group.objects_get(id=first_group_id).live_round = unpop.Group.objects_get(id=group_id).round_number
+    unpop.Group.objects_get(id=group_id).opened_at = time.time()
+    for player_id in sample:
+        unpop.Player.objects_get(id=player_id).choice = None
+    db.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--network", default="mass_n5000")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--sample", type=int, default=500, help="participants timed per round")
+    parser.add_argument("--dropout-share", type=float, default=0.1)
+    parser.add_argument("--page-budget-ms", type=float, default=100)
+    parser.add_argument("--close-budget-ms", type=float, default=10000)
+    parser.add_argument("--round-budget-s", type=float, default=60)
+    parser.add_argument("--live", action="store_true", help="rounds played on LiveRoundPage")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mass_session_")
+    setup_otree(workdir)
+    from otree.database import db, engine
+
+    import unpop
+
+    start = time.perf_counter()
+    # from round 2 on, so that every page reads the previous round
+    first_group, *groups = prepare_session(args.network, args.rounds + 1, args.dropout_share)
+    first_group.session.vars["group_formed"] = True
+    first_round = {p.participant_id: p.id for p in first_group.get_players()}
+    rounds = [
+        (
+            group.id,
+            group.round_number,
+            {p.id: first_round[p.participant_id] for p in group.get_players() if not p.participant.is_dropout},
+        )
+        for group in groups
+    ]
+    first_group_id = first_group.id
+    db.commit()
+    print(f"backend={engine.url.get_backend_name()} network={args.network} "
+          f"players={len(first_round)} (session created in {time.perf_counter() - start:.0f} s)")
+
+    within_budget = True
+    rng = random.Random(1)
+    for group_id, round_number, player_ids in rounds:
+        sample = rng.sample(sorted(player_ids), min(args.sample, len(player_ids)))
+        methods = page_methods(round_number, args.live)
+        timings = {name: [] for name in methods}
+
+        if args.live:
+            # live_method is called with the round-1 player; the last choice closes the round
+            open_live_round(first_group_id, group_id, sample)
+            (name, func), = methods.items()
+            for player_id in sample[:-1]:
+                timings[name].append(timed_request(func, player_ids[player_id]))
+            close = timed_request(func, player_ids[sample[-1]])
+            if unpop.Group.objects_get(id=first_group_id).live_round != round_number + 1:
+                sys.exit(f"round {round_number} did not close on the last choice")
+        else:
+            for name, func in methods.items():
+                for player_id in sample:
+                    timings[name].append(timed_request(func, player_id))
+            db.close()
+            start = time.perf_counter()
+            unpop.Group.objects_get(id=group_id).set_first_stage_earnings()
+            db.commit()
+            close = time.perf_counter() - start
+
+        busy = close + len(player_ids) * sum(statistics.mean(t) for t in timings.values())
+        print(f"round {round_number}: close {1000 * close:.0f} ms, "
+              f"server time {busy:.1f} s for {len(player_ids)} participants")
+        for name, t in timings.items():
+            p95 = statistics.quantiles(t, n=20)[-1]
+            within_budget = within_budget and 1000 * p95 <= args.page_budget_ms
+            print(f"{name:>36}: median {1000 * statistics.median(t):6.1f} ms | p95 {1000 * p95:6.1f} ms")
+        within_budget = within_budget and 1000 * close <= args.close_budget_ms and busy <= args.round_budget_s
+
+    if not within_budget:
+        print(f"over budget (pages {args.page_budget_ms} ms at p95, round close {args.close_budget_ms} ms, "
+              f"server time {args.round_budget_s} s per round)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
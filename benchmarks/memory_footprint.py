@@ -0,0 +1,101 @@
+"""
+Report how much session and participant state the sessions in a database carry.
+
+oTree pickles session.vars and participant.vars (including the PARTICIPANT_FIELDS)
+into one column each and writes the whole pickle back whenever they are touched,
+so their size is paid on every save, not just once. For every session this prints
+the serialized bytes of session.vars (per key) and of participant.vars (per field:
+total over all participants, mean and max per participant).
+
+python benchmarks/memory_footprint.py                 # db.sqlite3 in the current folder
+python benchmarks/memory_footprint.py --session <code>
+DATABASE_URL=postgres://... python benchmarks/memory_footprint.py
+"""
+import argparse
+import binascii
+import os
+import pickle
+from collections import defaultdict
+
+from sqlalchemy import create_engine, text
+
+
+def database_url():
+    url = os.environ.get("DATABASE_URL", "sqlite:///db.sqlite3")
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+def unpickle(stored):
+    # same encoding as oTree's _PickleField: base64 of a pickled dict
+    return pickle.loads(binascii.a2b_base64(stored.encode("utf-8")))
+
+
+def size(value):
+    return len(pickle.dumps(value))
+
+
+def session_footprint(conn, session_id):
+    stored_session = conn.execute(
+        text("SELECT _vars FROM otree_session WHERE id = :id"), dict(id=session_id)
+    ).scalar()
+    session_vars = unpickle(stored_session)
+
+    fields = defaultdict(list)
+    participant_bytes = []
+    for (stored,) in conn.execute(
+        text("SELECT _vars FROM otree_participant WHERE session_id = :id"), dict(id=session_id)
+    ):
+        participant_bytes.append(len(stored))
+        for field, value in unpickle(stored).items():
+            fields[field].append(size(value))
+
+    return dict(
+        session_bytes=len(stored_session),
+        session_keys={key: size(value) for key, value in session_vars.items()},
+        participant_bytes=participant_bytes,
+        participant_fields=fields,
+    )
+
+
+def print_footprint(code, config_name, footprint):
+    n = len(footprint["participant_bytes"])
+    total_participants = sum(footprint["participant_bytes"])
+    print(f"session {code} ({config_name}, {n} participants): "
+          f"{footprint['session_bytes'] + total_participants} bytes stored")
+    print(f"  session.vars: {footprint['session_bytes']} bytes")
+    for key, nbytes in sorted(footprint["session_keys"].items(), key=lambda kv: -kv[1]):
+        print(f"    {key:<30} {nbytes:>10}")
+    if not n:
+        return
+    print(f"  participant.vars: {total_participants} bytes "
+          f"({total_participants / n:.0f} per participant)")
+    print(f"    {'field':<30} {'total':>10} {'mean':>8} {'max':>8}")
+    fields = footprint["participant_fields"]
+    for field, sizes in sorted(fields.items(), key=lambda kv: -sum(kv[1])):
+        print(f"    {field:<30} {sum(sizes):>10} {sum(sizes) / n:>8.0f} {max(sizes):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--session", help="only this session code")
+    args = parser.parse_args()
+
+    engine = create_engine(database_url())
+    with engine.connect() as conn:
+        query = "SELECT id, code, config FROM otree_session"
+        params = {}
+        if args.session:
+            query += " WHERE code = :code"
+            params["code"] = args.session
+        sessions = conn.execute(text(query + " ORDER BY id"), params).fetchall()
+        if not sessions:
+            print("no sessions found")
+        for session_id, code, stored_config in sessions:
+            config_name = unpickle(stored_config).get("name") if stored_config else "?"
+            print_footprint(code, config_name, session_footprint(conn, session_id))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Count the SQL queries of the unpop pages and the round close for networks of different sizes.
+
+Every page method is called as in a request of its own (a fresh ORM session that starts
+from the player), and the queries it makes are counted. With the group prefetch
+(unpop/prefetch.py) the counts must not depend on the size of the group: the script
+exits with status 1 if any of them does.
+
+python benchmarks/query_count.py --networks test_n10,test_n50,test_n100
+
+Uses SQLite by default (a fresh db.sqlite3 in a temporary directory); set DATABASE_URL
+to count on PostgreSQL (use a scratch database: sessions are created in it).
+"""
+import argparse
+import sys
+import tempfile
+
+from round_close import prepare_session, setup_otree
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        from sqlalchemy import event
+
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self.on_execute)
+
+    def on_execute(self, *args, **kwargs):
+        self.count += 1
+
+
+def count_queries(counter, func, player_id):
+    """queries of func(player) in a request of its own, after the player is loaded"""
+    from otree.database import db
+
+    import unpop
+
+    db.commit()
+    db.close()  # the next request starts without loaded objects
+    player = unpop.Player.objects_get(id=player_id)
+    before = counter.count
+    func(player)
+    db.commit()
+    return counter.count - before
+
+
+def page_methods():
+    import unpop
+
+    return {
+        "DecisionPage.vars_for_template": unpop.DecisionPage.vars_for_template,
+        "ResultsWaitPage.vars_for_template": unpop.ResultsWaitPage.vars_for_template,
+        "ResultsPage.vars_for_template": unpop.ResultsPage.vars_for_template,
+        "Group.set_first_stage_earnings": lambda player: player.group.set_first_stage_earnings(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--networks", default="test_n10,test_n50,test_n100")
+    parser.add_argument("--dropout-share", type=float, default=0.1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="query_count_")
+    setup_otree(workdir)
+    from otree.database import engine
+
+    counter = QueryCounter(engine)
+    counts = {}
+    for network in args.networks.split(","):
+        # round 2, so that the previous round is read as well
+        group = prepare_session(network, 2, args.dropout_share)[1]
+        player_id = group.get_players()[0].id
+        counts[network] = {
+            name: count_queries(counter, func, player_id)
+            for name, func in page_methods().items()
+        }
+
+    networks = list(counts)
+    print(f"backend={engine.url.get_backend_name()}")
+    print(f"{'':>34}" + "".join(f"{network:>18}" for network in networks))
+    constant = True
+    for name in page_methods():
+        row = [counts[network][name] for network in networks]
+        constant = constant and len(set(row)) == 1
+        print(f"{name:>34}" + "".join(f"{count:>18}" for count in row))
+    if not constant:
+        print("query counts depend on the size of the group")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
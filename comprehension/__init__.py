@@ -1,16 +1,10 @@
+from functools import lru_cache
+
 from otree.api import *
 
 #import central parameters
 from settings import (
     title as TITLE,
-    majority_role as MAJORITY,
-    minority_role as MINORITY,
-    s as S,
-    e as E,
-    z as Z,
-    w as W,
-    lambda1 as L1,
-    lambda2 as L2,
     base_payment as base,
     max_payment as maxp,
     points_per_euro_majority as PPE1,
@@ -18,8 +12,11 @@ from settings import (
     num_rounds as nrounds,
     testing as TEST,
 )
-# import custom functions
-from unpop.functions import compute_utility, payoff_table
+# import the payoff model and the helpers it shares with unpop (without importing unpop)
+from shared import payoffs, profiling
+from shared.payoffs import compute_utility
+from shared.payoff_tables import payoff_table_vars
+from shared.events import log_event, log_shown, log_submit
 
 doc = """
 They receive a brief (role-based) instruction, after which they complete a set of comprehension questions.
@@ -30,14 +27,14 @@ class Constants(BaseConstants):
     name_in_url = 'comprehension'
     players_per_group = None
     num_rounds = 1
-    majority = MAJORITY
-    minority = MINORITY
-    s = S
-    e = E
-    z = Z
-    w = W
-    lambda1 = L1
-    lambda2 = L2
+    majority = payoffs.MAJORITY
+    minority = payoffs.MINORITY
+    s = payoffs.S
+    e = payoffs.E
+    z = payoffs.Z
+    w = payoffs.W
+    lambda1 = payoffs.LAMBDA1
+    lambda2 = payoffs.LAMBDA2
     base_payment = base
     max_payment = maxp
     points_per_euro_majority = PPE1
@@ -48,6 +45,38 @@ class Constants(BaseConstants):
     comprehension_timeout_seconds = 5*60
     max_retries = 3
 
+DEGREE = 2  # the comprehension questions (and the introduction) assume 2 neighbors
+
+LABELS = {
+    'q_red_zero': '<b>A</b>',
+    'q_blue_zero': '<b>B</b>',
+    'q_red_half': '<b>C</b>',
+    'q_blue_half': '<b>D</b>',
+}
+
+
+@lru_cache(maxsize=None)
+def correct_answers(role):
+    """the answers to the four questions for a role; the same for every session of a process"""
+    neighbors_all_blue = [True] * DEGREE
+    neighbors_half_half = [True] * (DEGREE // 2) + [False] * (DEGREE - DEGREE // 2)
+    return {
+        'q_red_zero': round(compute_utility(False, role, neighbors_all_blue)),
+        'q_blue_zero': round(compute_utility(True, role, neighbors_all_blue)),
+        'q_red_half': round(compute_utility(False, role, neighbors_half_half)),
+        'q_blue_half': round(compute_utility(True, role, neighbors_half_half)),
+    }
+
+
+def explanation(role):
+    if role == Constants.minority:
+        return "Your payoff only depends on your own shirt choice (Table 1)."
+    return (
+        "Your total points = reward for picking a color "
+        "(Table 1) + reward for matching neighbors (Table 2)."
+    )
+
+
 class Subsession(BaseSubsession):
     pass
 
@@ -67,6 +96,9 @@ class Player(BasePlayer):
 
     #we also count the number of wrong submissions during the comprehension check (increments per wrong submission)
     comprehension_retries = models.IntegerField(initial=0)
+    # wrong attempts counted in the browser, which checks the answers itself (ComprehensionPage.html);
+    # it also reports each one to ComprehensionPage.live_method, which counts it in comprehension_retries
+    browser_retries = models.IntegerField(blank=True, min=0, max=Constants.max_retries)
 
 class IntroductionPage(Page):
     timeout_seconds = Constants.introduction_timeout_seconds
@@ -78,8 +110,8 @@ class IntroductionPage(Page):
 
     @staticmethod
     def vars_for_template(player):
-        degree = 2 # for instruction, assume 2 neighbors (this can be tweaked)
-        table_data = payoff_table(degree)
+        log_shown(player, 'IntroductionPage')
+        degree = DEGREE
 
         return dict(
             role=player.participant.role,
@@ -87,17 +119,21 @@ class IntroductionPage(Page):
             group_size=player.session.config['group_size'],
             degree=degree,
             range_neighbors=list(range(degree + 1)) if degree > 0 else [],
-            table_data=table_data,
             base="{:.2f}".format(Constants.base_payment),
             max="{:.2f}".format(Constants.max_payment),
             num_rounds_lower=round(nrounds * 0.9),
             num_rounds_upper = round(nrounds * 1.1),
             test = TEST,
+            **payoff_table_vars(player.session, player.participant.role, degree),
         )
 
+    @staticmethod
+    def before_next_page(player, timeout_happened):
+        log_submit(player, 'IntroductionPage', timeout_happened)
+
 class ComprehensionPage(Page):
     form_model = 'player'
-    form_fields = ['q_red_zero', 'q_blue_zero', 'q_red_half', 'q_blue_half']
+    form_fields = ['q_red_zero', 'q_blue_zero', 'q_red_half', 'q_blue_half', 'browser_retries']
 
     timeout_seconds = Constants.comprehension_timeout_seconds
 
@@ -112,24 +148,10 @@ class ComprehensionPage(Page):
         return Constants.comprehension_timeout_seconds
 
     def vars_for_template(player):
-        degree = 2
-        table_data = payoff_table(degree)
-
-        neighbors_all_blue = [True] * degree
-        neighbors_half_half = [True] * (degree // 2) + [False] * (degree - degree // 2)
-
+        log_shown(player, 'ComprehensionPage')
+        degree = DEGREE
         role = player.participant.role
 
-        payoff_red_zero = compute_utility(False, role, neighbors_all_blue)
-        payoff_blue_zero = compute_utility(True, role, neighbors_all_blue)
-        payoff_red_half = compute_utility(False, role, neighbors_half_half)
-        payoff_blue_half = compute_utility(True, role, neighbors_half_half)
-
-        player.payoff_red_zero = round(payoff_red_zero)
-        player.payoff_blue_zero = round(payoff_blue_zero)
-        player.payoff_red_half = round(payoff_red_half)
-        player.payoff_blue_half = round(payoff_blue_half)
-
         blue_neighbors_half = degree // 2
         red_neighbors_half = degree - blue_neighbors_half
 
@@ -138,64 +160,90 @@ class ComprehensionPage(Page):
         return dict(
             role=role,
             degree=degree,
-            table_data=table_data,
             blue_neighbors_half=blue_neighbors_half,
             red_neighbors_half=red_neighbors_half,
             tries_left=tries_left,
+            retries=player.comprehension_retries,
+            **payoff_table_vars(player.session, role, degree),
         )
 
-    def error_message(player, values):
-        # skip error messages if retries exceeded
-        if player.comprehension_retries >= Constants.max_retries:
-            return
+    @staticmethod
+    def js_vars(player):
+        # the browser checks the answers, so a wrong attempt costs no request
+        role = player.participant.role
+        return dict(
+            answers=correct_answers(role),
+            labels=LABELS,
+            explanation=explanation(role),
+            max_retries=Constants.max_retries,
+        )
 
-        correct_answers = {
-            'q_red_zero': player.payoff_red_zero,
-            'q_blue_zero': player.payoff_blue_zero,
-            'q_red_half': player.payoff_red_half,
-            'q_blue_half': player.payoff_blue_half,
-        }
+    @staticmethod
+    def live_method(player, data):
+        # a wrong attempt found in the browser: counted here as well, so a reload does not reset it
+        if data.get('type') != 'attempt' or player.comprehension_retries >= Constants.max_retries:
+            return
+        answers = correct_answers(player.participant.role)
+        form = data.get('form') or {}
+        if all(form.get(f) == v for f, v in answers.items()):
+            return
+        player.comprehension_retries += 1
+        log_event(
+            player, 'comprehension_attempt',
+            page='ComprehensionPage',
+            form={f: form.get(f) for f in answers},
+            retries=player.comprehension_retries,
+        )
+        return {player.id_in_group: dict(retries=player.comprehension_retries)}
 
-        labels = {
-            'q_red_zero': '<b>A</b>',
-            'q_blue_zero': '<b>B</b>',
-            'q_red_half': '<b>C</b>',
-            'q_blue_half': '<b>D</b>',
-        }
+    def error_message(player, values):
+        # the final submission: wrong answers only pass once the retries are used up.
+        # Without JavaScript (browser_retries missing), every attempt is checked here.
+        retries = max(values.get('browser_retries') or 0, player.comprehension_retries)
+        if retries >= Constants.max_retries:
+            return
 
+        answers = correct_answers(player.participant.role)
         incorrect_fields = [
-            labels[f] for f, v in correct_answers.items()
+            LABELS[f] for f, v in answers.items()
             if values.get(f) != v
         ]
 
         if incorrect_fields:
-            player.comprehension_retries += 1
-            role = player.participant.role
-
-            explanation = (
-                "Your payoff only depends on your own shirt choice (Table 1)."
-                if role == Constants.minority
-                else
-                "Your total points = reward for picking a color "
-                "(Table 1) + reward for matching neighbors (Table 2)."
+            player.comprehension_retries = retries + 1
+            log_event(
+                player, 'comprehension_attempt',
+                page='ComprehensionPage',
+                form={f: values.get(f) for f in answers},
+                retries=player.comprehension_retries,
             )
 
             tries_left = max(Constants.max_retries - player.comprehension_retries, 0) + 1
 
             return (
-                f"Incorrect answers: {', '.join(incorrect_fields)}. {explanation} "
+                f"Incorrect answers: {', '.join(incorrect_fields)}. {explanation(player.participant.role)} "
                 f"<b>You have {tries_left} "
                 f"{'try' if tries_left == 1 else 'tries'} left</b>."
             )
 
     @staticmethod
     def before_next_page(player, timeout_happened):
+        log_submit(player, 'ComprehensionPage', timeout_happened, ComprehensionPage.form_fields)
+        player.comprehension_retries = max(player.field_maybe_none('browser_retries') or 0, player.comprehension_retries)
+        answers = correct_answers(player.participant.role)
+        player.payoff_red_zero = answers['q_red_zero']
+        player.payoff_blue_zero = answers['q_blue_zero']
+        player.payoff_red_half = answers['q_red_half']
+        player.payoff_blue_half = answers['q_blue_half']
         if player.comprehension_retries >= Constants.max_retries or timeout_happened:
             player.participant.failed_checks = True
             player.participant.is_dropout = True
+            log_event(player, 'failed_checks', retries=player.comprehension_retries)
 
 
 page_sequence = [
     IntroductionPage,
     ComprehensionPage, #only turn off for testing purposes.
-                 ]
\ No newline at end of file
+                 ]
+
+profiling.install(globals(), page_sequence)
@@ -1,5 +1,6 @@
 import datetime, random
 from otree.api import *
+from shared.events import log_event, log_submit, recording
 
 # import central parameters
 from settings import (
@@ -64,6 +65,7 @@ class ConsentPage(Page):
             return "You must check the box to give your consent in order to participate in this study."
 
     def before_next_page(player: Player, timeout_happened):
+        log_submit(player, 'ConsentPage', timeout_happened, ConsentPage.form_fields)
         if not player.consent:
             player.participant.vars['consent'] = False
             return
@@ -79,8 +81,12 @@ class ConsentPage(Page):
         the proportion of minorities in the network condition (p_assign_minority = 2 * p_m);
         Also, I reserve a few spots (participant number between 200-250) that will always be the minority 
         (to efficiently fill potential lacking spots in the network with bots...)
+        With a lobby deadline, unused reserved spots become server-side bots (see unpop/lobby.py).
         """
-        if 200 <= player.participant.id_in_session <= 250:
+        replay = recording(player.session)
+        if replay and player.participant.label in replay['roles']:
+            role = replay['roles'][player.participant.label]  # replaying a recorded session
+        elif 200 <= player.participant.id_in_session <= 250:
             role = Constants.minority
         else:
             role = (
@@ -94,8 +100,14 @@ class ConsentPage(Page):
         player.participant.vars['consent'] = True
 
         print(f"[assign] P{player.participant.id_in_session} -> {role}")
+        log_event(player, 'role', role=role)
 
     def vars_for_template(player):
+        # first page of the study: log the arrival once (not on re-renders)
+        if not player.participant.vars.get('arrival_logged', False):
+            player.participant.vars['arrival_logged'] = True
+            log_event(player, 'arrival')
+
         return dict(
             base="{:.2f}".format(Constants.base_payment),
             maxp="{:.2f}".format(Constants.max_payment),
@@ -0,0 +1,299 @@
+"""
+Serve the project from several oTree server processes behind a session-pinning router.
+
+One oTree process handles all requests one at a time (oTree serializes them with a
+process-wide lock), so with many sessions running at once, every participant waits
+for every other session's round closes. This script starts N oTree processes on
+consecutive ports and a small router in front of them that sends all requests of a
+session (and of the room the session runs in) to the same process. Wait pages,
+group_by_arrival_time and live pages keep working, because oTree notifies waiting
+participants in memory and all participants of a session talk to the same process.
+
+The same pinning lets the unpop app keep what it needs between the requests of a session
+in the memory of the process that serves it, instead of in the database: who has yet to
+choose in a live round (live.py), the running round computations (closing.py) and the
+last heartbeats (heartbeat.py). Every request of the session finds it there. A restarted
+process starts without it; each of these modules says what it does then.
+
+python deploy/multiserver.py --workers 4 --port 8000
+
+Run it from the project root, like "otree prodserver". All processes must share one
+database, so set DATABASE_URL to a PostgreSQL database; the SQLite file only works
+for trying it out with a few participants (writes from different processes block
+each other). See deploy/readme.txt.
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import zlib
+from urllib.parse import parse_qs, urlsplit
+
+WORKER_HOST = "127.0.0.1"
+MAX_HEAD_BYTES = 64 * 1024
+
+# paths that never end in a session or participant code (see SessionResolver.key_for)
+CODE_PATHS_SKIPPED = {"static", "favicon.ico"}
+
+
+def database_url():
+    url = os.environ.get("DATABASE_URL", "sqlite:///db.sqlite3")
+    if url.startswith("postgres://"):
+        # same normalization as oTree (SQLAlchemy wants postgresql://)
+        url = "postgresql://" + url[len("postgres://"):]
+    return url
+
+
+class SessionResolver:
+    """
+    Maps a request to a routing key: "room:<name>" for everything that belongs to a
+    room (including the session running in it), "session:<code>" for sessions
+    without a room, or None for requests that don't belong to a session (admin pages).
+    Lookups are cached: participant and session codes never move between sessions.
+    """
+
+    def __init__(self, url):
+        from sqlalchemy import create_engine
+
+        self.engine = create_engine(url)
+        self.session_keys = {}  # session code -> routing key
+        self.participant_sessions = {}  # participant code -> session code
+
+    def query_one(self, sql, **params):
+        from sqlalchemy import text
+
+        with self.engine.connect() as conn:
+            row = conn.execute(text(sql), params).first()
+        return row[0] if row else None
+
+    def session_key(self, code):
+        if not code:
+            return None
+        key = self.session_keys.get(code)
+        if key is None:
+            exists = self.query_one("SELECT id FROM otree_session WHERE code = :code", code=code)
+            if exists is None:
+                return None
+            room = self.query_one(
+                "SELECT room_name FROM otree_roomtosession WHERE session_id = :id", id=exists
+            )
+            key = self.session_keys[code] = f"room:{room}" if room else f"session:{code}"
+        return key
+
+    def participant_session(self, code):
+        if not code:
+            return None
+        session_code = self.participant_sessions.get(code)
+        if session_code is None:
+            session_code = self.query_one(
+                "SELECT _session_code FROM otree_participant WHERE code = :code", code=code
+            )
+            if session_code is not None:
+                self.participant_sessions[code] = session_code
+        return session_code
+
+    def key_for(self, target, body=b""):
+        parsed = urlsplit(target)
+        parts = [part for part in parsed.path.split("/") if part]
+        params = {name: values[0] for name, values in parse_qs(parsed.query).items()}
+
+        # rooms: /room/<name>, /room_without_session/<name>, /room_with_session/<name>,
+        # /CloseRoom/<name>, and the websocket of the room's waiting page
+        if len(parts) == 2 and parts[0] in (
+            "room", "room_without_session", "room_with_session", "CloseRoom"
+        ):
+            return f"room:{parts[1]}"
+        if "room_name" in params:
+            return f"room:{params['room_name']}"
+        if parts == ["api", "sessions"] and body:
+            # REST session creation: create it where its room lives, so that the
+            # participants waiting in the room get notified
+            try:
+                room = json.loads(body).get("room_name")
+            except (ValueError, AttributeError):
+                room = None
+            return f"room:{room}" if room else None
+
+        # participant pages /p/<participant_code>/... and /InitializeParticipant/<code>
+        if len(parts) >= 2 and parts[0] in ("p", "InitializeParticipant"):
+            return self.session_key(self.participant_session(parts[1]))
+        if len(parts) == 2 and parts[0] == "join":
+            return self.session_key(self.query_one(
+                "SELECT code FROM otree_session WHERE _anonymous_code = :code", code=parts[1]
+            ))
+
+        # websockets: /wait_page?session_pk=..., /live?session_code=..., /auto_advance?participant_code=...
+        if "session_code" in params:
+            return self.session_key(params["session_code"])
+        if "participant_code" in params:
+            return self.session_key(self.participant_session(params["participant_code"]))
+        if params.get("session_pk", "").isdigit():
+            return self.session_key(self.query_one(
+                "SELECT code FROM otree_session WHERE id = :id", id=int(params["session_pk"])
+            ))
+
+        # admin views of a session or participant, e.g. /SessionMonitor/<code>,
+        # /AdvanceSession/<code>, /session_monitor/<code>, /api/participant_vars/<code>
+        if len(parts) >= 2 and parts[0] not in CODE_PATHS_SKIPPED:
+            code = parts[-1]
+            return self.session_key(code) or self.session_key(self.participant_session(code))
+        return None
+
+
+def worker_index(key, num_workers):
+    if key is None:
+        return 0
+    return zlib.crc32(key.encode()) % num_workers
+
+
+def parse_head(head):
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, _ = lines[0].split(" ", 2)
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    return method, target, headers
+
+
+def close_after_response(head):
+    """rewrite a request head so that the worker closes the connection after responding"""
+    lines = head.decode("latin-1").split("\r\n")
+    lines = [line for line in lines if not line.lower().startswith("connection:")]
+    # head ends with an empty line (two, after the split)
+    lines.insert(len(lines) - 2, "Connection: close")
+    return "\r\n".join(lines).encode("latin-1")
+
+
+async def pipe(reader, writer):
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                break
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+class Router:
+    """
+    Forwards each connection to the worker that owns the request's session.
+    Plain HTTP connections are answered with Connection: close, so every request is
+    routed on its own; websocket connections are spliced through as they are.
+    """
+
+    def __init__(self, resolver, worker_ports):
+        self.resolver = resolver
+        self.worker_ports = worker_ports
+
+    async def handle(self, reader, writer):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+            method, target, headers = parse_head(head)
+            body = b""
+            if method == "POST" and urlsplit(target).path == "/api/sessions":
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError, ConnectionError):
+            writer.close()
+            return
+
+        loop = asyncio.get_running_loop()
+        key = await loop.run_in_executor(None, self.resolver.key_for, target, body)
+        port = self.worker_ports[worker_index(key, len(self.worker_ports))]
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(WORKER_HOST, port)
+        except OSError:
+            writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+            writer.close()
+            return
+
+        if headers.get("upgrade", "").lower() != "websocket":
+            head = close_after_response(head)
+        upstream_writer.write(head + body)
+        await asyncio.gather(pipe(reader, upstream_writer), pipe(upstream_reader, writer))
+
+
+def wait_for_port(port, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            sys.exit(f"worker on port {port} exited with code {process.returncode}")
+        try:
+            socket.create_connection((WORKER_HOST, port), timeout=1).close()
+            return
+        except OSError:
+            time.sleep(0.2)
+    sys.exit(f"worker on port {port} did not start within {timeout}s")
+
+
+def run_worker(port):
+    """one oTree server process, like 'otree prodserver1of2' but without its own timeout worker"""
+    from otree.main import setup
+    from otree.cli.prodserver1of2 import run_asgi_server
+
+    setup()
+    run_asgi_server(WORKER_HOST, port)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run several oTree processes behind a session-pinning router.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 8000)))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--first-worker-port", type=int, default=None,
+                        help="workers listen on this and the following ports (default: --port + 1)")
+    args = parser.parse_args()
+
+    if database_url().startswith("sqlite") and args.workers > 1:
+        print("[multiserver] DATABASE_URL is not set: all workers share db.sqlite3, "
+              "use PostgreSQL for real sessions")
+
+    first_port = args.first_worker_port or args.port + 1
+    worker_ports = [first_port + i for i in range(args.workers)]
+    env = dict(os.environ, USE_TIMEOUT_WORKER="1")
+
+    processes = []
+    # start the workers one by one: the first one creates the tables if needed
+    for port in worker_ports:
+        process = subprocess.Popen([sys.executable, os.path.abspath(__file__), "worker", str(port)], env=env)
+        processes.append(process)
+        wait_for_port(port, process)
+        print(f"[multiserver] worker on port {port}")
+    # a single timeout worker for all processes; it posts expired pages through the router
+    processes.append(subprocess.Popen(["otree", "timeoutsubprocess", str(args.port)], env=env))
+
+    router = Router(SessionResolver(database_url()), worker_ports)
+    loop = asyncio.new_event_loop()
+    server = loop.run_until_complete(
+        asyncio.start_server(router.handle, args.host, args.port, limit=MAX_HEAD_BYTES)
+    )
+    print(f"[multiserver] routing http://{args.host}:{args.port} to {len(worker_ports)} workers")
+    try:
+        loop.add_signal_handler(signal.SIGTERM, loop.stop)
+    except NotImplementedError:  # Windows
+        pass
+    try:
+        loop.run_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        for process in processes:
+            process.terminate()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3 and sys.argv[1] == "worker":
+        run_worker(int(sys.argv[2]))
+    else:
+        main()
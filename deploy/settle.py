@@ -0,0 +1,49 @@
+"""
+Settle the bonuses of a session again from the database and write its payout file.
+
+The server settles a session when its last round closes (unpop/settlement.py) and writes
+otree_payouts/bonus_<session code>.csv on its own disk. Use this script to get the file
+from a server whose disk is not kept (e.g. Heroku), or for a session whose last round
+never closed (bonuses are then what participants earned so far).
+
+python deploy/settle.py <session code> [--out bonus.csv]
+
+Run it from the project folder, with the DATABASE_URL of the server (without it, the
+db.sqlite3 of the project folder is used).
+"""
+import argparse
+import os
+import sys
+import time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("session_code")
+    parser.add_argument("--out", help="payout file (default: otree_payouts/bonus_<session code>.csv)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.getcwd())
+    from otree.main import setup
+    setup()
+
+    from otree.database import db
+    from otree.models import Session
+
+    from unpop import settlement
+
+    session = Session.objects_filter(code=args.session_code).first()
+    if session is None:
+        sys.exit(f"no session {args.session_code} in the database")
+
+    start = time.perf_counter()
+    num_paid, total = settlement.settle(session, args.out)
+    db.commit()
+    print(
+        f"{num_paid} bonuses, total {total:.2f}, in {time.perf_counter() - start:.2f} s: "
+        f"{args.out or settlement.payout_path(session.code)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
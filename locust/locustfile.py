@@ -1,6 +1,19 @@
-from locust import TaskSet, task, between, HttpUser
+import csv
+import itertools
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+import gevent
+from locust import TaskSet, task, between, HttpUser, events
 from locust.exception import StopUser
 
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_dir)
+from shared.events import read_events  # noqa: E402
+
 class OtreeApplication:
     def __init__(self, client, start_url=None):
         self.client = client
@@ -54,3 +67,205 @@ class WebsiteUser(HttpUser):
     #wait_time = between(1, 3)
     host = 'http://localhost:8000'
     tasks = [OtreeTaskSet]
+
+
+# --- trace-driven mode ---------------------------------------------------------------
+# Replays the think times of recorded participants instead of clicking through as fast
+# as possible. Run with e.g.
+#   locust -f locust\locustfile.py TraceUser --trace otree_events\events_<session>.jsonl
+# Every user mirrors one recorded participant (user k -> participant k mod #recorded),
+# so -u 2x the number of recorded participants doubles the load with the same timing.
+
+@events.init_command_line_parser.add_listener
+def add_trace_arguments(parser):
+    parser.add_argument("--trace", default="",
+                        help="event log (otree_events/*.jsonl) or oTree PageTimes export (*.csv)")
+    parser.add_argument("--trace-room", default="/room/fashion_dilemma")
+    parser.add_argument("--trace-poll", type=float, default=1.0,
+                        help="seconds between reloads of a wait page")
+
+
+def profiles_from_event_log(path):
+    """per participant: the pages they submitted, with think time (shown -> submitted) and form"""
+    by_participant = defaultdict(list)
+    for event in sorted(read_events(path), key=lambda e: e["t"]):
+        by_participant[event["participant"]].append(event)
+
+    profiles = []
+    for participant_events in by_participant.values():
+        steps = []
+        last_t = participant_events[0]["t"]
+        shown = {}
+        for event in participant_events:
+            if event["event"] == "shown":
+                shown.setdefault(event["page"], event["t"])
+            elif event["event"] in ("submit", "comprehension_attempt"):
+                start = shown.pop(event["page"], last_t)
+                steps.append(dict(
+                    page=event["page"],
+                    think=max(event["t"] - start, 0),
+                    timeout=event.get("timeout", False),
+                    form=event.get("form") or {},
+                ))
+                last_t = event["t"]
+        if steps:
+            profiles.append(dict(label=participant_events[0].get("label"), steps=steps))
+    return profiles
+
+
+def profiles_from_page_times(path):
+    """
+    same, from the PageTimes export (admin > Data). It has no form values, so forms
+    fall back to FALLBACK_FORMS (use an event log if comprehension checks are on)
+    """
+    by_participant = defaultdict(list)
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            by_participant[row["participant_code"]].append(row)
+
+    profiles = []
+    for rows in by_participant.values():
+        rows.sort(key=lambda r: int(r["page_index"]))
+        steps = []
+        last_t = None
+        for row in rows:
+            t = float(row["epoch_time_completed"])
+            if row.get("is_wait_page") not in ("1", "True") and last_t is not None:
+                steps.append(dict(
+                    page=row["page_name"],
+                    think=max(t - last_t, 0),
+                    timeout=row.get("timeout_happened") in ("1", "True"),
+                    form=FALLBACK_FORMS.get(row["page_name"], {}),
+                ))
+            last_t = t
+        if steps:
+            profiles.append(dict(label=rows[0].get("participant_label"), steps=steps))
+    return profiles
+
+
+# a timed-out page is posted again until the server accepts the timeout, at most this often
+# (as in replay.py), so a page that never advances does not keep a user busy forever
+MAX_TIMEOUT_RETRIES = 120
+
+FALLBACK_FORMS = {
+    "ConsentPage": {"consent": True},
+    "DecisionPage": {"choice": False, "checked_neighbors": False},
+}
+
+trace_profiles = []
+trace_user_ids = itertools.count()
+# round -> user id -> dict(start, end, latency); "start" is the first DecisionPage view,
+# "end" the ResultsPage view, "latency" the summed response time of the user's requests
+round_stats = defaultdict(dict)
+
+
+@events.test_start.add_listener
+def load_trace(environment, **kwargs):
+    path = environment.parsed_options.trace if environment.parsed_options else ""
+    if not path:
+        return
+    loader = profiles_from_page_times if path.endswith(".csv") else profiles_from_event_log
+    trace_profiles[:] = loader(path)
+    print(f"[trace] {len(trace_profiles)} recorded participants from {path}")
+
+
+@events.test_stop.add_listener
+def report_rounds(environment, **kwargs):
+    if not round_stats:
+        return
+    print("round | players | round length (s) | slowest participant latency (s)")
+    for round_number in sorted(round_stats):
+        users = round_stats[round_number]
+        starts = [u["start"] for u in users.values()]
+        ends = [u["end"] for u in users.values() if u.get("end")]
+        length = (max(ends) - min(starts)) if ends else float("nan")
+        slowest = max(users.values(), key=lambda u: u["latency"])
+        print(f"{round_number:5d} | {len(users):7d} | {length:16.2f} | {slowest['latency']:8.2f}")
+
+
+def page_of(url):
+    # participant URLs look like /p/<code>/<app>/<PageName>/<index>
+    parts = url.split("?")[0].strip("/").split("/")
+    return parts[-2] if len(parts) >= 5 and parts[-5] == "p" else None
+
+
+class TraceTaskSet(TaskSet):
+    def on_start(self):
+        if not trace_profiles:
+            raise StopUser()
+        self.user_id = next(trace_user_ids)
+        copy, index = divmod(self.user_id, len(trace_profiles))
+        profile = trace_profiles[index]
+        self.steps = list(profile["steps"])
+        # same label as the recorded participant (so a session created with replay_event_log
+        # assigns the recorded role); extra copies get a suffix
+        self.label = profile["label"] if copy == 0 else f"{profile['label']}_{copy}"
+        self.round_number = 0
+        self.poll = self.user.environment.parsed_options.trace_poll
+        self.start_url = self.parent.host.rstrip("/") + self.user.environment.parsed_options.trace_room
+
+    def request(self, method, url, name, data=None):
+        start = time.perf_counter()
+        response = self.client.request(method, url, data=data, name=name)
+        elapsed = time.perf_counter() - start
+        if self.round_number:
+            round_stats[self.round_number][self.user_id]["latency"] += elapsed
+        return response
+
+    def next_step(self, page):
+        for i, step in enumerate(self.steps):
+            if step["page"] == page:
+                del self.steps[:i + 1]
+                return step
+        return None
+
+    def enter_page(self, page):
+        if page == "DecisionPage":
+            self.round_number += 1
+            round_stats[self.round_number][self.user_id] = dict(
+                start=time.time(), end=None, latency=0.0
+            )
+        elif page == "ResultsPage" and self.round_number:
+            round_stats[self.round_number][self.user_id]["end"] = time.time()
+
+    @task(1)
+    def play(self):
+        start_url = self.start_url
+        if self.label:
+            start_url += f"?participant_label={self.label}"
+        url = self.request("GET", start_url, "arrival").url
+        previous_url = None
+        while True:
+            page = page_of(url)
+            if page is None:
+                break
+            if url != previous_url:
+                self.enter_page(page)
+                previous_url = url
+            if page.endswith("WaitPage"):
+                gevent.sleep(self.poll)
+                url = self.request("GET", url, page).url
+                continue
+
+            step = self.next_step(page) or dict(think=0, timeout=False, form={})
+            gevent.sleep(step["think"])
+            data = {k: str(v) for k, v in step["form"].items() if v is not None}
+            if step["timeout"]:
+                data["timeout_happened"] = "True"
+            new_url = self.request("POST", url, page, data).url
+            # a timeout is only accepted once the page has expired on the server
+            retries = 0
+            while step["timeout"] and new_url == url and retries < MAX_TIMEOUT_RETRIES:
+                gevent.sleep(self.poll)
+                new_url = self.request("POST", url, page, data).url
+                retries += 1
+            retry_recorded = self.steps and self.steps[0]["page"] == page
+            if new_url == url and not retry_recorded:
+                break  # the form did not validate; nothing sensible left to replay
+            url = new_url
+        raise StopUser()
+
+
+class TraceUser(HttpUser):
+    host = 'http://localhost:8000'
+    tasks = [TraceTaskSet]
@@ -0,0 +1,158 @@
+"""
+Replay a recorded session (see shared/events.py) against a local oTree server.
+
+Every recorded participant joins through the start URL at the same offset as in the
+recording (using the same participant label) and submits the same forms with the same
+timing: consent, comprehension attempts, choices, and timeouts (which are posted with
+timeout_happened once the server's page timeout has expired).
+
+python locust/replay.py otree_events/events_<session>.jsonl --start-url http://localhost:8000/room/3
+
+Use --speed 2 to replay twice as fast. At the end, the latency of the replayed requests
+is summarized per page.
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_dir)
+from shared.events import read_events  # noqa: E402
+
+POSTED_EVENTS = ("submit", "comprehension_attempt")
+POLL_SECONDS = 1
+MAX_TIMEOUT_RETRIES = 120
+
+
+def events_by_participant(events):
+    by_participant = defaultdict(list)
+    for event in events:
+        by_participant[event["participant"]].append(event)
+    return {
+        code: sorted(participant_events, key=lambda e: e["t"])
+        for code, participant_events in by_participant.items()
+        if any(e["event"] == "arrival" for e in participant_events)
+    }
+
+
+def page_name(url):
+    # participant URLs look like /p/<code>/<app>/<PageName>/<index>
+    parts = urllib.parse.urlparse(url).path.strip("/").split("/")
+    if len(parts) == 5 and parts[0] == "p":
+        return parts[3]
+    return None
+
+
+def encode_form(form, timeout):
+    data = {}
+    for field, value in (form or {}).items():
+        if value is None:
+            continue
+        data[field] = str(value)  # True -> "True", as submitted by the browser
+    if timeout:
+        data["timeout_happened"] = "True"
+    return urllib.parse.urlencode(data).encode()
+
+
+class ReplayParticipant(threading.Thread):
+    def __init__(self, events, start_url, t0, speed, stats):
+        super().__init__(daemon=True)
+        self.events = events
+        self.posts = [e for e in events if e["event"] in POSTED_EVENTS]
+        self.start_url = start_url
+        self.t0 = t0
+        self.speed = speed
+        self.stats = stats
+        self.clock_start = None
+
+    def sleep_until(self, t):
+        delay = (t - self.t0) / self.speed - (time.monotonic() - self.clock_start)
+        if delay > 0:
+            time.sleep(delay)
+
+    def request(self, page, url, data=None):
+        start = time.monotonic()
+        with urllib.request.urlopen(url, data=data) as response:
+            new_url = response.geturl()
+        self.stats[page].append(time.monotonic() - start)
+        return new_url
+
+    def next_post(self, page):
+        for i, event in enumerate(self.posts):
+            if event.get("page") == page:
+                if i:
+                    print(f"[replay] {self.events[0]['participant']}: skipping "
+                          f"{i} recorded submission(s) before {page}")
+                del self.posts[:i + 1]
+                return event
+        return None
+
+    def run(self):
+        self.clock_start = time.monotonic()
+        arrival = next(e for e in self.events if e["event"] == "arrival")
+        self.sleep_until(arrival["t"])
+
+        url = self.start_url
+        if arrival.get("label"):
+            url += "?" + urllib.parse.urlencode(dict(participant_label=arrival["label"]))
+        url = self.request("arrival", url)
+
+        while True:
+            page = page_name(url)
+            if page is None:
+                return
+            if page.endswith("WaitPage"):
+                time.sleep(POLL_SECONDS)
+                url = self.request(page, url)
+                continue
+
+            event = self.next_post(page)
+            if event is None:
+                # nothing recorded for this page (e.g. the last page): stop here
+                return
+            self.sleep_until(event["t"])
+            data = encode_form(event.get("form"), event.get("timeout"))
+            new_url = self.request(page, url, data)
+            retries = 0
+            # a timeout is only accepted once the page has actually expired on the server
+            while event.get("timeout") and new_url == url and retries < MAX_TIMEOUT_RETRIES:
+                time.sleep(POLL_SECONDS)
+                new_url = self.request(page, url, data)
+                retries += 1
+            url = new_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded session against a local server.")
+    parser.add_argument("event_log")
+    parser.add_argument("--start-url", default="http://localhost:8000/room/3")
+    parser.add_argument("--speed", type=float, default=1.0)
+    args = parser.parse_args()
+
+    participants = events_by_participant(read_events(args.event_log))
+    t0 = min(e["t"] for events in participants.values() for e in events)
+    stats = defaultdict(list)
+
+    threads = [
+        ReplayParticipant(events, args.start_url, t0, args.speed, stats)
+        for events in participants.values()
+    ]
+    print(f"[replay] {len(threads)} participants from {args.event_log}")
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for page, timings in sorted(stats.items()):
+        print(f"{page:>28}: n={len(timings):5d} | median {1000 * statistics.median(timings):7.1f} ms"
+              f" | max {1000 * max(timings):7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -30,6 +30,20 @@ SESSION_CONFIGS = [
         use_browser_bots=False,
     ),
 
+    dict(
+        name="unpopular_norm_20_rewiring",
+        display_name="test_n20_rewiring (10% of the edges rewire every round)",
+        num_demo_participants=100,
+        group_size=20,
+        network_condition="test_n20_rewiring",
+        app_sequence=["consent", "comprehension", "unpop", "reward", "exit"],
+        completionlink='https://app.prolific.com/submissions/complete?cc=CGMXM1XJ',
+        completionlink_nogroup='https://app.prolific.com/submissions/complete?cc=C13ULBPC',
+        completionlink_late='https://app.prolific.com/submissions/complete?cc=C1QMTNFE',
+        completionlink_failed='https://app.prolific.com/submissions/complete?cc=CJOSV4YE',
+        use_browser_bots=False,
+    ),
+
 dict(
         name="unpopular_norm_50",
         display_name="test_n50",
@@ -99,6 +113,21 @@ dict(
         completionlink_failed='https://app.prolific.com/submissions/complete?cc=CJOSV4YE',
         use_browser_bots=False,
     ),
+
+    dict(
+        name="unpopular_norm_mass",
+        display_name="mass_n5000 (sparse, mean degree 8; see benchmarks/mass_session.py and deploy/)",
+        num_demo_participants=5500,
+        group_size=5000,
+        network_condition="mass_n5000",
+        app_sequence=["consent", "comprehension", "unpop", "survey", "reward", "exit"],
+        completionlink='https://app.prolific.com/submissions/complete?cc=CGMXM1XJ',
+        completionlink_nogroup='https://app.prolific.com/submissions/complete?cc=C13ULBPC',
+        completionlink_late='https://app.prolific.com/submissions/complete?cc=C1QMTNFE',
+        completionlink_failed='https://app.prolific.com/submissions/complete?cc=CJOSV4YE',
+        live_rounds=True,  # the per-round pages take more server time per round than a round lasts at this size
+        use_browser_bots=False,
+    ),
 ]
 
 # set some central parameters to be used across apps:
@@ -154,9 +183,29 @@ SESSION_CONFIG_DEFAULTS = dict(
     real_world_currency_per_point=1/30,
     participation_fee=3.00,
     doc="",
+    replay_event_log="", # path to a recorded event log (otree_events/...) to take role/autoplay draws from
+    dropout_strategy="current", # how dropouts are autoplayed: current, fixed_preference, imitate_majority, best_response (unpop/strategies.py)
+    dropout_seed=0, # seed of the dropouts' random draws (0: derived from the session code)
+    adaptive_deadlines=False, # quorum-based round deadlines (unpop/deadlines.py)
+    quorum=0.8, # share of the network that must have decided before the others get the grace window
+    grace_seconds=10,
+    min_decision_seconds=20, # personal deadlines never get shorter than this
+    response_time_factor=3, # personal deadline = factor x slowest of the last decisions
+    heartbeat_seconds=0, # game pages send a heartbeat this often; silent participants become dropouts (0: off; unpop/heartbeat.py)
+    heartbeat_silence_seconds=15,
+    live_rounds=False, # play all rounds on one page over a live connection (unpop/live.py)
+    round_close_worker="", # compute the round close in a "thread" or "process" pool, outside the request (unpop/closing.py)
+    analytics=False, # append every closed round to a SQLite file, to query sessions while they run (unpop/analytics.py)
+    analytics_db="analytics.sqlite3", # ... this file (relative to the server's folder)
+    payoff_table_asset=False, # serve the payoff table rows as cacheable static files (shared/payoff_tables.py)
+    lobby_deadline_minutes=0, # fill the missing nodes with bots this long after the first arrival in the lobby (0: never; unpop/lobby.py)
+    lobby_min_arrival_rate=0, # ... or once fewer arrive per minute over the last lobby_rate_window_minutes (0: off)
+    lobby_rate_window_minutes=5,
+    lobby_min_human_share=0.5, # never fill more than half of the network with bots
 )
 
-PARTICIPANT_FIELDS = [ "bonus", "consent", "is_dropout", "role", 'has_dropped_out', 'too_many_inactive_in_group','node', 'adj_matrix', 'role_vector', 'exit_early', 'failed_checks']
+# the network is not stored per participant: participants only get their node (see unpop/network.py)
+PARTICIPANT_FIELDS = [ "bonus", "consent", "is_dropout", "role", 'has_dropped_out', 'too_many_inactive_in_group','node', 'exit_early', 'failed_checks']
 LANGUAGE_CODE = "en"
 REAL_WORLD_CURRENCY_CODE = "EUR"
 USE_POINTS = True
@@ -0,0 +1,10 @@
+"""
+Code that several apps and the tools share: the payoff model (payoffs.py), the payoff
+table rows (payoff_tables.py), the session event log (events.py) and the profiler
+(profiling.py).
+
+Not an app: importing it does not import oTree or any app's models, so an app that uses
+it does not import the others (an app's __init__.py defines its models, and importing
+anything from the app runs it), and the tools (locust/replay.py, analysis/) can use it
+without oTree.
+"""
@@ -0,0 +1,94 @@
+"""
+Append-only event log of a session, one JSON object per line.
+
+Every line records what a participant did and when, e.g.
+{"t": 1718000000.12, "session": "abc", "participant": "xyz", "label": "...",
+ "id_in_session": 3, "app": "unpop", "round": 2, "event": "submit",
+ "page": "DecisionPage", "timeout": false, "form": {"choice": true}}
+
+Written only when the server runs with OTREE_EVENT_LOG=1 (off by default: every event
+is a file append under a process-wide lock, on every page view); switch it on to record
+sessions for a load test.
+
+Unlike the otree_log text files, this log is meant to be read back by a program:
+locust/replay.py re-drives a local server with the same arrivals and choices (it reads
+the log with read_events, without importing oTree, see shared/__init__.py).
+To make the replayed session take the same random draws (role assignment, choices
+of autoplayed dropouts), create it with the session config field replay_event_log
+set to the recorded log.
+"""
+import json
+import os
+import threading
+import time
+from functools import lru_cache
+
+enabled = os.environ.get("OTREE_EVENT_LOG", "") not in ("", "0")
+event_log_dir = os.environ.get("OTREE_EVENT_LOG_DIR", "otree_events")
+
+_lock = threading.Lock()
+
+
+def event_log_path(session_code):
+    return os.path.join(event_log_dir, f"events_{session_code}.jsonl")
+
+
+def log_event(player, event, **data):
+    """append an event for this player's participant to the session's event log, if switched on"""
+    if not enabled:
+        return
+    participant = player.participant
+    record = dict(
+        t=round(time.time(), 3),
+        session=participant._session_code,
+        participant=participant.code,
+        label=participant.label,
+        id_in_session=participant.id_in_session,
+        app=player.get_folder_name(),
+        round=player.round_number,
+        event=event,
+    )
+    record.update(data)
+    line = json.dumps(record, separators=(",", ":"), default=str)
+    # opened for every event, so no file handles stay open after the session
+    with _lock:
+        os.makedirs(event_log_dir, exist_ok=True)
+        with open(event_log_path(record["session"]), "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def log_shown(player, page):
+    """log that a page was rendered (called from vars_for_template, so also on reloads)"""
+    log_event(player, "shown", page=page)
+
+
+def log_submit(player, page, timeout_happened, form_fields=()):
+    """log a page submission together with the submitted form values"""
+    form = {field: player.field_maybe_none(field) for field in form_fields}
+    log_event(player, "submit", page=page, timeout=bool(timeout_happened), form=form)
+
+
+def read_events(path):
+    """read an event log back as a list of dicts, in the order they were written"""
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+@lru_cache(maxsize=None)
+def _load_recording(path):
+    roles = {}
+    autoplay = {}
+    for event in read_events(path):
+        if event["event"] == "role":
+            roles[event["label"]] = event["role"]
+        elif event["event"] == "autoplay":
+            autoplay[(event["label"], event["round"])] = event["choice"]
+    return dict(roles=roles, autoplay=autoplay)
+
+
+def recording(session):
+    """random draws of the recorded session this session replays (or None)"""
+    path = session.config.get("replay_event_log")
+    if not path:
+        return None
+    return _load_recording(path)
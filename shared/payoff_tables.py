@@ -0,0 +1,58 @@
+"""
+Rows of the coordination rewards table (Table 2), rendered once per process.
+
+The table only depends on the player's degree and the payoff parameters, and only the
+majority is shown it. So the rows are rendered once per (role, degree, parameters) and
+the pages insert the ready HTML, instead of building payoff_table and looping over it in
+the template on every page view.
+
+With the session config field payoff_table_asset=True the rows are written to
+_static/payoff_tables/<parameter hash>/rows_<degree>.html instead and the pages load them
+from there (_static/global/payoff_rows.js), so browsers can cache them across pages and
+rounds. The parameter hash is part of the path, so changed parameters never get a stale copy.
+"""
+import hashlib
+import os
+from functools import lru_cache
+
+from . import payoffs
+from .payoffs import payoff_table
+
+asset_dir = os.path.join("_static", "payoff_tables")
+
+
+@lru_cache(maxsize=None)
+def parameter_hash():
+    params = (payoffs.S, payoffs.E, payoffs.Z, payoffs.W, payoffs.LAMBDA1, payoffs.LAMBDA2)
+    return hashlib.sha1(repr(params).encode()).hexdigest()[:10]
+
+
+@lru_cache(maxsize=None)
+def _rows(role, degree, params):
+    if role != payoffs.MAJORITY:
+        return ""
+    return "".join(
+        f"<tr><td>{row['c_n']}</td><td>{row['wstar']} points</td><td>{row['zstar']} points</td></tr>"
+        for row in payoff_table(degree)
+    )
+
+
+@lru_cache(maxsize=None)
+def _asset_url(role, degree, params):
+    path = os.path.join(asset_dir, params, f"rows_{degree}.html")
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # several server processes may write the same file
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            f.write(_rows(role, degree, params))
+        os.replace(tmp, path)
+    return f"/static/payoff_tables/{params}/rows_{degree}.html"
+
+
+def payoff_table_vars(session, role, degree):
+    """template variables for Table 2: payoff_rows (HTML) or payoff_rows_url (the asset)"""
+    params = parameter_hash()
+    if session.config.get("payoff_table_asset") and _rows(role, degree, params):
+        return dict(payoff_rows="", payoff_rows_url=_asset_url(role, degree, params))
+    return dict(payoff_rows=_rows(role, degree, params), payoff_rows_url="")
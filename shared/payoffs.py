@@ -0,0 +1,78 @@
+"""
+The payoff model of the game, and the parameters it shares with the apps.
+
+Side-effect free and cheap to import: it only reads the roles and payoff parameters from
+settings, once, so compute_utility and payoff_table do no imports per call and the
+normalizing constants of the reward curves are computed once. unpop and comprehension
+take their Constants from here, without importing each other. zstar and wstar also work on
+NumPy arrays (exp=np.exp), which is how unpop/strategies.py evaluates them for all
+dropouts at once, and take other parameters than those of settings.py, which is how the
+scripts in analysis/ evaluate parameter combinations.
+"""
+import math
+
+from settings import (
+    majority_role as MAJORITY,
+    minority_role as MINORITY,
+    s as S,
+    e as E,
+    z as Z,
+    w as W,
+    lambda1 as LAMBDA1,
+    lambda2 as LAMBDA2,
+)
+
+_zstar_norm = 1 - math.exp(-LAMBDA1)
+_wstar_norm = 1 - math.exp(-LAMBDA2)
+
+
+def zstar(p_blue, exp=math.exp, z=Z, lambda1=LAMBDA1):
+    """majority coordination reward for Blue with a share p_blue of Blue neighbors"""
+    norm = _zstar_norm if lambda1 == LAMBDA1 else 1 - math.exp(-lambda1)
+    return z * (1 - exp(-lambda1 * p_blue)) / norm
+
+
+def wstar(p_red, exp=math.exp, w=W, lambda2=LAMBDA2):
+    """majority coordination reward for Red (on top of s) with a share p_red of Red neighbors"""
+    norm = _wstar_norm if lambda2 == LAMBDA2 else 1 - math.exp(-lambda2)
+    return w * (1 - exp(-lambda2 * p_red)) / norm
+
+
+def compute_utility(player_choice, player_role, neighbors_choices):
+    """
+    compute player's utility as a function of
+    - their choice (True=Blue, False=Red)
+    - their role (minority=Blue, majority=Red)
+    - their neighbors' choices (list of True/False)
+    """
+    #  minority player
+    if player_role == MINORITY:
+        return E if player_choice else 0
+
+    # majority player
+    num_neighbors = len(neighbors_choices)
+    if num_neighbors == 0:
+        return S if not player_choice else 0
+
+    if player_choice:  # Blue choice
+        return zstar(neighbors_choices.count(True) / num_neighbors)
+    else:  # Red choice
+        return S + wstar(neighbors_choices.count(False) / num_neighbors)
+
+def payoff_table(degree):
+    """
+    Create a list of dictionaries showing z* and w* values
+    for each possible number of coordinating neighbors.
+    """
+    if degree <= 0:
+        return []
+
+    table_data = []
+    for n in range(degree + 1):
+        p = n / degree
+        table_data.append({
+            'c_n': n,
+            'zstar': round(zstar(p)),
+            'wstar': round(wstar(p)),
+        })
+    return table_data
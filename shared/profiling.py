@@ -0,0 +1,143 @@
+"""
+Opt-in sampling profiler for the server-side code of the apps.
+
+The page methods are always wrapped, but a wrapper only profiles while profiling is on,
+which it checks on every call, so it can be switched on and off while the server runs.
+The settings are those of the control file otree_profiles/profile.json, e.g.
+    {"sample": 10, "slow_ms": 50}
+and, while there is no control file, those of the environment of the server:
+    UNPOP_PROFILE_SAMPLE=N    profile 1 in N calls ("sample")
+    UNPOP_PROFILE_SLOW_MS=T   keep only the profiles of calls that took at least T ms
+                              (alone: every call is profiled) ("slow_ms")
+    UNPOP_PROFILE_DIR         where the profiles and the control file go (default otree_profiles)
+Neither set: off. The control file is read again when its modification time changes; a
+call costs a stat of it while profiling is off.
+
+Covered are the methods oTree calls while handling a page request (vars_for_template,
+before_next_page, get_timeout_seconds, ...), after_all_players_arrive and
+group_by_arrival_time_method. Every kept profile is a pstats file named after the session,
+round, page and method it comes from, e.g.
+    otree_profiles/abcd1234_r3_DecisionPage.before_next_page_152ms_1718000000123.prof
+which can be read with python -m pstats <file> (or snakeviz).
+"""
+import cProfile
+import functools
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# the settings while there is no control file
+SAMPLE = int(os.environ.get("UNPOP_PROFILE_SAMPLE") or 0)
+SLOW_MS = float(os.environ.get("UNPOP_PROFILE_SLOW_MS") or 0)
+profile_dir = os.environ.get("UNPOP_PROFILE_DIR", "otree_profiles")
+control_path = os.path.join(profile_dir, "profile.json")
+
+PAGE_METHODS = [
+    "is_displayed",
+    "vars_for_template",
+    "js_vars",
+    "get_timeout_seconds",
+    "error_message",
+    "before_next_page",
+    "app_after_this_page",
+    "live_method",
+    "after_all_players_arrive",
+]
+
+_calls = itertools.count()
+_active = threading.local()
+_control = (None, (SAMPLE, SLOW_MS))  # (modification time of the control file, its settings)
+
+
+def current_settings():
+    """(sample, slow_ms) in force: those of the control file, or of the environment without one"""
+    global _control
+    try:
+        mtime = os.stat(control_path).st_mtime_ns
+    except OSError:
+        mtime = None
+    if mtime == _control[0]:
+        return _control[1]
+    settings = (SAMPLE, SLOW_MS)
+    if mtime is not None:
+        try:
+            with open(control_path) as f:
+                control = json.load(f)
+            settings = (int(control.get("sample") or 0), float(control.get("slow_ms") or 0))
+        except (OSError, ValueError, AttributeError):
+            logger.warning(f"profile: cannot read {control_path}, using the environment's settings")
+    if settings != _control[1]:
+        logger.info(f"profile: sample={settings[0]}, slow_ms={settings[1]:g}" + ("" if any(settings) else " (off)"))
+    _control = (mtime, settings)
+    return settings
+
+
+def _tags(obj):
+    """session code and round of the player, group or subsession a hook was called with"""
+    try:
+        return obj.session.code, obj.round_number
+    except AttributeError:
+        return "nosession", 0
+
+
+def _save(profiler, name, obj, elapsed_ms):
+    session_code, round_number = _tags(obj)
+    os.makedirs(profile_dir, exist_ok=True)
+    path = os.path.join(
+        profile_dir,
+        f"{session_code}_r{round_number}_{name}_{elapsed_ms:.0f}ms_{int(time.time() * 1000)}.prof",
+    )
+    profiler.dump_stats(path)
+    logger.info(f"profile: {name} took {elapsed_ms:.0f} ms (session {session_code}, round {round_number}), {path}")
+
+
+def profiled(name, func):
+    """func, profiled according to the current settings (run as it is while profiling is off)"""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        sample, slow_ms = current_settings()
+        # cProfile cannot nest: calls made while another one is profiled run as they are
+        if not (sample or slow_ms) or getattr(_active, "on", False):
+            return func(*args, **kwargs)
+        if sample and next(_calls) % sample:
+            return func(*args, **kwargs)
+        profiler = cProfile.Profile()
+        _active.on = True
+        start = time.perf_counter()
+        try:
+            return profiler.runcall(func, *args, **kwargs)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            _active.on = False
+            if elapsed_ms >= slow_ms:
+                obj = args[0] if args else next(iter(kwargs.values()), None)
+                _save(profiler, name, obj, elapsed_ms)
+
+    return wrapper
+
+
+def install(namespace, page_sequence):
+    """
+    wrap the page methods of the pages in page_sequence and the app's
+    group_by_arrival_time_method (in namespace, the app module's globals())
+    """
+    if "group_by_arrival_time_method" in namespace:
+        namespace["group_by_arrival_time_method"] = profiled(
+            "group_by_arrival_time_method", namespace["group_by_arrival_time_method"]
+        )
+    for page in page_sequence:
+        for method in PAGE_METHODS:
+            attribute = page.__dict__.get(method)
+            if attribute is None:
+                continue
+            name = f"{page.__name__}.{method}"
+            if isinstance(attribute, staticmethod):
+                setattr(page, method, staticmethod(profiled(name, attribute.__func__)))
+            elif callable(attribute):
+                setattr(page, method, profiled(name, attribute))
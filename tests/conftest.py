@@ -0,0 +1,33 @@
+"""
+The tests run against a scratch copy of the project: as in the benchmarks
+(benchmarks/round_close.py), the project is linked into a temporary folder, which gets
+its own db.sqlite3, and oTree is set up there once per test run, before the test
+modules import the apps.
+
+python -m pytest tests
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO, "benchmarks"))
+
+_cwd = None
+_workdir = None
+
+
+def pytest_configure(config):
+    global _cwd, _workdir
+    from round_close import setup_otree
+
+    _cwd = os.getcwd()
+    _workdir = tempfile.mkdtemp(prefix="unpop_tests_")
+    setup_otree(_workdir)
+
+
+def pytest_unconfigure(config):
+    if _workdir is not None:
+        os.chdir(_cwd)
+        shutil.rmtree(_workdir, ignore_errors=True)
@@ -0,0 +1,61 @@
+"""The analytics sink (analytics.py): a closed round, read back from the SQLite file."""
+import os
+import sqlite3
+
+import pytest
+from round_close import load_groups, prepare_session
+
+from unpop import analytics
+
+
+def close_first_round(**config):
+    """close the first round of a new session with the config fields; the round as written"""
+    from otree.database import db
+
+    group = prepare_session("test_n10", 1, 0.3)[0]
+    session = group.session
+    session.config = dict(session.config, **config)
+    code = session.code
+    group.set_first_stage_earnings()
+    db.commit()
+    analytics._participants_by_node.pop(code, None)
+    return load_groups([group.id])[0]
+
+
+def test_closed_round_read_back(tmp_path):
+    db_path = tmp_path / "analytics.sqlite3"
+    group = close_first_round(analytics=True, analytics_db=str(db_path))
+    code = group.session.code
+
+    connection = sqlite3.connect(db_path)
+    connection.row_factory = sqlite3.Row
+    assert connection.execute("pragma journal_mode").fetchone()[0] == "wal"
+    (round_row,) = connection.execute("select * from rounds where session_code = ?", (code,)).fetchall()
+    assert round_row["round_number"] == 1
+    assert round_row["network"] == "test_n10"
+    assert round_row["closed_at"] == pytest.approx(group.closed_at)
+    for field in analytics.ROUND_FIELDS:
+        assert round_row[field] == pytest.approx(getattr(group, field))
+
+    rows = {
+        row["participant_code"]: row
+        for row in connection.execute("select * from players where session_code = ? and round_number = 1", (code,))
+    }
+    connection.close()
+    players = group.get_players()
+    assert len(rows) == len(players)
+    for player in players:
+        participant = player.participant
+        row = rows[participant.code]
+        assert (row["node"], row["role"]) == (participant.node, participant.role)
+        assert row["choice"] == int(player.choice)
+        assert row["payoff"] == pytest.approx(float(player.payoff))
+        assert row["is_dropout"] == int(participant.is_dropout)
+        assert row["autoplayed"] == int(participant.is_dropout)  # every dropout is autoplayed
+
+
+def test_off_by_default(tmp_path):
+    close_first_round()
+    assert not os.path.exists("analytics.sqlite3")  # the default analytics_db, in the server's folder
+    close_first_round(analytics=False, analytics_db=str(tmp_path / "analytics.sqlite3"))
+    assert list(tmp_path.iterdir()) == []
@@ -0,0 +1,64 @@
+"""The bulk writes of a round close (bulk.py) write what setting the fields one by one did."""
+from round_close import PerObjectWrites, load_groups, prepare_session
+
+from unpop import analytics
+
+
+def close_rounds(monkeypatch, writes_class, rounds=2):
+    """close the first rounds of a new session with writes_class; the rounds as written, by node"""
+    from otree.database import db
+
+    import unpop
+
+    groups = prepare_session("test_n20", rounds, 0.2)
+    session = groups[0].session
+    session.config = dict(session.config, dropout_seed=7)  # the same autoplayed choices in every session
+    group_ids = [group.id for group in groups]
+    monkeypatch.setattr(unpop, "RoundWrites", writes_class)
+    for group in load_groups(group_ids):
+        group.set_first_stage_earnings()
+        db.commit()
+
+    written = []
+    for group in load_groups(group_ids):
+        written.append(dict(
+            aggregates={field: getattr(group, field) for field in analytics.ROUND_FIELDS},
+            network_state=group.network_state,
+            players=sorted(
+                (
+                    p.participant.node,
+                    p.field_maybe_none("choice"),
+                    float(p.payoff),
+                    float(p.participant.payoff),
+                )
+                for p in group.get_players()
+            ),
+        ))
+    return written
+
+
+def test_bulk_writes_as_per_object_writes(monkeypatch):
+    from unpop.bulk import RoundWrites
+
+    bulk = close_rounds(monkeypatch, RoundWrites)
+    per_object = close_rounds(monkeypatch, PerObjectWrites)
+    assert bulk == per_object
+    # participant payoffs add up the round payoffs
+    assert [p[3] for p in bulk[1]["players"]] == [p1[2] + p2[2] for p1, p2 in zip(bulk[0]["players"], bulk[1]["players"])]
+
+
+def test_bulk_update_splits_at_the_bind_parameter_limit(monkeypatch):
+    from otree.database import db
+    from sqlalchemy.orm import object_session
+
+    from unpop import Player, bulk
+
+    group = prepare_session("test_n20", 1, 0)[0]
+    players = group.get_players()
+    bonuses = {p.id: p.id_in_group / 100 for p in players}
+    monkeypatch.setattr(bulk, "MAX_BIND_PARAMS", 10)  # 3 per row (id, WHEN, THEN): 3 rows per statement
+    statements = bulk.bulk_update(object_session(players[0]), Player.__table__, {i: {"bonus": b} for i, b in bonuses.items()})
+    db.commit()
+
+    assert statements == -(-len(players) // 3)
+    assert {p.id: p.bonus for p in load_groups([group.id])[0].get_players()} == bonuses
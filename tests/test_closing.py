@@ -0,0 +1,87 @@
+"""The round close in a worker (closing.py, round_close_worker): ResultsWaitPage and its inline fallback."""
+import pytest
+from round_close import load_groups, prepare_session
+
+from unpop import ResultsWaitPage, closing
+
+
+def round_written(group):
+    return sorted((p.participant.node, p.field_maybe_none("choice"), float(p.payoff)) for p in group.get_players())
+
+
+def closed_inline():
+    """the first round of a new session, closed in the request; as written"""
+    from otree.database import db
+
+    group = prepare_session("test_n10", 1, 0.3)[0]
+    group.session.config = dict(group.session.config, dropout_seed=7)
+    group.set_first_stage_earnings()
+    db.commit()
+    return round_written(load_groups([group.id])[0])
+
+
+@pytest.fixture
+def wait_page(monkeypatch):
+    """the first round's ResultsWaitPage with every participant of the group on it, in a thread worker"""
+    from otree.database import db
+    from otree.lookup import get_page_lookup
+
+    group = prepare_session("test_n10", 1, 0.3)[0]
+    group.session.config = dict(group.session.config, dropout_seed=7, round_close_worker="thread")
+    participants = [p.participant for p in group.get_players()]
+    page_index = next(
+        i for i in range(1, participants[0]._max_page_index + 1)
+        if get_page_lookup(group.session.code, i).page_class is ResultsWaitPage
+    )
+    for participant in participants:
+        participant._index_in_pages = page_index
+        participant.is_on_wait_page = True
+    db.commit()
+
+    page = ResultsWaitPage.instantiate_without_request()
+    page.set_attributes(participants[0])
+    group_id = group.id
+    yield page
+    closing._futures.pop(group_id, None)
+
+
+def wait_for_the_worker(page):
+    """what the wait page reloads see: not complete until the worker is done"""
+    assert page._tally_unvisited() == (False, True)
+    assert closing.started(page.group)
+    assert ResultsWaitPage.vars_for_template(page.player)["reload_seconds"] == closing.RELOAD_SECONDS
+    closing._futures[page.group.id].exception()  # wait for it
+    assert page._tally_unvisited() == (True, True)
+
+
+def test_round_closed_in_the_worker_as_inline(wait_page):
+    from otree.database import db
+
+    wait_for_the_worker(wait_page)
+    wait_page._run_aapa_and_notify(wait_page.group)
+    db.commit()
+
+    assert not closing.started(wait_page.group)
+    assert round_written(load_groups([wait_page.group.id])[0]) == closed_inline()
+
+
+def test_round_closed_inline_if_the_worker_fails(wait_page, monkeypatch):
+    from otree.database import db
+
+    def fail(inputs):
+        raise RuntimeError("worker failed")
+
+    monkeypatch.setattr(closing, "compute_round", fail)
+    wait_for_the_worker(wait_page)
+    monkeypatch.undo()
+    wait_page._run_aapa_and_notify(wait_page.group)
+    db.commit()
+
+    assert round_written(load_groups([wait_page.group.id])[0]) == closed_inline()
+
+
+def test_without_a_worker_the_page_completes_at_once(wait_page):
+    wait_page.session.config = dict(wait_page.session.config, round_close_worker=None)
+    assert wait_page._tally_unvisited() == (True, True)
+    assert not closing.started(wait_page.group)
+    assert ResultsWaitPage.vars_for_template(wait_page.player)["reload_seconds"] == 10
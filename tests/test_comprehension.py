@@ -0,0 +1,57 @@
+"""The comprehension check (comprehension app): the answers, and counting the wrong attempts."""
+import pytest
+from round_close import prepare_session
+
+from comprehension import Constants, ComprehensionPage, correct_answers
+from shared.payoffs import MAJORITY, MINORITY
+
+WRONG = dict(q_red_zero=1, q_blue_zero=2, q_red_half=3, q_blue_half=4)
+
+
+def test_correct_answers():
+    assert correct_answers(MINORITY) == dict(q_red_zero=0, q_blue_zero=10, q_red_half=0, q_blue_half=10)
+    # Red: s, plus w* of the share of Red neighbors; Blue: z* of the share of Blue neighbors
+    assert correct_answers(MAJORITY) == dict(q_red_zero=15, q_blue_zero=50, q_red_half=43, q_blue_half=45)
+
+
+@pytest.fixture
+def player():
+    """the comprehension player of a majority participant in a new session"""
+    session = prepare_session("test_n10", 1, 0)[0].session
+    subsession = next(s for s in session.get_subsessions() if s.get_folder_name() == "comprehension")
+    return next(p for p in subsession.get_players() if p.participant.role == MAJORITY)
+
+
+def test_wrong_submissions_pass_once_the_retries_are_used_up(player):
+    # without JavaScript every attempt is checked on the server
+    for retries in range(1, Constants.max_retries + 1):
+        assert "Incorrect answers" in ComprehensionPage.error_message(player, WRONG)
+        assert player.comprehension_retries == retries
+    assert ComprehensionPage.error_message(player, WRONG) is None
+
+    ComprehensionPage.before_next_page(player, False)
+    assert player.participant.failed_checks and player.participant.is_dropout
+
+
+def test_correct_submission(player):
+    # after one wrong attempt in the browser
+    assert ComprehensionPage.error_message(player, dict(correct_answers(MAJORITY), browser_retries=1)) is None
+    player.browser_retries = 1  # the form, saved by oTree
+    ComprehensionPage.before_next_page(player, False)
+    assert player.comprehension_retries == 1
+    assert not player.participant.vars.get("failed_checks", False)
+
+
+def test_attempts_checked_in_the_browser_are_counted_on_the_server(player):
+    reply = ComprehensionPage.live_method(player, dict(type="attempt", form=WRONG))
+    assert reply == {player.id_in_group: dict(retries=1)}
+    # a right answer, or a message that is not an attempt, is not counted
+    assert ComprehensionPage.live_method(player, dict(type="attempt", form=correct_answers(MAJORITY))) is None
+    assert ComprehensionPage.live_method(player, dict(type="other", form=WRONG)) is None
+    assert player.comprehension_retries == 1
+    # what a reload shows
+    assert ComprehensionPage.vars_for_template(player)["retries"] == 1
+
+    for _ in range(Constants.max_retries):
+        ComprehensionPage.live_method(player, dict(type="attempt", form=WRONG))
+    assert player.comprehension_retries == Constants.max_retries
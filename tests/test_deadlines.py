@@ -0,0 +1,99 @@
+"""Adaptive deadlines (deadlines.py): the quorum's grace window and the personal deadlines."""
+import time
+
+import pytest
+from round_close import prepare_session
+
+from unpop import Constants, deadlines
+
+FULL_TIMEOUT = Constants.decision_pages_timeout_seconds
+GRACE = 10
+
+
+@pytest.fixture
+def group():
+    """the first round of a new session with adaptive deadlines, everyone on the DecisionPage"""
+    group = prepare_session("test_n10", 1, 0)[0]
+    session = group.session
+    session.config = dict(
+        session.config, adaptive_deadlines=True, quorum=0.8, grace_seconds=GRACE,
+        min_decision_seconds=20, response_time_factor=3,
+    )
+    for player in group.get_players():
+        participant = player.participant
+        participant._timeout_page_index = participant._index_in_pages
+        participant._timeout_expiration_time = time.time() + FULL_TIMEOUT
+    return group
+
+
+def submit(player):
+    """what DecisionPage.before_next_page counts; the player moves on to the next page"""
+    completed = deadlines.register_decision(player)
+    player.participant._index_in_pages += 1
+    return completed
+
+
+def test_quorum_shortens_the_others_to_the_grace_window(group):
+    players = sorted(group.get_players(), key=lambda p: p.id_in_group)
+    deciders, others = players[:8], players[8:]  # 80% of 10
+    soon = time.time() + 3
+    others[1].participant._timeout_expiration_time = soon
+
+    assert [submit(p) for p in deciders] == [False] * 7 + [True]
+    assert group.num_decided == 8
+    quorum_reached_at = group.quorum_reached_at
+
+    # moved forward to the grace window, never back
+    assert others[0].participant._timeout_expiration_time == pytest.approx(quorum_reached_at + GRACE, abs=1)
+    assert others[0].grace_deadline
+    assert others[1].participant._timeout_expiration_time == soon
+    assert not others[1].grace_deadline
+    assert not any(p.grace_deadline for p in deciders)
+
+    # the quorum is only reached once
+    assert not submit(others[0])
+    assert group.quorum_reached_at == quorum_reached_at
+
+
+def test_dropouts_and_bots_are_left_alone(group):
+    players = sorted(group.get_players(), key=lambda p: p.id_in_group)
+    group.session.vars["num_bots"] = 2  # the quorum is a share of the humans: 0.8 x 8
+    players[9].participant.is_dropout = True
+    expiration = players[9].participant._timeout_expiration_time
+
+    assert [submit(p) for p in players[:7]] == [False] * 6 + [True]
+    assert players[9].participant._timeout_expiration_time == expiration
+    assert not players[9].grace_deadline
+
+
+def test_arriving_after_the_quorum_gets_what_is_left_of_the_grace_window(group):
+    player = group.get_players()[0]
+    group.quorum_reached_at = time.time() - 4
+    assert deadlines.decision_timeout(player, FULL_TIMEOUT) == pytest.approx(GRACE - 4, abs=1)
+    assert deadlines.missed_deadline(player)
+    assert player.autoplayed
+
+
+@pytest.mark.parametrize("slowest, deadline, shortened", [
+    (20, FULL_TIMEOUT, False),  # 3 x 20 s: exactly the full timeout
+    (19.9, 59.7, True),
+    (30, FULL_TIMEOUT, False),
+    (5, 20, True),  # never below min_decision_seconds
+])
+def test_missed_deadline_at_the_personal_deadline(group, slowest, deadline, shortened):
+    player = group.get_players()[0]
+    player.participant.vars["response_times"] = [1, slowest, 2]
+
+    assert deadlines.decision_timeout(player, FULL_TIMEOUT) == pytest.approx(deadline)
+    assert player.shortened_deadline == shortened
+    # timing out: a shortened deadline autoplays this round only, the full timeout marks a dropout
+    assert deadlines.missed_deadline(player) == shortened
+    assert player.autoplayed == shortened
+    assert player.participant.vars["response_times"] == ([] if shortened else [1, slowest, 2])
+
+
+def test_the_full_timeout_until_enough_response_times(group):
+    player = group.get_players()[0]
+    player.participant.vars["response_times"] = [1, 1]
+    assert deadlines.decision_timeout(player, FULL_TIMEOUT) == FULL_TIMEOUT
+    assert not deadlines.missed_deadline(player)
@@ -0,0 +1,86 @@
+"""Heartbeat dropout detection (heartbeat.py): who is marked a dropout, and what is forgotten when."""
+import time
+
+import pytest
+from round_close import prepare_session
+
+from unpop import Constants, heartbeat
+
+SILENCE = 15
+
+
+@pytest.fixture
+def group():
+    """the first round of a new session with heartbeats, everyone on the DecisionPage and just heard of"""
+    group = prepare_session("test_n10", 1, 0)[0]
+    session = group.session
+    session.config = dict(session.config, heartbeat_seconds=5, heartbeat_silence_seconds=SILENCE)
+    for player in group.get_players():
+        participant = player.participant
+        participant._current_page_name = "DecisionPage"
+        participant._timeout_page_index = participant._index_in_pages
+        participant._timeout_expiration_time = time.time() + 60
+        heartbeat.seen(player)
+    yield group
+    heartbeat._last_seen.pop(session.code, None)
+    heartbeat._last_check.pop(session.code, None)
+
+
+def go_silent(player, seconds):
+    heartbeat._last_seen[player.session.code][player.participant.code] -= seconds
+
+
+def test_silent_participants_become_dropouts(group):
+    players = group.get_players()
+    silent, quiet, waiting = players[:3]
+    go_silent(silent, SILENCE + 1)
+    go_silent(quiet, SILENCE - 1)
+    go_silent(waiting, SILENCE + 1)
+    waiting.participant._current_page_name = "ResultsWaitPage"  # decided, sends no heartbeats
+    del heartbeat._last_seen[group.session.code][players[3].participant.code]  # not seen since a restart
+
+    assert heartbeat.check_group(players[4]) == [silent]
+    assert silent.participant.is_dropout and silent.is_dropout
+    # the page they are on times out right away
+    assert silent.participant._timeout_expiration_time < time.time() + 2
+    assert not any(p.participant.is_dropout for p in players[1:])
+
+
+def test_a_group_is_checked_once_per_interval(group):
+    silent = group.get_players()[0]
+    assert heartbeat.check_group(silent) == []
+    go_silent(silent, SILENCE + 1)
+    assert heartbeat.check_group(silent) == []  # within the heartbeat interval of the last check
+    heartbeat._last_check[group.session.code][group.id] -= 5
+    assert heartbeat.check_group(silent) == [silent]
+
+
+def test_nothing_is_kept_without_heartbeats(group):
+    player = group.get_players()[0]
+    heartbeat._last_seen.pop(group.session.code)
+    group.session.config = dict(group.session.config, heartbeat_seconds=0)
+    heartbeat.seen(player)
+    assert group.session.code not in heartbeat._last_seen
+    assert heartbeat.check_group(player) == []
+
+
+def test_round_closed_forgets_the_group_then_the_session(group):
+    code = group.session.code
+    player = group.get_players()[0]
+    heartbeat.check_group(player)
+    assert group.id in heartbeat._last_check[code]
+
+    heartbeat.round_closed(group)
+    assert group.id not in heartbeat._last_check[code]
+    assert player.participant.code in heartbeat._last_seen[code]
+
+    last_round = group.in_round(Constants.num_rounds)
+    heartbeat.round_closed(last_round)
+    assert code not in heartbeat._last_seen and code not in heartbeat._last_check
+
+    # after the last round has closed, heartbeats are ignored
+    last_round.closed_at = time.time()
+    last_player = player.in_round(Constants.num_rounds)
+    heartbeat.seen(last_player)
+    assert heartbeat.check_group(last_player) == []
+    assert code not in heartbeat._last_seen
@@ -0,0 +1,78 @@
+"""Live rounds (live.py): rounds closed in the live message that completes them."""
+import time
+
+import pytest
+from round_close import load_groups, prepare_session
+
+from unpop import Constants, live
+
+
+LAST = Constants.num_rounds
+
+
+@pytest.fixture
+def players():
+    """
+    the round-1 players of a new live session that has played up to its last two rounds,
+    which are open to choose in
+    """
+    from otree.database import db
+
+    group = prepare_session("test_n10", 1, 0)[0]
+    group.session.config = dict(group.session.config, live_rounds=True, dropout_seed=7)
+    group.live_round = LAST - 1
+    group.in_round(LAST - 1).opened_at = time.time()
+    for player in group.get_players():
+        for round_player in player.in_rounds(LAST - 1, LAST):
+            round_player.choice = None
+    db.commit()
+    code = group.session.code
+    yield sorted(group.get_players(), key=lambda p: p.id_in_group)
+    live._pending.pop(code, None)
+
+
+def choose(player, round_number):
+    return live.live_method(player, dict(type="choice", round=round_number, choice=player.id_in_group % 2 == 0))
+
+
+def test_the_last_two_live_rounds_with_a_dropout(players):
+    first, silent = players[0], players[-1]
+    code = first.session.code
+    state = live.live_method(first, dict(type="load"))[first.id_in_group]
+    assert state["type"] == "state" and state["round"] == LAST - 1 and state["choice"] is None
+
+    # closed by the last choice, the result goes to everyone
+    assert [choose(p, LAST - 1) for p in players[:-1]] == [None] * (len(players) - 1)
+    assert live._pending[code][first.group.id] == {silent.participant_id}
+    results = choose(silent, LAST - 1)
+    assert sorted(results) == [p.id_in_group for p in players]
+    assert {r["type"] for r in results.values()} == {"result"}
+    assert results[silent.id_in_group]["next"]["round"] == LAST
+    assert first.group.live_round == LAST
+    assert first.group.id not in live._pending.get(code, {})
+
+    # a choice for a closed round is not accepted: the state of the open round comes back
+    assert choose(first, LAST - 1)[first.id_in_group]["round"] == LAST
+
+    # the last round: the silent participant misses the deadline
+    assert [choose(p, LAST) for p in players[:-1]] == [None] * (len(players) - 1)
+    assert live.live_method(first, dict(type="tick")) is None  # before the deadline
+    last_round = first.group.in_round(LAST)
+    last_round.opened_at -= Constants.decision_pages_timeout_seconds + 1
+    results = live.live_method(first, dict(type="tick"))
+    assert results[silent.id_in_group]["is_dropout"]
+    assert results[silent.id_in_group]["choice"] is not None  # autoplayed
+    assert results[first.id_in_group]["next"] == dict(round=None)
+    assert first.group.live_round == LAST + 1
+
+    # the last round is closed: the session is forgotten
+    assert code not in live._pending
+    assert live.live_method(first, dict(type="tick")) is None
+    assert code not in live._pending
+
+    group_ids = [first.group.in_round(LAST - 1).id, last_round.id]
+    for group in load_groups(group_ids):
+        assert group.field_maybe_none("closed_at") is not None
+        by_id = {p.id_in_group: p for p in group.get_players()}
+        assert by_id[len(by_id)].is_dropout == (group.round_number == LAST)
+        assert all(p.field_maybe_none("choice") is not None for p in by_id.values())
@@ -0,0 +1,53 @@
+"""Filling the lobby with bots (lobby.py): reserving them, starting them, and running out of them."""
+import pytest
+
+from shared.payoffs import MAJORITY, MINORITY
+from unpop import lobby
+
+
+@pytest.fixture
+def subsession():
+    """the first unpop round of a new session with six reserved participants (id_in_session 200-205)"""
+    from otree.database import db
+    from otree.session import create_session
+
+    session = create_session(
+        "unpopular_norm_test",
+        num_participants=205,
+        modified_session_config_fields=dict(network_condition="test_n10", group_size=10),
+    )
+    db.commit()
+    return next(s for s in session.get_subsessions() if s.get_folder_name() == "unpop")
+
+
+def test_reserve_bots(subsession):
+    bots = lobby.reserve_bots(subsession, {MAJORITY: 2, MINORITY: 1})
+    participants = [p.participant for p in bots]
+    assert [p.id_in_session for p in participants] == [200, 201, 202]
+    assert [p.role for p in participants] == [MAJORITY, MAJORITY, MINORITY]
+    assert [p.label for p in participants] == ["bot200", "bot201", "bot202"]
+    assert all(p.visited and p.consent and p.vars["bot"] for p in participants)
+
+    # reserved bots are not handed out again
+    assert [p.participant.id_in_session for p in lobby.reserve_bots(subsession, {MINORITY: 3})] == [203, 204, 205]
+
+
+def test_running_out_of_bots(subsession):
+    assert lobby.reserve_bots(subsession, {MAJORITY: 4, MINORITY: 3}) == []
+    # none of them is used up
+    assert not any(p.participant.visited for p in subsession.get_players())
+    assert len(lobby.reserve_bots(subsession, {MAJORITY: 6})) == 6
+
+
+def test_start_bots(subsession):
+    bots = lobby.reserve_bots(subsession, {MAJORITY: 1, MINORITY: 1})
+    for node, bot in enumerate(bots):
+        bot.participant.node = node
+    lobby.start_bots(bots)
+
+    for bot in bots:
+        participant = bot.participant
+        assert participant.is_dropout
+        # past every page: no wait page waits for it, and its link leads nowhere
+        assert participant._index_in_pages > participant._max_page_index
+        assert participant._url_i_should_be_on() == f"/OutOfRangeNotification/{participant.code}"
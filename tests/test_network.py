@@ -0,0 +1,72 @@
+"""Networks that change between rounds (Network.at_round, network.py)."""
+import json
+
+import pytest
+
+from unpop.network import Network, _edge, _neighbors_from_matrix, load_network
+
+
+def edges(network_round):
+    return {(i, j) for i, neighbors in enumerate(network_round.neighbors) for j in neighbors if i < j}
+
+
+def fresh(condition):
+    """a Network of the file that has not computed any round yet"""
+    network = load_network(condition)
+    with open(f"networks/network_{condition}.json") as f:
+        net = json.load(f)
+    return Network(_neighbors_from_matrix(net["adj_matrix"]), net["role_vector"], network.digest, net.get("rewiring"))
+
+
+def test_without_rewiring_every_round_is_the_first():
+    network = load_network("test_n20")
+    assert network.at_round(30) is network.at_round(1)
+
+
+def test_fraction_rewiring_keeps_the_number_of_edges():
+    network = load_network("test_n20_rewiring")
+    first = edges(network.at_round(1))
+    moved = round(network.rewiring["fraction"] * len(first))
+    for round_number in range(2, 11):
+        previous, current = network.at_round(round_number - 1), network.at_round(round_number)
+        assert len(edges(current)) == len(first)
+        removed = {_edge(i, j) for i, j in current.removed}
+        added = {_edge(i, j) for i, j in current.added}
+        assert edges(current) == (edges(previous) - removed) | added
+        assert 0 < len(current.added) <= moved
+        # symmetric neighbor lists, without self-loops, and degrees that match them
+        for i, neighbors in enumerate(current.neighbors):
+            assert i not in neighbors
+            assert all(i in current.neighbors[j] for j in neighbors)
+            assert current.degree[i] == len(neighbors)
+
+
+def test_rounds_are_the_same_in_every_process():
+    # another process computes the rounds from the file alone, possibly skipping ahead
+    network = load_network("test_n20_rewiring")
+    other = fresh("test_n20_rewiring")
+    assert other.at_round(8).neighbors == network.at_round(8).neighbors
+    assert other.at_round(3).neighbors == network.at_round(3).neighbors
+    assert network.at_round(3) is network.at_round(3)
+
+
+def test_scheduled_rewiring():
+    network = Network(
+        [(1,), (0, 2), (1,)],
+        [0, 0, 1],
+        "digest",
+        {"schedule": {"3": {"remove": [[0, 1]], "add": [[0, 2]]}}},
+    )
+    assert network.at_round(2).neighbors == [(1,), (0, 2), (1,)]
+    assert network.at_round(3).neighbors == [(2,), (2,), (0, 1)]
+    assert network.at_round(4).neighbors == network.at_round(3).neighbors
+    assert network.at_round(3).degree == [1, 1, 2]
+
+
+@pytest.mark.parametrize("round_number", [1, 5])
+def test_csr_matches_the_neighbor_lists(round_number):
+    network_round = load_network("test_n20_rewiring").at_round(round_number)
+    indices, indptr, rows = network_round.csr()
+    for i, neighbors in enumerate(network_round.neighbors):
+        assert tuple(indices[indptr[i]:indptr[i + 1]]) == neighbors
+        assert set(rows[indptr[i]:indptr[i + 1]]) <= {i}
@@ -0,0 +1,30 @@
+"""The SQL queries of the unpop pages and the round close do not grow with the group (prefetch.py)."""
+import pytest
+from query_count import QueryCounter, count_queries, page_methods
+from round_close import prepare_session
+
+# round 2 of a session created by prepare_session (see benchmarks/readme.txt)
+EXPECTED = {
+    "DecisionPage.vars_for_template": 10,
+    "ResultsWaitPage.vars_for_template": 6,
+    "ResultsPage.vars_for_template": 8,
+    "Group.set_first_stage_earnings": 8,
+}
+
+
+@pytest.fixture(scope="module")
+def counter():
+    from otree.database import engine
+
+    return QueryCounter(engine)
+
+
+def query_counts(counter, network):
+    group = prepare_session(network, 2, 0.1)[1]
+    player_id = group.get_players()[0].id
+    return {name: count_queries(counter, func, player_id) for name, func in page_methods().items()}
+
+
+@pytest.mark.parametrize("network", ["test_n10", "test_n100"])
+def test_query_counts(counter, network):
+    assert query_counts(counter, network) == EXPECTED
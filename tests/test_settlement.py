@@ -0,0 +1,51 @@
+"""Bonus settlement (settlement.py): conversion, clamping and rounding, and the payout file."""
+import numpy as np
+import pytest
+from round_close import load_groups, prepare_session
+
+from shared.payoffs import MAJORITY
+from unpop import settlement
+
+
+@pytest.mark.parametrize("points, is_majority, bonus", [
+    (701, True, 1.01),  # 350.5 cents: half a cent rounds up
+    (699, True, 1.0),  # 349.5 cents
+    (698, True, 0.99),
+    (201, False, 2.53),  # 502.5 cents at the minority's conversion
+    (100, True, 0.0),  # below the base payment
+    (5000, True, 5.0),  # above the maximum payment: max_payment - base_payment
+    (0, False, 0.0),
+])
+def test_bonuses(points, is_majority, bonus):
+    assert settlement.bonuses(np.array([points]), np.array([is_majority])).tolist() == [bonus]
+
+
+def test_settle(tmp_path):
+    from otree.database import db
+
+    from unpop import Constants
+
+    group = prepare_session("test_n10", 1, 0)[0]
+    session = group.session
+    participants = sorted(session.get_participants(), key=lambda p: p.id_in_session)
+    for participant in participants:
+        participant.payoff = 701 if participant.role == MAJORITY else 201
+        participant.label = f"p{participant.id_in_session}"
+    participants[0].is_dropout = True
+    participants[1].vars["exit_early"] = True
+    participants[2].vars["bot"] = True
+    unpaid = {p.label: 0 for p in participants[:3]}
+    expected = {p.label: 1.01 if p.role == MAJORITY else 2.53 for p in participants[3:]}
+    db.commit()
+
+    path = tmp_path / "bonus.csv"
+    num_paid, total = settlement.settle(session, str(path))
+    db.commit()
+
+    assert num_paid == len(expected)
+    assert total == pytest.approx(sum(expected.values()))
+    assert path.read_text().splitlines() == [f"{label},{bonus:.2f}" for label, bonus in expected.items()]
+
+    last_round = load_groups([group.id])[0].in_round(Constants.num_rounds)
+    bonuses = {p.participant.label: p.bonus for p in last_round.get_players()}
+    assert bonuses == dict(unpaid, **expected)
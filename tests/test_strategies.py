@@ -0,0 +1,60 @@
+"""Dropout strategies (strategies.py) against the payoff model they stand in for."""
+import numpy as np
+import pytest
+
+from shared.payoffs import MAJORITY, compute_utility
+from unpop.network import NetworkRound
+from unpop.strategies import STRATEGIES, choose_for_dropouts
+
+# a star: node 0 (majority) with four neighbors; node 1 is the only minority node
+STAR = NetworkRound([(1, 2, 3, 4), (0,), (0,), (0,), (0,)], [4, 1, 1, 1, 1])
+IS_MINORITY = np.array([False, True, False, False, False])
+NO_CHOICE = -1
+
+
+def choose(name, previous_choice, nodes=(0,), round_number=2, seed=1):
+    return choose_for_dropouts(name, seed, round_number, STAR, list(nodes), IS_MINORITY, np.array(previous_choice))
+
+
+@pytest.mark.parametrize("blue_neighbors", range(5))
+def test_best_response_is_compute_utility_best_response(blue_neighbors):
+    neighbors = [True] * blue_neighbors + [False] * (4 - blue_neighbors)
+    previous_choice = [NO_CHOICE] + [int(choice) for choice in neighbors]
+    blue_pays_more = compute_utility(True, MAJORITY, neighbors) > compute_utility(False, MAJORITY, neighbors)
+    assert choose("best_response", previous_choice)[0] == blue_pays_more
+
+
+def test_best_response_without_information():
+    # no neighbor chose last round: Red pays s, Blue nothing; the minority node still picks Blue
+    assert choose("best_response", [NO_CHOICE] * 5, nodes=(0, 1)).tolist() == [False, True]
+
+
+def test_imitate_majority():
+    assert choose("imitate_majority", [0, 1, 1, 1, 0])[0]
+    assert not choose("imitate_majority", [0, 1, 0, 0, 1])[0]
+    # a tie: own preference
+    assert not choose("imitate_majority", [1, 1, 1, 0, 0])[0]
+
+
+def test_fixed_preference():
+    assert choose("fixed_preference", [1] * 5, nodes=range(5)).tolist() == [False, True, False, False, False]
+
+
+def test_current_rule_draws_depend_on_seed_and_round_only():
+    nodes = range(5)
+    draws = choose("current", [0] * 5, nodes=nodes)
+    assert draws.tolist() == choose("current", [1] * 5, nodes=nodes).tolist()
+    assert draws[1]  # minorities always choose Blue
+    rounds = {tuple(choose("current", [0] * 5, nodes=nodes, round_number=r)) for r in range(1, 30)}
+    assert len(rounds) > 1
+
+
+def test_every_strategy_returns_a_choice_per_node():
+    for name in STRATEGIES:
+        assert choose(name, [NO_CHOICE] * 5, nodes=(4, 0)).shape == (2,)
+        assert choose(name, [NO_CHOICE] * 5, nodes=()).shape == (0,)
+
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError, match="unknown dropout_strategy"):
+        choose("no_such_strategy", [0] * 5)
@@ -0,0 +1,67 @@
+"""Where the time of a round goes (timing.py), from fixed arrival times."""
+import pytest
+
+from unpop.timing import round_timing
+
+
+def record(name, shown, submitted, arrived, autoplayed=False):
+    return dict(name=name, shown=shown, submitted=submitted, arrived=arrived, autoplayed=autoplayed)
+
+
+def test_a_slow_human_then_an_autoplayed_dropout():
+    records = [
+        record("P1", 0, 10, 10),
+        record("P2", 0, 20, 20),
+        record("P3", 0, 30, 30),
+        record("P4", 0, 50, 50),  # slow
+        record("P5", 0, 60, 60, autoplayed=True),  # timed out
+    ]
+    timing = round_timing(records, closed_at=61)
+    assert timing == dict(
+        critical_participant="P5",
+        critical_autoplayed=True,
+        duration=61,
+        spread=30,  # last arrival - median arrival
+        human_seconds=20,  # median to the last human
+        dropout_seconds=10,  # last human to the dropout
+        num_decisions=4,  # the dropout's timeout is left out
+        decision_p50=25,
+        decision_p95=47,
+        decision_max=50,
+    )
+
+
+def test_a_slow_human_last():
+    records = [record("P1", 0, 10, 10), record("P2", 0, 20, 20), record("P3", 0, 30, 30), record("P4", 0, 50, 50)]
+    timing = round_timing(records, closed_at=None)  # closed on the last arrival
+    assert timing["critical_participant"] == "P4" and not timing["critical_autoplayed"]
+    assert timing["duration"] == 50
+    assert (timing["spread"], timing["human_seconds"], timing["dropout_seconds"]) == (25, 25, 0)
+
+
+def test_only_dropouts_after_the_median():
+    records = [record("P1", 0, 10, 10), record("P2", 0, 60, 60, True), record("P3", 0, 60, 60.5, True)]
+    timing = round_timing(records, closed_at=61)
+    assert (timing["spread"], timing["human_seconds"], timing["dropout_seconds"]) == (0.5, 0, 0.5)
+
+
+def test_a_round_without_decision_times():
+    records = [record("P1", None, None, 105), record("P2", None, None, 107), record("P3", None, None, None)]
+    timing = round_timing(records, closed_at=None)
+    # no decision shown: the round starts at the first arrival
+    assert timing["duration"] == 2
+    assert timing["critical_participant"] == "P2"
+    assert timing["num_decisions"] == 0
+    assert "decision_p50" not in timing and "decision_max" not in timing
+
+
+def test_a_round_without_arrivals():
+    assert round_timing([record("P1", 0, None, None)], closed_at=60) is None
+
+
+@pytest.mark.parametrize("autoplayed", [False, True])
+def test_one_player(autoplayed):
+    timing = round_timing([record("P1", 100, 112.34, 112.34, autoplayed)], closed_at=112.5)
+    assert timing["duration"] == 12.5
+    assert timing["spread"] == timing["human_seconds"] == timing["dropout_seconds"] == 0
+    assert timing["num_decisions"] == (0 if autoplayed else 1)
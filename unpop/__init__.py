@@ -1,21 +1,23 @@
 from otree.api import *
-import json
-import os
 import random
+import time
 import logging
-import datetime
-from .functions import compute_utility, payoff_table
+from sqlalchemy import Index, case, func
+from sqlalchemy.orm import defer
+from shared import payoffs, profiling
+from shared.events import log_event, log_shown, log_submit, recording
+from shared.payoff_tables import payoff_table_vars
+from . import logs
+from .bulk import RoundWrites
+from .layout import layout_url
+from .network import network_path, network_ref, session_network
+from .prefetch import is_playing, neighborhood_rows, read_vars, round_rows
+from . import analytics, closing, heartbeat, live, lobby, settlement
+from .deadlines import decision_timeout, missed_deadline, record_response_time, register_decision
+from .timing import round_timing, session_timing
 
 from settings import (
     title as TITLE,
-    majority_role as MAJORITY,
-    minority_role as MINORITY,
-    s as S,
-    e as E,
-    z as Z,
-    w as W,
-    lambda1 as L1,
-    lambda2 as L2,
     base_payment as base,
     max_payment as maxp,
     points_per_euro_majority as PPE1,
@@ -32,35 +34,21 @@ Participants receive updated instructions including an updated payoff matrix bas
 """
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.INFO)
-log_dir = "otree_log"
-os.makedirs(log_dir, exist_ok=True)
-log_filename = os.path.join(
-    log_dir, f"otree_log_{datetime.datetime.now():%Y-%m-%d_%H-%M-%S}.txt"
-)
-
-if not logger.handlers:
-    fh = logging.FileHandler(log_filename, encoding="utf-8")
-    formatter = logging.Formatter(
-        "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
-    fh.setFormatter(formatter)
-    logger.addHandler(fh)
+logs.setup(logger)  # the file is opened on the first record (see logs.py)
 
 class Constants(BaseConstants):
     title = TITLE
     name_in_url = "fashion_dilemma"
     players_per_group = None
     num_rounds = nrounds
-    majority = MAJORITY
-    minority = MINORITY
-    s = S
-    e = E
-    z = Z
-    w = W
-    lambda1 = L1
-    lambda2 = L2
+    majority = payoffs.MAJORITY
+    minority = payoffs.MINORITY
+    s = payoffs.S
+    e = payoffs.E
+    z = payoffs.Z
+    w = payoffs.W
+    lambda1 = payoffs.LAMBDA1
+    lambda2 = payoffs.LAMBDA2
     introduction_timeout_seconds = 60
     decision_pages_timeout_seconds = 60
     other_pages_timeout_seconds = 20
@@ -81,13 +69,11 @@ class Subsession(BaseSubsession):
             logger.debug(f"creating_session: session config name = {self.session.config.get('name')}")
             logger.debug(f"creating_session: network_condition = {net_condition}")
 
-            if net_condition and "net_spec" not in self.session.vars:
-                file_path = os.path.join("networks", f"network_{net_condition}.json")
-                logger.debug(f"creating_session: loading net_spec from {file_path}")
-                with open(file_path, "r") as f:
-                    net = json.load(f)
-                self.session.vars["net_spec"] = net
-                logger.debug(f"creating_session: net_spec keys = {list(net.keys())}")
+            # only a reference is stored, the network itself is shared (see network.py)
+            if net_condition and "network" not in self.session.vars:
+                logger.debug(f"creating_session: loading network from {network_path(net_condition)}")
+                self.session.vars["network"] = network_ref(net_condition)
+                logger.debug(f"creating_session: network = {self.session.vars['network']}")
 
             self.session.vars["group_formed"] = False
         else:
@@ -107,45 +93,194 @@ class Player(BasePlayer):
 
     checked_neighbors = models.BooleanField(initial=False) # check whether players take into account 'social cues' from neighbors
 
+    # round timing (see timing.py); decision_shown_at is also used by the adaptive deadlines
+    decision_shown_at = models.FloatField()
+    decision_submitted_at = models.FloatField()
+    wait_arrived_at = models.FloatField()
+
+    # adaptive deadlines (see deadlines.py)
+    grace_deadline = models.BooleanField(initial=False) # deadline shortened to the grace window after the quorum
+    shortened_deadline = models.BooleanField(initial=False) # deadline shortened below the full timeout by the response times
+    autoplayed = models.BooleanField(initial=False) # missed the grace window or a shortened deadline: choice autoplayed this round only
+
+
+# oTree only indexes round_number and id_in_group; pages look up the players of a neighborhood
+# by participant (prefetch.neighborhood_rows). Created with the table, i.e. on a fresh or reset database.
+Index("unpop_player_participant_round", Player.participant_id, Player.round_number)
+
 
 class Group(BaseGroup):
+    # round aggregates for the admin report, written at round close
+    blue_share_majority = models.FloatField()
+    blue_share_minority = models.FloatField()
+    num_active = models.IntegerField()
+    num_dropouts = models.IntegerField()
+    mean_payoff = models.FloatField()
+    majority_switchers = models.IntegerField()  # majority players who changed color since the previous round
+    network_state = models.LongStringField()  # a character per node, for the network view (see layout.py)
+    closed_at = models.FloatField()
+
+    # round timing for the admin report, written at round close (see timing.py)
+    duration = models.FloatField()
+    critical_participant = models.StringField()  # label (or code) of the last to arrive
+    critical_autoplayed = models.BooleanField(initial=False)
+    spread = models.FloatField()  # median to last arrival
+    human_seconds = models.FloatField()
+    dropout_seconds = models.FloatField()
+    num_decisions = models.IntegerField(initial=0)
+    decision_p50 = models.FloatField()
+    decision_p95 = models.FloatField()
+    decision_max = models.FloatField()
+
+    # adaptive deadlines (see deadlines.py)
+    num_decided = models.IntegerField(initial=0)
+    quorum_reached_at = models.FloatField()
+
+    # live rounds (see live.py); live_round is only used on the round-1 group
+    live_round = models.IntegerField(initial=1)
+    opened_at = models.FloatField()
+
     def set_first_stage_earnings(self):
-        players = self.get_players()
-        for player in players:
-            if player.participant.vars.get("exit_early", False):
-                player.payoff = 0
-                continue
-
-            my_choice = player.choice
-            my_node = player.participant.node
-            adj_matrix = player.session.vars["net_spec"]["adj_matrix"]
-
-            neighbors = []
-            for i, connection in enumerate(adj_matrix[my_node]):
-                if connection == 1:
-                    neighbor_player = next(
-                        p for p in players if p.participant.node == i
-                    )
-                    if (
-                            not neighbor_player.participant.vars.get("exit_early", False)
-                            and not neighbor_player.participant.vars.get("failed_checks", False)
-                    ):
-                        neighbors.append(i)
-
-            neighbor_choices = []
-            for neighbor_id in neighbors:
-                neighbor_player = next(
-                    p for p in players if p.participant.node == neighbor_id
-                )
-                neighbor_choices.append(neighbor_player.choice)
+        """
+        Close the round: autoplay dropouts, compute payoffs and the round aggregates.
+        The round is read into plain data, computed by closing.compute_round (which the
+        ResultsWaitPage can also run in a worker, see closing.py) and written back in bulk.
+        """
+        self.write_round_result(closing.compute_round(self.round_inputs()))
+
+    def round_inputs(self):
+        """the players, participants and previous choices of the round, for closing.compute_round"""
+        # players, participants and the previous round's choices in two queries (see prefetch.py)
+        rows = round_rows(self, previous=True)
+        replay = recording(self.session)
+        inputs = closing.RoundInputs(
+            self.round_number,
+            self.session.vars["network"],
+            self.session.config.get("dropout_strategy"),
+            self.session.config.get("dropout_seed"),
+            self.session.code,
+        )
+        for player in rows.players:
+            participant_vars = read_vars(player.participant)
+            inputs.add(
+                player_id=player.id,
+                node=participant_vars["node"],
+                role=participant_vars["role"],
+                choice=player.field_maybe_none("choice"),
+                previous_choice=rows.previous_choice(player),
+                is_dropout=participant_vars["is_dropout"],
+                autoplayed=player.autoplayed,
+                exit_early=participant_vars.get("exit_early", False),
+                failed_checks=participant_vars.get("failed_checks", False),
+                recorded=replay and replay["autoplay"].get((player.participant.label, self.round_number)),
+            )
+        return inputs
 
-            utility = compute_utility(
-                player_choice=my_choice,
-                player_role=player.participant.role,
-                neighbors_choices=neighbor_choices,
+    def write_round_result(self, result):
+        """write a closing.RoundResult; all writes are flushed in bulk (one UPDATE per table)"""
+        players = round_rows(self).players
+        writes = RoundWrites()
+        for player in players:
+            if player.id in result.autoplay:
+                writes.set(player, "choice", result.autoplay[player.id])
+                log_event(player, "autoplay", choice=result.autoplay[player.id])
+            writes.set_payoff(player, result.payoffs.get(player.id, 0))
+
+        for field, value in result.aggregates.items():
+            writes.set(self, field, value)
+
+        # the player whose arrival closes the round never sees the wait page
+        closed_at = time.time()
+        writes.set(self, "closed_at", closed_at)
+        # dropouts and missed deadlines; the timing counts their waits apart from the humans'
+        autoplayed = set(result.autoplay) | {
+            player_id
+            for player_id, is_dropout, was_autoplayed in zip(
+                result.inputs.player_ids, result.inputs.is_dropout, result.inputs.autoplayed
             )
+            if is_dropout or was_autoplayed
+        }
+        records = []
+        for player in players:
+            submitted = player.field_maybe_none("decision_submitted_at")
+            arrived = player.field_maybe_none("wait_arrived_at")
+            if submitted is not None and arrived is None:
+                arrived = closed_at
+                writes.set(player, "wait_arrived_at", closed_at)
+            records.append(dict(
+                name=player.participant.label or player.participant.code,
+                shown=player.field_maybe_none("decision_shown_at"),
+                submitted=submitted,
+                arrived=arrived,
+                autoplayed=player.id in autoplayed,
+            ))
+
+        # where the time of the round went, once, for the admin report (see timing.py)
+        for field, value in (round_timing(records, closed_at) or {}).items():
+            writes.set(self, field, value)
+
+        statements = writes.flush()
+        logger.debug(
+            f"[R{self.round_number:02d}] round closed for {len(players)} players "
+            f"with {statements} bulk UPDATE statements"
+        )
+
+        # a copy of the round for analysis during the session (see analytics.py)
+        analytics.append_round(self, result, closed_at, last_round=self.round_number == Constants.num_rounds)
+        heartbeat.round_closed(self)
+
+        if self.round_number == Constants.num_rounds:
+            # the game is over: every bonus is settled now, for all participants at once
+            settlement.settle(self.session)
+
+
+def vars_for_admin_report(subsession):
+    """
+    Cascade dashboard: the aggregates of every closed round, read from the Group rows
+    in one query (a handful of numbers per round, whatever the size of the group),
+    the timing of every round (written at round close, see timing.py), and the network view: the colors of the
+    nodes in the report's round, or the last closed round before it (see layout.py).
+    """
+    groups = (
+        Group.objects_filter(Group.num_active.isnot(None), session=subsession.session)
+        .options(defer(Group.network_state))  # only the shown round's is needed
+        .order_by(Group.round_number)
+        .all()
+    )
+
+    def percent(share):
+        return None if share is None else round(100 * share)
+
+    rounds = [
+        dict(
+            round_number=g.round_number,
+            blue_majority=percent(g.blue_share_majority),
+            blue_minority=percent(g.blue_share_minority),
+            num_active=g.num_active,
+            num_dropouts=g.num_dropouts,
+            mean_payoff=round(g.mean_payoff, 1),
+            majority_switchers=g.majority_switchers,
+        )
+        for g in groups
+    ]
+
+    timing, timing_totals = session_timing(groups)
+
+    network = session_network(subsession.session)
+    shown = [g for g in groups if g.round_number <= subsession.round_number]
+    return dict(
+        has_network=network is not None,
+        network_layout_url=network and layout_url(network),  # None while it is being computed
+        network_round=shown[-1].round_number if shown else None,
+        network_state=shown[-1].network_state if shown else None,
+        rounds=rounds,
+        last=rounds[-1] if rounds else None,
+        timing=timing,
+        timing_totals=timing_totals,
+        has_decision_times=timing_totals["decisions"] > 0,
+        decision_timeout=Constants.decision_pages_timeout_seconds,
+    )
 
-            player.payoff = max(utility, 0)
 
 def timeout_check(player, timeout_happened):
     """
@@ -158,6 +293,7 @@ def timeout_check(player, timeout_happened):
     if timeout_happened and not participant.is_dropout:
         participant.is_dropout = True
         player.is_dropout = True
+        log_event(player, "dropout")
         logger.info(
             f"[R{player.round_number:02d}] P{player.id_in_group} ({participant.label}) | "
             f"MARKED DROPOUT (AUTO PLAY)"
@@ -178,24 +314,22 @@ def group_by_arrival_time_method(subsession, waiting_players):
     session = subsession.session
     group_size = session.config["group_size"]
 
-    # ensure net_spec is loaded
-    if "net_spec" not in session.vars:
+    # ensure the network is loaded
+    if "network" not in session.vars:
         net_condition = session.config.get("network_condition")
-        logger.debug(f"group_by_arrival_time_method: net_spec missing, trying to load. network_condition = {net_condition}")
+        logger.debug(f"group_by_arrival_time_method: network missing, trying to load. network_condition = {net_condition}")
 
         if net_condition:
-            file_path = os.path.join("networks", f"network_{net_condition}.json")
-            logger.debug(f"group_by_arrival_time_method: loading net_spec from {file_path}")
+            file_path = network_path(net_condition)
+            logger.debug(f"group_by_arrival_time_method: loading network from {file_path}")
             try:
-                with open(file_path, "r") as f:
-                    net = json.load(f)
-                session.vars["net_spec"] = net
-                logger.debug(f"group_by_arrival_time_method: net_spec loaded, keys = {list(net.keys())}")
+                session.vars["network"] = network_ref(net_condition)
+                logger.debug(f"group_by_arrival_time_method: network loaded = {session.vars['network']}")
             except Exception as e:
-                logger.error(f"group_by_arrival_time_method: FAILED to load net_spec: {repr(e)}")
+                logger.error(f"group_by_arrival_time_method: FAILED to load network: {repr(e)}")
 
     logger.debug(f"group_by_arrival_time_method: group_formed = {session.vars.get('group_formed')}")
-    logger.debug(f"group_by_arrival_time_method: net_spec present = {'net_spec' in session.vars}")
+    logger.debug(f"group_by_arrival_time_method: network present = {'network' in session.vars}")
 
     # form a single group in this session
     if session.vars.get("group_formed", False):
@@ -203,28 +337,32 @@ def group_by_arrival_time_method(subsession, waiting_players):
         for p in waiting_players:
             p.participant.vars["exit_early"] = True
             p.participant.is_dropout = True
+            log_event(p, "exit_early")
         return waiting_players  # let them proceed
 
-    net_spec = session.vars.get("net_spec", None)
+    network = session_network(session)
 
-    if not net_spec:
+    if not network:
         logger.warning(
-            "group_by_arrival_time_method: STILL no net_spec after fallback – "
+            "group_by_arrival_time_method: STILL no network after fallback – "
             "check network_condition and JSON path."
         )
         return
 
-    logger.debug("group_by_arrival_time_method: USING PREDEFINED net_spec")
+    logger.debug("group_by_arrival_time_method: USING PREDEFINED network")
 
-    # helper function to assign nodes and push adj_matrix to all selected players
-    def assign_nodes_and_matrix(selected_players, adj_matrix):
+    # helper function to assign nodes to all selected players
+    # (participants only store their node; the network is shared, see network.py)
+    def assign_nodes(selected_players, network):
         for i, p in enumerate(selected_players):
             p.participant.node = i
-            #p.participant.adj_matrix = adj_matrix
             p.participant.is_dropout = False
+            log_event(p, "node", node=i)
 
+        if not logger.isEnabledFor(logging.DEBUG):
+            return  # the dump below is as long as the network
         logger.debug("=== NETWORK DEBUG START ===")
-        logger.debug(f"Adjacency matrix: {adj_matrix}")
+        logger.debug(f"Neighbors: {network.neighbors}")
 
         logger.debug("Player -> Node assignment:")
         for p in selected_players:
@@ -235,14 +373,20 @@ def group_by_arrival_time_method(subsession, waiting_players):
 
         logger.debug("=== NETWORK DEBUG END ===")
 
-    adj_matrix = net_spec["adj_matrix"]
-    role_vector = net_spec["role_vector"]
-    n = len(role_vector)
+    role_vector = network.role_vector
+    n = len(network)
     if n != group_size:
         logger.warning(
             f"Configured group_size={group_size} but role_vector has length {n}. Using n={n}."
         )
 
+    # without bots to fill in, there is nothing to do until every node can be taken
+    if len(waiting_players) < n and not lobby.enabled(session):
+        return
+
+    # the participants of the session in one query, rather than one per waiting player
+    session.get_participants()
+
     # map role_vector to assigned role labels
     role_for_idx = [
         Constants.minority if v == 1 else Constants.majority
@@ -269,27 +413,39 @@ def group_by_arrival_time_method(subsession, waiting_players):
         Constants.minority: len(by_role[Constants.minority]),
     }
 
+    # a short lobby can be filled with server-side bots after a deadline (see lobby.py)
+    shortage = {role: max(required_counts[role] - have_counts[role], 0) for role in required_counts}
+    bots = []
+    if any(shortage.values()) and lobby.should_fill(session, waiting_players, n):
+        bots = lobby.reserve_bots(subsession, shortage)
+        for bot in bots:
+            by_role[bot.participant.role].append(bot)
+            have_counts[bot.participant.role] += 1
+
     if (
         have_counts[Constants.majority] >= required_counts[Constants.majority]
         and have_counts[Constants.minority] >= required_counts[Constants.minority]
     ):
         players_ordered = []
         buckets = {
-            Constants.majority: by_role[Constants.majority][:],
-            Constants.minority: by_role[Constants.minority][:],
+            Constants.majority: iter(by_role[Constants.majority]),
+            Constants.minority: iter(by_role[Constants.minority]),
         }
         for i in range(n):
             needed_role = role_for_idx[i]
-            if not buckets[needed_role]:
+            p = next(buckets[needed_role], None)
+            if p is None:
                 logger.error(
                     f"Unexpected shortage for role {needed_role} at node {i}."
                 )
                 return  # wait for more players
-            players_ordered.append(buckets[needed_role].pop(0))
+            players_ordered.append(p)
 
-        assign_nodes_and_matrix(players_ordered, adj_matrix)
+        assign_nodes(players_ordered, network)
+        lobby.start_bots(bots)
         session.vars["group_formed"] = True
-        logger.info(f"Populated network with {n} players.")
+        session.vars["num_bots"] = len(bots)
+        logger.info(f"Populated network with {n} players ({len(bots)} bots).")
         return players_ordered
     else:
         logger.info(
@@ -314,11 +470,11 @@ class NetworkFormationWaitPage(WaitPage):
     def vars_for_template(player):
         if not player.arrived_grouppage:
             player.arrived_grouppage = True
+            log_event(player, "wait", page="NetworkFormationWaitPage")
 
-        waiting_players = player.subsession.get_players()
-        total_arrived = sum(p.arrived_grouppage for p in waiting_players)
+        total_arrived = Player.objects_filter(subsession=player.subsession, arrived_grouppage=True).count()
 
-        group_size = player.session.config.get("group_size", len(waiting_players))
+        group_size = player.session.config.get("group_size", 0)
         total_needed = int(group_size * 1.3)  # buffer
 
         if total_needed == 0:
@@ -336,10 +492,9 @@ class NetworkFormationWaitPage(WaitPage):
 
 class IntroductionPage(Page):
     def vars_for_template(player):
-        adj_matrix = player.session.vars["net_spec"]["adj_matrix"]
-        my_node = player.participant.node
-        degree = sum(adj_matrix[my_node])
-        table_data = payoff_table(degree)
+        log_shown(player, "IntroductionPage")
+        network = session_network(player.session).at_round(player.round_number)
+        degree = network.degree[player.participant.node]
         group_size = player.session.config["group_size"]
 
         return dict(
@@ -349,9 +504,9 @@ class IntroductionPage(Page):
             others=group_size-1,
             degree=degree,
             range_neighbors=list(range(degree + 1)) if degree > 0 else [],
-            table_data=table_data,
             base="{:.2f}".format(Constants.base_payment),
             max="{:.2f}".format(Constants.max_payment),
+            **payoff_table_vars(player.session, player.participant.role, degree),
         )
 
     def is_displayed(player):
@@ -365,78 +520,109 @@ class IntroductionPage(Page):
         return timeout_time(player, Constants.introduction_timeout_seconds)
 
     def before_next_page(player, timeout_happened):
+        log_submit(player, "IntroductionPage", timeout_happened)
         timeout_check(player, timeout_happened)
         player.prolific_id = player.participant.label
 
 
+class LiveRoundPage(Page):
+    """all rounds on one page, played over live_method (session config live_rounds, see live.py)"""
+    live_method = live.live_method
+
+    @staticmethod
+    def is_displayed(player):
+        return (
+            player.round_number == 1
+            and live.enabled(player.session)
+            and is_playing(player)
+        )
+
+    def vars_for_template(player):
+        log_shown(player, "LiveRoundPage")
+        return dict(
+            role=player.participant.role,
+            group_size=player.session.config["group_size"],
+            num_rounds=Constants.num_rounds,
+            heartbeat_seconds=heartbeat.interval(player.session),
+        )
+
+    def error_message(player, values):
+        if player.group.live_round <= Constants.num_rounds and not player.participant.is_dropout:
+            return "The game is not over yet."
+
+    def before_next_page(player, timeout_happened):
+        log_submit(player, "LiveRoundPage", timeout_happened)
+
+
 class DecisionPage(Page):
     form_model = "player"
     form_fields = ["choice", "checked_neighbors"]
+    live_method = heartbeat.live_method  # the page only connects when heartbeat_seconds is set (DecisionPage.html)
 
     def get_timeout_seconds(player):
+        if player.session.config.get("adaptive_deadlines") and not player.participant.is_dropout:
+            return decision_timeout(player, Constants.decision_pages_timeout_seconds)
         return timeout_time(player, Constants.decision_pages_timeout_seconds)
 
     def before_next_page(player, timeout_happened):
-        timeout_check(player, timeout_happened)
-
-        if timeout_happened or player.participant.is_dropout:
-            if player.participant.role == Constants.minority:
-                player.choice = True  # minorities stick to their preference
-            else:
-                player.choice = (random.random() < p_minority) # majority pick their preference with 1-p_minority
-                #player.choice = random.random() < 0.5 # or fully random...
+        # dropouts (incl. this timeout) are autoplayed in bulk at round close,
+        # see Group.set_first_stage_earnings
+        player.decision_submitted_at = time.time()
+        log_submit(player, "DecisionPage", timeout_happened, DecisionPage.form_fields)
+        if not player.session.config.get("adaptive_deadlines"):
+            timeout_check(player, timeout_happened)
+            return
+
+        if timeout_happened and missed_deadline(player):
+            # missed the grace window or a personal deadline: autoplayed this round, no dropout
+            log_event(player, "grace_timeout" if player.grace_deadline else "deadline_timeout")
+        else:
+            timeout_check(player, timeout_happened)
+        record_response_time(player, timeout_happened)
+        if register_decision(player):
+            log_event(player, "quorum", num_decided=player.group.num_decided)
 
     @staticmethod
     def is_displayed(player: Player):
         return (
                 not player.participant.vars.get("exit_early", False)
                 and not player.participant.vars.get("failed_checks", False)
+                and not live.enabled(player.session)
         )
 
 
     def vars_for_template(player):
-        adj_matrix = player.session.vars["net_spec"]["adj_matrix"]
-        my_node = player.participant.node
-        degree = sum(adj_matrix[my_node])
-
-        table_data = payoff_table(degree)
+        # the participant before the session: loading it first saves a flush of the session vars
+        participant = player.participant
+        log_shown(player, "DecisionPage")
+        heartbeat.seen(player)
+        if player.field_maybe_none("decision_shown_at") is None:
+            player.decision_shown_at = time.time()
+        # the neighborhood of this round (it changes between rounds in rewiring networks)
+        network = session_network(player.session).at_round(player.round_number)
+        my_node = participant.node
+        degree = network.degree[my_node]
 
         num_blue_previous_round = 0
         num_red_previous_round = 0
         if player.round_number > 1:
-            neighbors = [
-                i for i, connection in enumerate(adj_matrix[my_node]) if connection == 1
-            ]
-
-            prev_round = player.round_number - 1
-            num_blue_previous_round = sum(
-                1
-                for p in player.group.get_players()
-                if p.participant.node in neighbors
-                and not p.participant.vars.get("exit_early", False)
-                and not p.participant.vars.get("failed_checks", False)
-                and p.in_round(prev_round).choice is True
-            )
-            num_red_previous_round = sum(
-                1
-                for p in player.group.get_players()
-                if p.participant.node in neighbors
-                and not p.participant.vars.get("exit_early", False)
-                and not p.participant.vars.get("failed_checks", False)
-                and p.in_round(prev_round).choice is False
-            )
+            rows = neighborhood_rows(player, network, previous=True)
+            previous_choices = [rows.previous_choice(p) for p in rows.neighbors(player, network)]
+            num_blue_previous_round = previous_choices.count(True)
+            num_red_previous_round = previous_choices.count(False)
 
         return dict(
             group_size=player.session.config["group_size"],
             network_condition=player.session.config.get("network_condition"),
-            role=player.participant.role,
+            role=participant.role,
             round_number=player.round_number,
             degree=degree,
             range_neighbors=list(range(degree + 1)),
-            table_data=table_data,
             num_blue_previous_round=num_blue_previous_round,
             num_red_previous_round=num_red_previous_round,
-            is_drop_out = player.participant.is_dropout
+            is_drop_out = participant.is_dropout,
+            heartbeat_seconds=heartbeat.interval(player.session),
+            **payoff_table_vars(player.session, participant.role, degree),
         )
 
 
@@ -448,57 +634,77 @@ class ResultsWaitPage(WaitPage):
         return (
                 not player.participant.vars.get("exit_early", False)
                 and not player.participant.vars.get("failed_checks", False)
+                and not live.enabled(player.session)
         )
 
     def vars_for_template(player):
         # mark this player as arrived ONLY ONCE
         if not player.arrived_waitpage:
             player.arrived_waitpage = True
-
-        players = player.group.get_players()
-        arrived = sum(p.arrived_waitpage for p in players)
-        total = len(players)
+            player.wait_arrived_at = time.time()
+            log_event(player, "wait", page="ResultsWaitPage")
+        # the players who have decided wait here, and only the silent can still hold up the round
+        heartbeat.check_group(player)
+
+        # counted in the database: the page reloads every few seconds for everyone waiting
+        total, arrived = (
+            Player.objects_filter(group=player.group, round_number=player.round_number)
+            .with_entities(func.count(Player.id), func.count(case([(Player.arrived_waitpage == True, 1)])))
+            .one()
+        )
 
         percent = 100 * arrived / total if total > 0 else 0
 
+        # with adaptive deadlines: how long the stragglers have left after the quorum
+        grace_left = None
+        quorum_reached_at = player.group.field_maybe_none("quorum_reached_at")
+        if quorum_reached_at is not None:
+            grace_left = max(int(player.session.config["grace_seconds"] - (time.time() - quorum_reached_at)), 0)
+
         return dict(
             arrived=arrived,
             total=total,
             percent=percent,
+            quorum_reached=grace_left is not None,
+            grace_left=grace_left,
             is_drop_out=player.participant.is_dropout,
+            reload_seconds=closing.RELOAD_SECONDS if closing.started(player.group) else 10,
         )
 
     def after_all_players_arrive(group):
-        group.set_first_stage_earnings()
+        closing.close(group)
 
     @staticmethod
     def get_timeout_seconds(player):
         return timeout_time(player, 5)
 
+    def _tally_unvisited(self):
+        # with round_close_worker, the group is only complete once the worker has computed
+        # its round close; until then the last player to arrive waits here too (see closing.py).
+        # oTree only closes the round if someone waits for it, or this player is shown the page.
+        is_last, someone_waiting = super()._tally_unvisited()
+        if is_last and (someone_waiting or self._is_displayed()) and closing.worker(self.session):
+            is_last = closing.computed(self.group)
+        return is_last, someone_waiting
+
 
 class ResultsPage(Page):
+    live_method = heartbeat.live_method  # the page only connects when heartbeat_seconds is set (ResultsPage.html)
+
     def vars_for_template(player):
+        log_shown(player, "ResultsPage")
+        heartbeat.seen(player)
         my_choice = player.choice
         my_payoff = player.payoff
 
         my_node = player.participant.node
-        adj_matrix =player.session.vars["net_spec"]["adj_matrix"]
-
-        neighbors = []
-        for i, connection in enumerate(adj_matrix[my_node]):
-            if connection == 1:
-                neighbors.append(i)
+        network = session_network(player.session).at_round(player.round_number)
+        neighbors = network.neighbors[my_node]
+        by_node = neighborhood_rows(player, network).by_node
 
         neighbors_info = []
         for idx, neighbor_id in enumerate(neighbors, start=1):
-            neighbor_player = next(
-                (
-                    p
-                    for p in player.group.get_players()
-                    if p.participant.node == neighbor_id
-                ),
-                None,
-            )
+            neighbor_player = by_node.get(neighbor_id)
             if neighbor_player:
                 if neighbor_player.choice is None:
                     choice_display = "Missing"
@@ -522,14 +728,22 @@ class ResultsPage(Page):
             neighbors_info=neighbors_info,
             role=player.participant.role,
             round_number=player.round_number,
+            heartbeat_seconds=heartbeat.interval(player.session),
         )
 
     def is_displayed(player):
-        return not player.participant.vars.get("exit_early", False) and not player.participant.is_dropout
+        return (
+            not player.participant.vars.get("exit_early", False)
+            and not player.participant.is_dropout
+            and not live.enabled(player.session)
+        )
 
     def get_timeout_seconds(player):
         return timeout_time(player, Constants.other_pages_timeout_seconds)
 
+    def before_next_page(player, timeout_happened):
+        log_submit(player, "ResultsPage", timeout_happened)
+
 
 class FinalGameResults(Page):
     @staticmethod
@@ -546,6 +760,7 @@ class FinalGameResults(Page):
 
     @staticmethod
     def vars_for_template(player):
+        log_shown(player, "FinalGameResults")
         accumulated_earnings = player.participant.payoff
         base = Constants.base_payment
 
@@ -555,25 +770,22 @@ class FinalGameResults(Page):
             else Constants.points_per_euro_minority
         )
 
-        euros = float(accumulated_earnings) / conversion
-        euros = min(euros, Constants.max_payment)
-        euros = max(euros, Constants.base_payment)
-        bonus = max(euros - base, 0)
-
-        player.participant.vars['bonus'] = round(bonus, 2)
+        # settled for everyone when the last round closed (see settlement.py)
+        bonus = player.bonus
+        player.participant.vars['bonus'] = bonus
 
         return dict(
             accumulated_earnings=accumulated_earnings,
             raw_euros=float(accumulated_earnings) / conversion,
             base="{:.2f}".format(base),
             bonus="{:.2f}".format(bonus),
-            euros="{:.2f}".format(euros),
+            euros="{:.2f}".format(base + bonus),
             test = TEST,
         )
 
     @staticmethod
     def before_next_page(player, timeout_happened):
-        player.bonus = player.participant.vars.get('bonus', 0) #replace to next page; after_arrive?
+        log_submit(player, "FinalGameResults", timeout_happened)
 
 class ExitPage(Page):
     """
@@ -656,9 +868,12 @@ class ExitPage(Page):
 page_sequence = [
     NetworkFormationWaitPage,
     IntroductionPage,
+    LiveRoundPage,
     DecisionPage,
     ResultsWaitPage,
     ResultsPage,
     FinalGameResults,
     ExitPage,
 ]
+
+profiling.install(globals(), page_sequence)
@@ -0,0 +1,181 @@
+"""
+Analytics sink: every closed round appended to a SQLite file (session config field
+analytics=True; analytics_db is the path of the file). Off by default: without it, no
+file is created and a round close does not touch SQLite.
+
+Researchers can query a session while it runs, and analyze it afterwards, from this file
+instead of the oTree database and its exports. Group.write_round_result appends the round
+after writing it, in one transaction: a row per player in "players" (executemany) and a
+row in "rounds" with the round aggregates. Rows are keyed by session, round and
+participant, so a round that is written again replaces its rows. The file is in WAL mode,
+so readers do not hold up the server, and several server processes can share it.
+
+The oTree database stays the record: a round that cannot be appended (the file is locked
+for too long, the disk is full) is logged and the game goes on.
+
+    sqlite3 analytics.sqlite3 "select round_number, avg(choice) from players where role='Red' group by 1"
+"""
+import logging
+import threading
+import time
+
+from otree.api import cu
+
+logger = logging.getLogger(__name__)
+
+_participants_by_node = {}  # session code -> {node: (participant code, label)}, until its last round
+_ready = set()  # files whose schema and WAL mode are set up (by this process)
+_ready_lock = threading.Lock()
+
+SCHEMA = """
+create table if not exists rounds (
+    session_code text not null,
+    round_number integer not null,
+    closed_at real,
+    network text,
+    blue_share_majority real,
+    blue_share_minority real,
+    num_active integer,
+    num_dropouts integer,
+    mean_payoff real,
+    majority_switchers integer,
+    primary key (session_code, round_number)
+);
+create table if not exists players (
+    session_code text not null,
+    round_number integer not null,
+    participant_code text not null,
+    participant_label text,
+    node integer,
+    role text,
+    choice integer,  -- 1 Blue, 0 Red, null no choice
+    payoff real,
+    num_neighbors integer,  -- playing neighbors this round
+    num_blue_neighbors integer,
+    is_dropout integer,
+    autoplayed integer,  -- the choice was made by the dropout strategy
+    exit_early integer,
+    failed_checks integer,
+    primary key (session_code, round_number, participant_code)
+);
+"""
+
+ROUND_FIELDS = (
+    "blue_share_majority",
+    "blue_share_minority",
+    "num_active",
+    "num_dropouts",
+    "mean_payoff",
+    "majority_switchers",
+)
+
+
+def path(session):
+    """the analytics file of the session (None: off)"""
+    config = session.config
+    if not config.get("analytics"):
+        return None
+    return config.get("analytics_db") or None
+
+
+def _set_up(connection, db_path):
+    """create the tables and switch the file to WAL mode, once per file and process"""
+    with _ready_lock:
+        if db_path in _ready:
+            return
+        connection.execute("pragma journal_mode=wal")  # kept in the file
+        connection.executescript(SCHEMA)
+        _ready.add(db_path)
+
+
+def _participants(session):
+    """node -> (participant code, label) of the session's participants in the network"""
+    from otree.models import Participant
+
+    participants = _participants_by_node.get(session.code)
+    if participants is None:
+        query = Participant.objects_filter(session=session).with_entities(
+            Participant.code, Participant.label, Participant._vars
+        )
+        participants = {
+            participant_vars["node"]: (code, label)
+            for code, label, participant_vars in query
+            if participant_vars.get("node") is not None
+        }
+        _participants_by_node[session.code] = participants
+    return participants
+
+
+def round_rows(session_code, round_number, participants, result):
+    """a "players" row per player of a closed round, from its closing.RoundResult"""
+    inputs = result.inputs
+    rows = []
+    for i, player_id in enumerate(inputs.player_ids):
+        code, label = participants[inputs.nodes[i]]
+        choice = result.autoplay.get(player_id, inputs.choices[i])
+        num_neighbors, num_blue_neighbors = result.neighbor_counts.get(player_id, (None, None))
+        rows.append((
+            session_code,
+            round_number,
+            code,
+            label,
+            inputs.nodes[i],
+            inputs.roles[i],
+            None if choice is None else int(choice),
+            float(cu(result.payoffs.get(player_id, 0))),  # as Group.write_round_result stores it
+            num_neighbors,
+            num_blue_neighbors,
+            int(bool(inputs.is_dropout[i])),
+            int(player_id in result.autoplay),
+            int(bool(inputs.exit_early[i])),
+            int(bool(inputs.failed_checks[i])),
+        ))
+    return rows
+
+
+def append_round(group, result, closed_at, last_round=False):
+    """
+    append the closed round of group (its closing.RoundResult) to the session's analytics
+    file, if it has one; after the last_round, the session's participants are forgotten
+    """
+    db_path = path(group.session)
+    if db_path is None:
+        return
+    import sqlite3
+
+    session_code = group.session.code
+    participants = _participants(group.session)
+    if any(node not in participants for node in result.inputs.nodes):
+        # placed after the first round was appended (e.g. a bot): read the participants again
+        _participants_by_node.pop(session_code)
+        participants = _participants(group.session)
+    rows = round_rows(session_code, group.round_number, participants, result)
+    if last_round:
+        _participants_by_node.pop(session_code, None)
+    aggregates = [result.aggregates.get(field) for field in ROUND_FIELDS]
+    network = result.inputs.network["condition"]
+    start = time.perf_counter()
+    try:
+        connection = sqlite3.connect(db_path, timeout=5)
+        try:
+            _set_up(connection, db_path)
+            # per connection; in WAL mode a crash loses at most the last rounds
+            connection.execute("pragma synchronous=normal")
+            with connection:
+                connection.execute(
+                    "insert or replace into rounds values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (session_code, group.round_number, closed_at, network, *aggregates),
+                )
+                connection.executemany(
+                    "insert or replace into players values (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                )
+        finally:
+            connection.close()
+    except Exception:
+        _ready.discard(db_path)  # e.g. the file was removed: set it up again next time
+        logger.exception(f"[R{group.round_number:02d}] round of session {session_code} not appended to {db_path}")
+        return
+    logger.debug(
+        f"[R{group.round_number:02d}] {len(rows)} players appended to {db_path} "
+        f"in {1000 * (time.perf_counter() - start):.1f} ms"
+    )
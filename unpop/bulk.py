@@ -0,0 +1,98 @@
+"""
+Bulk writes for closing a round.
+
+Setting player.payoff in oTree commits the whole DB session on every assignment,
+so writing payoffs one player at a time turns a round close into a burst of
+single-row UPDATEs (and commits) while everyone is blocked on the wait page.
+RoundWrites collects the values instead and flushes them as one UPDATE ... CASE
+statement per table, inside the transaction of the current request.
+"""
+import sqlite3
+from collections import defaultdict
+
+from otree.api import cu
+from sqlalchemy import case, literal
+from sqlalchemy.orm import object_session
+from sqlalchemy.orm.attributes import set_committed_value
+
+# SQLite before 3.32 only allows 999 bind parameters per statement
+if sqlite3.sqlite_version_info < (3, 32, 0):
+    MAX_BIND_PARAMS = 999
+else:
+    MAX_BIND_PARAMS = 30000
+
+
+def bulk_update(session, table, rows):
+    """
+    Write {pk: {column: value}} to table with as few UPDATE statements as possible
+    (one, unless the number of bind parameters would exceed MAX_BIND_PARAMS).
+    Returns the number of statements executed.
+    """
+    if not rows:
+        return 0
+
+    columns = sorted({col for values in rows.values() for col in values})
+    per_row = 1 + 2 * len(columns)  # id IN (...) plus WHEN/THEN per column
+    chunk_size = max(MAX_BIND_PARAMS // per_row, 1)
+
+    pks = list(rows)
+    statements = 0
+    for start in range(0, len(pks), chunk_size):
+        chunk = pks[start:start + chunk_size]
+        values = {}
+        for col in columns:
+            column = table.c[col]
+            whens = {
+                pk: literal(rows[pk][col], type_=column.type)
+                for pk in chunk
+                if col in rows[pk]
+            }
+            values[col] = case(whens, value=table.c.id, else_=column)
+        session.execute(table.update().where(table.c.id.in_(chunk)).values(values))
+        statements += 1
+    return statements
+
+
+class RoundWrites:
+    """
+    Collects field values for players, participants and groups while a round
+    is being closed. Values are also set on the loaded objects (without marking
+    them dirty), so the rest of the request sees what was written.
+    """
+
+    def __init__(self):
+        self.rows = defaultdict(dict)  # model class -> {obj: {column: value}}
+
+    def set(self, obj, field, value):
+        self.rows[type(obj)].setdefault(obj, {})[field] = value
+
+    def set_payoff(self, player, value):
+        """
+        Bulk equivalent of player.payoff = value: updates the player's payoff
+        and moves participant.payoff by the same delta.
+        """
+        value = cu(value)
+        participant = player.participant
+        old_player = self.rows[type(player)].get(player, {}).get("_payoff", player.payoff)
+        old_participant = self.rows[type(participant)].get(participant, {}).get(
+            "payoff", participant.payoff
+        )
+        self.set(participant, "payoff", old_participant + value - old_player)
+        self.set(player, "_payoff", value)
+
+    def flush(self):
+        statements = 0
+        for model, objs in self.rows.items():
+            if not objs:
+                continue
+            session = object_session(next(iter(objs)))
+            statements += bulk_update(
+                session,
+                model.__table__,
+                {obj.id: values for obj, values in objs.items()},
+            )
+            for obj, values in objs.items():
+                for field, value in values.items():
+                    set_committed_value(obj, field, value)
+        self.rows.clear()
+        return statements
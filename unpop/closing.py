@@ -0,0 +1,227 @@
+"""
+The computation of a round close, and running it in a worker (session config field
+round_close_worker = "thread" or "process").
+
+oTree serves page requests, wait page reloads and live messages of all sessions of a
+process one at a time, behind one lock (otree.middleware.lock2), so whatever the round
+close does inside a request holds up every other session of the process meanwhile.
+Group.set_first_stage_earnings therefore works in three steps:
+    Group.round_inputs          reads the round (two queries, see prefetch.py) into plain data
+    compute_round               autoplays the dropouts, computes payoffs and round aggregates,
+                                without touching oTree or the database
+    Group.write_round_result    writes all of it in bulk, in the current transaction
+
+With round_close_worker set, the last player to reach the ResultsWaitPage only reads the
+round and hands compute_round to a thread or process pool; the group's wait page counts as
+complete once the result is there. Meanwhile the wait pages of the group reload every
+RELOAD_SECONDS instead of every 10 seconds, and the first reload that finds the result
+writes it, in its own transaction together with the completion of the wait page, and
+releases everyone as usual (oTree's websocket message, sent inside the request). The pool
+itself does not notify the pages: its threads run outside the request lock and the
+server's event loop, which the websockets belong to. Reading and writing the round stay
+inside a request: oTree has a single database connection. A process pool also keeps the
+computation out of the server process's interpreter lock, at the cost of an oTree import
+per worker process. Live rounds (live.py) always close inline.
+
+Which computations are running is kept in the memory of the server process (see
+deploy/multiserver.py). After a restart, or if the computation failed, the next reload of
+a wait page starts it again or closes the round inline.
+"""
+import concurrent.futures
+import logging
+
+from shared.payoffs import MAJORITY, MINORITY, compute_utility
+
+from .layout import round_state
+from .network import load_network
+
+logger = logging.getLogger(__name__)
+
+_pools = {}  # "thread" / "process" -> executor
+_futures = {}  # group id -> future of its compute_round
+
+RELOAD_SECONDS = 1  # how often the wait pages reload while the round close is in a worker
+
+
+class RoundInputs:
+    """what compute_round needs to know about a round: plain data, per player in the order added"""
+
+    def __init__(self, round_number, network, strategy, dropout_seed, session_code):
+        self.round_number = round_number
+        self.network = network  # session.vars["network"]: condition and digest
+        self.strategy = strategy  # session config fields dropout_strategy and dropout_seed
+        self.dropout_seed = dropout_seed
+        self.session_code = session_code
+        self.player_ids = []
+        self.nodes = []
+        self.roles = []
+        self.choices = []
+        self.previous_choices = []
+        self.is_dropout = []
+        self.autoplayed = []
+        self.exit_early = []
+        self.failed_checks = []
+        self.recorded = []  # the recorded autoplay choice, when the session replays an event log
+
+    def add(self, player_id, node, role, choice, previous_choice, is_dropout, autoplayed, exit_early, failed_checks, recorded):
+        self.player_ids.append(player_id)
+        self.nodes.append(node)
+        self.roles.append(role)
+        self.choices.append(choice)
+        self.previous_choices.append(previous_choice)
+        self.is_dropout.append(is_dropout)
+        self.autoplayed.append(autoplayed)
+        self.exit_early.append(exit_early)
+        self.failed_checks.append(failed_checks)
+        self.recorded.append(recorded)
+
+
+class RoundResult:
+    """what compute_round returns, by player id"""
+
+    def __init__(self, inputs, autoplay, payoffs, aggregates, neighbor_counts):
+        self.inputs = inputs  # the RoundInputs it was computed from
+        self.autoplay = autoplay  # player id -> choice of an autoplayed dropout
+        self.payoffs = payoffs  # player id -> payoff (not for those who exited early: 0)
+        self.aggregates = aggregates  # Group field -> value
+        self.neighbor_counts = neighbor_counts  # player id -> (playing neighbors, of which Blue), see analytics.py
+
+
+def compute_round(inputs):
+    """the RoundResult of RoundInputs; runs in the request or in a worker"""
+    network = load_network(inputs.network["condition"])
+    if network.digest != inputs.network["digest"]:
+        raise RuntimeError(f"network {inputs.network['condition']} changed since the session was created")
+    network = network.at_round(inputs.round_number)
+    players = range(len(inputs.player_ids))
+    playing = [not inputs.exit_early[i] and not inputs.failed_checks[i] for i in players]
+
+    # dropouts are autoplayed all at once with the session's dropout strategy (see strategies.py)
+    choices = list(inputs.choices)
+    autoplay = {}
+    dropouts = [i for i in players if (inputs.is_dropout[i] or inputs.autoplayed[i]) and playing[i]]
+    if dropouts:
+        import numpy as np
+
+        from .strategies import choose_for_dropouts, session_seed
+
+        is_minority = np.zeros(len(network.degree), dtype=bool)
+        previous_choice = np.full(len(network.degree), -1, dtype=np.int8)
+        for i in players:
+            is_minority[inputs.nodes[i]] = inputs.roles[i] == MINORITY
+            if inputs.previous_choices[i] is not None:
+                previous_choice[inputs.nodes[i]] = inputs.previous_choices[i]
+        strategy_choices = choose_for_dropouts(
+            inputs.strategy,
+            session_seed(inputs.dropout_seed, inputs.session_code),
+            inputs.round_number,
+            network,
+            [inputs.nodes[i] for i in dropouts],
+            is_minority,
+            previous_choice,
+        ).tolist()
+        for i, choice in zip(dropouts, strategy_choices):
+            choices[i] = choice if inputs.recorded[i] is None else inputs.recorded[i]
+            autoplay[inputs.player_ids[i]] = choices[i]
+
+    by_node = {node: i for i, node in enumerate(inputs.nodes)}
+    payoffs = {}
+    neighbor_counts = {}
+    for i in players:
+        if inputs.exit_early[i]:
+            continue
+        neighbor_choices = [
+            choices[by_node[j]] for j in network.neighbors[inputs.nodes[i]] if playing[by_node[j]]
+        ]
+        payoffs[i] = max(compute_utility(choices[i], inputs.roles[i], neighbor_choices), 0)
+        neighbor_counts[inputs.player_ids[i]] = (len(neighbor_choices), neighbor_choices.count(True))
+
+    aggregates = round_aggregates(inputs, choices, payoffs)
+    # the colors of the nodes in the admin report's network view (see layout.py)
+    aggregates["network_state"] = round_state(
+        len(network.degree),
+        inputs.nodes,
+        choices,
+        [inputs.player_ids[i] in autoplay for i in players],
+        playing,
+    )
+    return RoundResult(
+        inputs, autoplay, {inputs.player_ids[i]: payoff for i, payoff in payoffs.items()}, aggregates, neighbor_counts
+    )
+
+
+def round_aggregates(inputs, choices, payoffs):
+    """blue share by role, active/dropout counts, mean payoff and majority switchers of this round"""
+    counted = [i for i in payoffs if not inputs.failed_checks[i]]
+
+    def blue_share(role):
+        role_choices = [choices[i] for i in counted if inputs.roles[i] == role]
+        return role_choices.count(True) / len(role_choices) if role_choices else None
+
+    num_dropouts = sum(1 for i in counted if inputs.is_dropout[i])
+    return dict(
+        blue_share_majority=blue_share(MAJORITY),
+        blue_share_minority=blue_share(MINORITY),
+        num_active=len(counted) - num_dropouts,
+        num_dropouts=num_dropouts,
+        mean_payoff=sum(float(payoffs[i]) for i in counted) / len(counted) if counted else 0,
+        majority_switchers=sum(
+            1 for i in counted
+            if inputs.roles[i] == MAJORITY
+            and inputs.previous_choices[i] is not None
+            and choices[i] is not None
+            and inputs.previous_choices[i] != choices[i]
+        ),
+    )
+
+
+def worker(session):
+    """the pool the session closes its rounds in: "thread", "process", or None (inline)"""
+    kind = session.config.get("round_close_worker") or None
+    if kind not in (None, "thread", "process"):
+        raise ValueError(f"unknown round_close_worker {kind!r}, choose from 'thread', 'process'")
+    return kind
+
+
+def _pool(kind):
+    pool = _pools.get(kind)
+    if pool is None:
+        if kind == "process":
+            pool = concurrent.futures.ProcessPoolExecutor()
+        else:
+            pool = concurrent.futures.ThreadPoolExecutor(thread_name_prefix="round_close")
+        _pools[kind] = pool
+    return pool
+
+
+def computed(group):
+    """
+    True once the round of group can be closed in this request. The first call reads the
+    round and starts compute_round in the session's pool.
+    """
+    future = _futures.get(group.id)
+    if future is None:
+        future = _pool(worker(group.session)).submit(compute_round, group.round_inputs())
+        _futures[group.id] = future
+        logger.debug(f"[R{group.round_number:02d}] round close of group {group.id} started in a worker")
+    return future.done()
+
+
+def started(group):
+    """the round close of group is in a worker"""
+    return group.id in _futures
+
+
+def close(group):
+    """close the round of group, with the result of the worker if there is one"""
+    future = _futures.pop(group.id, None)
+    if future is None:
+        group.set_first_stage_earnings()
+        return
+    try:
+        result = future.result()
+    except Exception:
+        logger.exception(f"[R{group.round_number:02d}] round close of group {group.id} failed in the worker, closing it inline")
+        group.set_first_stage_earnings()
+        return
+    group.write_round_result(result)
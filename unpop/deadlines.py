@@ -0,0 +1,120 @@
+"""
+Quorum-based round deadlines (session config adaptive_deadlines=True).
+
+Without them every round lasts until the slowest participant decides or hits the
+60 second timeout. With them:
+- once a quorum (share of the players in the network) has submitted the DecisionPage,
+  everybody who has not decided yet gets a grace window of grace_seconds; when it
+  expires, the page is submitted for them and their choice is autoplayed with the
+  dropout rules for this round only (they are not marked as dropouts);
+- the personal decision deadline shrinks with the participant's own response times:
+  response_time_factor x their slowest of the last few decisions, but never below
+  min_decision_seconds. Missing a deadline shorter than the full timeout is treated like
+  the grace window: the choice is autoplayed for this round only, and the participant's
+  response times are forgotten, so their next rounds get the full timeout again.
+Only missing the full timeout marks a dropout, as before.
+"""
+import time
+
+import otree.common
+import otree.tasks
+
+from .network import session_network
+from .prefetch import read_vars, round_rows
+
+RESPONSE_TIMES_KEPT = 5
+MIN_RESPONSE_TIMES = 3  # before that, the full timeout applies
+
+
+def personal_deadline(participant, config, full_timeout):
+    times = participant.vars.get("response_times", [])
+    if len(times) < MIN_RESPONSE_TIMES:
+        return full_timeout
+    deadline = config["response_time_factor"] * max(times)
+    return min(full_timeout, max(config["min_decision_seconds"], deadline))
+
+
+def decision_timeout(player, full_timeout):
+    """timeout of the DecisionPage, evaluated when the page is first shown"""
+    config = player.session.config
+    player.decision_shown_at = time.time()
+    quorum_reached_at = player.group.field_maybe_none("quorum_reached_at")
+    if quorum_reached_at is not None:
+        # arriving after the quorum: only what is left of the grace window
+        player.grace_deadline = True
+        return max(config["grace_seconds"] - (time.time() - quorum_reached_at), 1)
+    deadline = personal_deadline(player.participant, config, full_timeout)
+    player.shortened_deadline = deadline < full_timeout
+    return deadline
+
+
+def missed_deadline(player):
+    """
+    the page timed out on a deadline shorter than the full timeout (the grace window or a
+    personal deadline): autoplay this round only, without marking a dropout
+    """
+    if not player.grace_deadline and not player.shortened_deadline:
+        return False
+    player.autoplayed = True
+    if player.shortened_deadline:
+        # until they have decided in time again, the full timeout applies
+        player.participant.vars["response_times"] = []
+    return True
+
+
+def record_response_time(player, timeout_happened):
+    shown_at = player.field_maybe_none("decision_shown_at")
+    if timeout_happened or shown_at is None:
+        return
+    participant = player.participant
+    times = participant.vars.get("response_times", [])[-(RESPONSE_TIMES_KEPT - 1):]
+    participant.vars["response_times"] = times + [round(time.time() - shown_at, 1)]
+
+
+def register_decision(player):
+    """
+    Count this player's submission. When it completes the quorum, shorten the
+    deadline of everyone still on this DecisionPage to the grace window.
+    Players who reach the page later get it from decision_timeout.
+    Returns True if this submission completed the quorum.
+    """
+    group = player.group
+    config = player.session.config
+    group.num_decided += 1
+    if group.field_maybe_none("quorum_reached_at") is not None:
+        return False
+
+    # every node of the network is one playing participant (or a bot, which never decides),
+    # no need to load the group for this
+    humans = len(session_network(player.session)) - player.session.vars.get("num_bots", 0)
+    if group.num_decided < config["quorum"] * humans:
+        return False
+
+    group.quorum_reached_at = time.time()
+    page_index = player.participant._index_in_pages
+    for p in round_rows(group).playing():
+        participant = p.participant
+        if p.id == player.id or participant._index_in_pages != page_index or read_vars(participant)["is_dropout"]:
+            continue
+        if shorten_timeout(participant, config["grace_seconds"]):
+            p.grace_deadline = True
+    return True
+
+
+def shorten_timeout(participant, seconds):
+    """
+    let the page the participant is on time out in `seconds`, unless its timeout expires
+    sooner anyway; True if the timeout was shortened
+    """
+    page_index = participant._index_in_pages
+    if participant._timeout_page_index != page_index:
+        return False
+    expiration = time.time() + seconds
+    if participant._timeout_expiration_time is not None and participant._timeout_expiration_time <= expiration:
+        return False
+    participant._timeout_expiration_time = expiration
+    if otree.common.USE_TIMEOUT_WORKER:
+        otree.tasks.submit_expired_url(
+            participant_code=participant.code, page_index=page_index, delay=seconds + 2
+        )
+    return True
@@ -0,0 +1,111 @@
+"""
+Heartbeat-based dropout detection (session config field heartbeat_seconds > 0).
+
+Without it, a participant who closes the tab is only noticed when their DecisionPage
+times out, and the whole group waits the full decision timeout for them. With it, the
+game pages (DecisionPage, ResultsPage, LiveRoundPage) send a heartbeat over their live
+connection every heartbeat_seconds (_static/global/heartbeat.js), and page loads count
+as well (without heartbeats, the DecisionPage and ResultsPage open no live connection).
+Every heartbeat, and every reload of the ResultsWaitPage (where those who have decided
+wait), checks the sender's group, at most once per heartbeat interval per group: a
+participant on one of these pages who has not been heard of for heartbeat_silence_seconds
+is marked a dropout, and the page they are on is made to time out right away, so their
+node is autoplayed from this round on, as after a timeout.
+
+Last-seen times are kept in the memory of the server process (see deploy/multiserver.py),
+so heartbeats cost no database writes. A participant who has not been seen since the
+server started is never marked: the page timeout still applies.
+Participants on wait pages send no heartbeats and are not checked; they have decided.
+The times are kept per session and forgotten when the rounds close (round_closed): a
+round's group when it closes, the whole session when its last round closes, after which
+heartbeats are ignored.
+"""
+import logging
+import time
+
+from shared.events import log_event
+
+from .deadlines import shorten_timeout
+from .prefetch import read_vars, round_rows
+
+HEARTBEAT_PAGES = ("DecisionPage", "ResultsPage", "LiveRoundPage")
+
+logger = logging.getLogger(__name__)
+
+_last_seen = {}  # session code -> {participant code: time of the last heartbeat or page load}
+_last_check = {}  # session code -> {group id: time of the last check}
+
+
+def interval(session):
+    """seconds between heartbeats (0: off)"""
+    return session.config.get("heartbeat_seconds") or 0
+
+
+def _game_over(player):
+    """the session's last round has closed: nobody is checked any more"""
+    from . import Constants
+
+    group = player.group
+    if group.live_round > Constants.num_rounds:  # live rounds (live.py): player is the round-1 player
+        return True
+    return player.round_number == Constants.num_rounds and group.field_maybe_none("closed_at") is not None
+
+
+def seen(player):
+    if interval(player.session) and not _game_over(player):
+        _last_seen.setdefault(player.session.code, {})[player.participant.code] = time.time()
+
+
+def check_group(player):
+    """mark the silent participants of player's group as dropouts; returns them"""
+    config = player.session.config
+    group = player.group
+    now = time.time()
+    if not interval(player.session) or _game_over(player):
+        return []
+    last_check = _last_check.setdefault(player.session.code, {})
+    if now - last_check.get(group.id, 0) < interval(player.session):
+        return []
+    last_check[group.id] = now
+
+    last_seen_by_code = _last_seen.get(player.session.code, {})
+    silent = []
+    for p in round_rows(group).playing():
+        participant = p.participant
+        last_seen = last_seen_by_code.get(participant.code)
+        if (
+            read_vars(participant)["is_dropout"]
+            or participant._current_page_name not in HEARTBEAT_PAGES
+            or last_seen is None
+            or now - last_seen < config["heartbeat_silence_seconds"]
+        ):
+            continue
+        participant.is_dropout = True
+        p.is_dropout = True
+        log_event(p, "dropout", silent_seconds=round(now - last_seen, 1))
+        logger.info(
+            f"[R{p.round_number:02d}] P{p.id_in_group} ({participant.label}) | "
+            f"MARKED DROPOUT (no heartbeat for {now - last_seen:.0f} s)"
+        )
+        shorten_timeout(participant, 1)
+        silent.append(p)
+    return silent
+
+
+def round_closed(group):
+    """forget the closed round's group; when the last round closes, the whole session"""
+    from . import Constants
+
+    session_code = group.session.code
+    if group.round_number == Constants.num_rounds:
+        _last_seen.pop(session_code, None)
+        _last_check.pop(session_code, None)
+    else:
+        _last_check.get(session_code, {}).pop(group.id, None)
+
+
+def live_method(player, data):
+    """live_method of the pages that only send heartbeats"""
+    if interval(player.session):
+        seen(player)
+        check_group(player)
@@ -0,0 +1,141 @@
+"""
+The network view of the admin report: a layout per network file, and a state per round.
+
+Laying out a network of hundreds or thousands of nodes takes seconds, so it is done once
+per network file, in a thread started by the first admin report that needs it: the
+positions and the edges are written to _static/network_layouts/<network hash>.json, which
+every process and restart reuses (the hash is that of the network file's content,
+network.digest, so a changed file gets a new layout and never a stale one) and which
+browsers cache. The edges are those of the network
+file; rewiring (network.py) does not move nodes, and the view does not show it.
+
+What changes per round is a string with one character per node (STATES), computed at round
+close with the payoffs (closing.compute_round) and stored on the Group (network_state). The
+admin report sends the string of the round it shows, a byte per node, and draws it on the
+cached layout (_static/global/network_view.js).
+"""
+import json
+import math
+import os
+import threading
+
+layout_dir = os.path.join("_static", "network_layouts")
+
+_threads = {}  # network hash -> thread computing its layout
+_lock = threading.Lock()
+
+# one character per node in Group.network_state
+STATES = dict(
+    red="r",
+    blue="b",
+    red_autoplayed="R",  # a dropout's or a missed deadline's choice, made by the dropout strategy
+    blue_autoplayed="B",
+    undecided="-",
+    out="x",  # left before the network was formed, failed the comprehension check, or no participant
+)
+
+
+def round_state(num_nodes, nodes, choices, autoplayed, playing):
+    """the network_state of a round: per node, its player's choice this round (lists per player)"""
+    state = [STATES["out"]] * num_nodes
+    for node, choice, is_autoplayed, is_playing in zip(nodes, choices, autoplayed, playing):
+        if not is_playing:
+            continue
+        if choice is None:
+            state[node] = STATES["undecided"]
+        elif is_autoplayed:
+            state[node] = STATES["blue_autoplayed"] if choice else STATES["red_autoplayed"]
+        else:
+            state[node] = STATES["blue"] if choice else STATES["red"]
+    return "".join(state)
+
+
+def compute_layout(network, iterations=60, max_repelling=1500):
+    """
+    positions of the nodes in [0, 1] x [0, 1] (Fruchterman-Reingold, seeded by the network
+    hash so every process computes the same), as two lists x and y. In networks of more than
+    max_repelling nodes, a node is repelled by a random sample of that many nodes per
+    iteration instead of by all of them, which keeps large networks at seconds.
+    """
+    import numpy as np
+
+    n = len(network)
+    rng = np.random.default_rng(int(network.digest, 16))
+    pos = rng.random((n, 2))
+    if n < 2:
+        return pos[:, 0].tolist(), pos[:, 1].tolist()
+
+    indices, indptr, rows = network.at_round(1).csr()
+    k = math.sqrt(1 / n)  # the ideal distance between nodes
+    temperature = 0.1
+    cooling = temperature / (iterations + 1)
+    for _ in range(iterations):
+        # every pair of nodes repels (k^2 / distance) ...
+        others = pos if n <= max_repelling else pos[rng.choice(n, max_repelling, replace=False)]
+        weight = k * k * n / len(others)
+        displacement = np.zeros((n, 2))
+        block = max(1, 2_000_000 // len(others))  # rows of the repulsion matrix at a time
+        for start in range(0, n, block):
+            dx = pos[start:start + block, 0, None] - others[None, :, 0]
+            dy = pos[start:start + block, 1, None] - others[None, :, 1]
+            force = weight / np.maximum(dx * dx + dy * dy, 1e-9)
+            displacement[start:start + block, 0] += (dx * force).sum(axis=1)
+            displacement[start:start + block, 1] += (dy * force).sum(axis=1)
+        # ... and neighbors attract (distance^2 / k; every edge is in the lists of both ends)
+        delta = pos[rows] - pos[indices]
+        distance = np.sqrt(np.einsum("ij,ij->i", delta, delta))
+        attraction = delta * (distance / k)[:, None]
+        displacement[:, 0] -= np.bincount(rows, attraction[:, 0], minlength=n)
+        displacement[:, 1] -= np.bincount(rows, attraction[:, 1], minlength=n)
+        length = np.maximum(np.sqrt(np.einsum("ij,ij->i", displacement, displacement)), 1e-9)
+        pos += displacement * (np.minimum(length, temperature) / length)[:, None]
+        np.clip(pos, 0, 1, out=pos)  # the frame keeps unconnected parts in view
+        temperature -= cooling
+
+    pos -= pos.min(axis=0)
+    pos /= max(pos.max(), 1e-9)
+    return pos[:, 0].tolist(), pos[:, 1].tolist()
+
+
+def layout_path(network):
+    return os.path.join(layout_dir, f"{network.digest}.json")
+
+
+def _write_layout(network):
+    x, y = compute_layout(network)
+    edges = [[i, j] for i, neighbors in enumerate(network.at_round(1).neighbors) for j in neighbors if i < j]
+    path = layout_path(network)
+    os.makedirs(layout_dir, exist_ok=True)
+    # several server processes may write the same file
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        # positions in thousandths of the width and height of the view
+        json.dump(
+            dict(x=[round(1000 * v) for v in x], y=[round(1000 * v) for v in y], edges=edges),
+            f,
+            separators=(",", ":"),
+        )
+    os.replace(tmp, path)
+
+
+def layout_url(network, wait=1):
+    """
+    the URL of the network's layout file; the first time, the layout is computed in a thread
+    (so other requests go on meanwhile) and this returns None if it takes longer than wait seconds
+    """
+    if not os.path.exists(layout_path(network)):
+        with _lock:
+            thread = _threads.get(network.digest)
+            if thread is None:
+                thread = _threads[network.digest] = threading.Thread(
+                    target=_write_layout, args=(network,), name="network_layout", daemon=True
+                )
+                thread.start()
+        thread.join(wait)
+        if thread.is_alive():
+            return None
+        if not os.path.exists(layout_path(network)):
+            # it failed (the thread printed the error): try again on the next call
+            _threads.pop(network.digest, None)
+            return None
+    return f"/static/network_layouts/{network.digest}.json"
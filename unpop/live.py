@@ -0,0 +1,232 @@
+"""
+Live rounds: all rounds on one page (session config field live_rounds=True).
+
+Instead of a DecisionPage, ResultsWaitPage and ResultsPage per round, participants stay
+on LiveRoundPage (shown in round 1) and play every round over its live_method:
+    client -> {"type": "load"}                        on (re)connect: the current state
+    client -> {"type": "choice", "round": r, "choice": true|false}
+    client -> {"type": "tick"}                        the round deadline passed on the client
+    client -> {"type": "heartbeat"}                   see heartbeat.py
+    server -> {"type": "state", ...}                  round, seconds left, degree, payoff rows, history
+    server -> {"type": "result", ...}                 pushed to the whole group at round close:
+                                                      own choice and payoff, neighbor choices, next round
+A round closes as soon as every playing participant who is not a dropout has chosen, or
+at the first message after its deadline (decision_pages_timeout_seconds after the round
+opened); whoever has not chosen by then is marked a dropout, as on the DecisionPage.
+Closing runs the same Group.set_first_stage_earnings as the ResultsWaitPage, on the round's
+own Group and Player rows, so payoffs, round aggregates, timing and exports are unchanged.
+The per-round pages are skipped, so after the last round oTree moves straight through the
+remaining rounds to FinalGameResults.
+
+The round being played is kept on the round-1 Group (live_round), the time a round opened
+on that round's Group (opened_at). Round 1 opens when the first player loads the page.
+Who has yet to choose in the current round is also kept in the memory of the server
+process (see deploy/multiserver.py), per round-1 Group and
+forgotten when the round closes (and the session, when its last round closes), so that a
+choice does not load the whole group to find out whether it was the last one; the group
+is only read again to close the round.
+Adaptive deadlines (deadlines.py) and round_close_worker (closing.py) do not apply in this
+mode: a round closes in the live message that completes it.
+"""
+import time
+
+from shared.events import log_event, log_submit
+from shared.payoff_tables import payoff_table_vars
+
+from . import heartbeat
+from .bulk import RoundWrites
+from .network import session_network
+from .prefetch import is_playing, neighborhood_rows, read_vars, round_rows
+
+_pending = {}  # session code -> {round-1 group id: ids of the participants who have yet to choose in the open round}
+
+
+def enabled(session):
+    return bool(session.config.get("live_rounds"))
+
+
+def _deadline(group):
+    from . import Constants
+
+    return group.opened_at + Constants.decision_pages_timeout_seconds
+
+
+def _round_vars(participant, group):
+    """what the client needs to show the decision of group's round (None: the game is over)"""
+    if group is None:
+        return dict(round=None)
+    network = session_network(group.session).at_round(group.round_number)
+    participant_vars = read_vars(participant)
+    degree = int(network.degree[participant_vars["node"]])
+    return dict(
+        round=group.round_number,
+        seconds_left=max(int(_deadline(group) - time.time()), 0),
+        degree=degree,
+        **payoff_table_vars(group.session, participant_vars["role"], degree),
+    )
+
+
+def _group_in_round(player, round_number):
+    from . import Constants
+
+    if round_number > Constants.num_rounds:
+        return None
+    return player.group.in_round(round_number)
+
+
+def state(player):
+    """the full state for a client that (re)loads the page; opens round 1 for the first one"""
+    round_number = player.group.live_round
+    if round_number == 1 and player.group.field_maybe_none("opened_at") is None:
+        player.group.opened_at = time.time()
+        log_event(player, "live_open")
+
+    choice = None
+    group = _group_in_round(player, round_number)
+    if group is not None:
+        current = player.in_round(round_number)
+        choice = current.field_maybe_none("choice")
+        if current.field_maybe_none("decision_shown_at") is None:
+            current.decision_shown_at = time.time()
+
+    last_result = None
+    if round_number > 1:
+        previous_player = player.in_round(round_number - 1)
+        network = session_network(player.session).at_round(round_number - 1)
+        last_result = _result(previous_player, neighborhood_rows(previous_player, network))
+    return dict(
+        type="state",
+        choice=choice,
+        last_result=last_result,
+        is_dropout=player.participant.is_dropout,
+        **_round_vars(player.participant, group),
+    )
+
+
+def _submit(player, data):
+    """record the choice of the current round; False if it is not accepted"""
+    group = player.group
+    if data.get("round") != group.live_round or player.participant.is_dropout:
+        return False
+    current = player.in_round(group.live_round)
+    if current.field_maybe_none("choice") is not None:
+        return False
+    now = time.time()
+    current.choice = bool(data.get("choice"))
+    current.decision_submitted_at = now
+    current.wait_arrived_at = now
+    log_submit(current, "LiveRoundPage", False, ["choice"])
+    (_known_pending(player) or set()).discard(player.participant_id)
+    return True
+
+
+def _known_pending(player):
+    """who has yet to choose in the open round of player's (round-1) group, if known"""
+    return _pending.get(player.session.code, {}).get(player.group.id)
+
+
+def _pending_choices(player, group):
+    """who has yet to choose in group, the open round of player's (round-1) group"""
+    pending = _known_pending(player)
+    if pending is None:
+        pending = _pending.setdefault(player.session.code, {})[player.group.id] = {
+            p.participant_id for p in round_rows(group).playing()
+            if not read_vars(p.participant)["is_dropout"] and p.field_maybe_none("choice") is None
+        }
+    return pending
+
+
+def _close_if_done(player):
+    """
+    close the current round if everyone has chosen or its deadline has passed;
+    returns the closed round's Group, or None
+    """
+    from . import Constants, timeout_check
+
+    round_number = player.group.live_round
+    if round_number > Constants.num_rounds:
+        return None
+    group = player.group.in_round(round_number)
+    if _pending_choices(player, group) and time.time() < _deadline(group):
+        return None
+    undecided = [
+        p for p in round_rows(group).playing()
+        if not read_vars(p.participant)["is_dropout"] and p.field_maybe_none("choice") is None
+    ]
+    if undecided:
+        if time.time() < _deadline(group):
+            _pending.setdefault(player.session.code, {})[player.group.id] = {p.participant_id for p in undecided}
+            return None
+        for p in undecided:
+            # as a DecisionPage timeout: submitted (without a choice) at the deadline
+            p.decision_submitted_at = time.time()
+            timeout_check(p, True)
+
+    group.set_first_stage_earnings()
+    player.group.live_round = round_number + 1
+    session_pending = _pending.get(player.session.code, {})
+    session_pending.pop(player.group.id, None)
+    if round_number == Constants.num_rounds and not session_pending:
+        _pending.pop(player.session.code, None)
+    if round_number < Constants.num_rounds:
+        # the next round is shown as soon as the result arrives
+        now = time.time()
+        next_group = group.in_round(round_number + 1)
+        writes = RoundWrites()
+        writes.set(next_group, "opened_at", now)
+        for p in round_rows(next_group).playing():
+            if not read_vars(p.participant)["is_dropout"]:
+                writes.set(p, "decision_shown_at", now)
+        writes.flush()
+    return group
+
+
+def _result(player, rows):
+    """own choice and payoff and the neighbors' choices in player's (closed) round"""
+    network = session_network(player.session).at_round(player.round_number)
+    neighbors = [p.field_maybe_none("choice") for p in rows.neighbors(player, network)]
+    return dict(
+        round=player.round_number,
+        choice=player.field_maybe_none("choice"),
+        payoff=int(player.payoff),
+        neighbors=neighbors,
+        blue=neighbors.count(True),
+        red=neighbors.count(False),
+    )
+
+
+def _results(player, group):
+    """the result message of a closed round for every player of the group, by id_in_group"""
+    rows = round_rows(group)
+    first_round = {p.participant_id: p.id_in_group for p in round_rows(player.group).players}
+    next_group = _group_in_round(player, group.round_number + 1)
+    return {
+        first_round[p.participant_id]: dict(
+            type="result",
+            is_dropout=read_vars(p.participant)["is_dropout"],
+            next=_round_vars(p.participant, next_group),
+            **_result(p, rows),
+        )
+        for p in rows.playing()
+    }
+
+
+def live_method(player, data):
+    """LiveRoundPage.live_method (player: the round-1 player)"""
+    kind = data.get("type")
+    heartbeat.seen(player)
+    if kind == "heartbeat":
+        # silent participants become dropouts, which may be all the round waits for
+        silent = heartbeat.check_group(player)
+        if not silent:
+            return
+        (_known_pending(player) or set()).difference_update(p.participant_id for p in silent)
+    elif kind == "choice":
+        if not (is_playing(player) and _submit(player, data)):
+            return {player.id_in_group: state(player)}
+    elif kind != "tick":
+        return {player.id_in_group: state(player)}
+
+    closed = _close_if_done(player)
+    if closed is not None:
+        return _results(player, closed)
@@ -0,0 +1,104 @@
+"""
+Filling a short lobby with server-side bots.
+
+Without it, group_by_arrival_time_method waits until enough participants of each role
+are on the NetworkFormationWaitPage. With the session config field lobby_deadline_minutes
+(minutes after the first arrival in the lobby) or lobby_min_arrival_rate (arrivals per
+minute over the last lobby_rate_window_minutes), the missing nodes are filled with bots
+once the deadline has passed or arrivals have slowed down, provided at least
+lobby_min_human_share of the network are waiting humans.
+
+Bots are the participants with id_in_session 200-250, which consent keeps for this
+(a session needs that many participants for bots to be available). A bot never makes a
+request: it is started as oTree starts a participant who opens their link (so no human
+gets it), is moved past the last page, where oTree leaves a participant who has finished
+(so the wait pages do not wait for it), and is a dropout from the start, so its choices
+are made at round close by the session's dropout strategy (strategies.py). oTree's own
+page advance (the admin's "advance slowest participants") submits one page at a time and
+would leave a bot on every wait page, which it never reloads.
+Bots are labelled bot<id> and have participant.vars["bot"] = True.
+"""
+import logging
+import time
+
+BOT_IDS = range(200, 251)
+
+logger = logging.getLogger(__name__)
+
+
+def record_arrivals(session, waiting_players):
+    now = time.time()
+    session.vars.setdefault("lobby_opened_at", now)
+    for p in waiting_players:
+        p.participant.vars.setdefault("lobby_arrived_at", now)
+    return now
+
+
+def enabled(session):
+    config = session.config
+    return bool(config.get("lobby_deadline_minutes") or config.get("lobby_min_arrival_rate"))
+
+
+def should_fill(session, waiting_players, network_size):
+    """True if the lobby has waited long enough to fill the missing nodes with bots"""
+    config = session.config
+    deadline = config.get("lobby_deadline_minutes") or 0
+    min_rate = config.get("lobby_min_arrival_rate") or 0
+    now = record_arrivals(session, waiting_players)
+    if not enabled(session):
+        return False
+    if len(waiting_players) < config.get("lobby_min_human_share", 0.5) * network_size:
+        return False
+
+    waited = (now - session.vars["lobby_opened_at"]) / 60
+    if deadline and waited >= deadline:
+        logger.info(f"lobby deadline of {deadline} minutes passed with {len(waiting_players)} waiting")
+        return True
+    window = config.get("lobby_rate_window_minutes", 5)
+    if min_rate and waited >= window:
+        recent = sum(
+            1 for p in waiting_players
+            if p.participant.vars["lobby_arrived_at"] >= now - 60 * window
+        )
+        if recent / window < min_rate:
+            logger.info(f"lobby arrivals dropped to {recent / window:.2f} per minute with {len(waiting_players)} waiting")
+            return True
+    return False
+
+
+def reserve_bots(subsession, shortage):
+    """
+    players of unused reserved participants for the missing nodes ({role: count}),
+    with their role set; [] if there are not enough of them
+    """
+    needed = sum(shortage.values())
+    available = [
+        p for p in subsession.get_players()
+        if p.participant.id_in_session in BOT_IDS and not p.participant.visited
+    ][:needed]
+    if len(available) < needed:
+        logger.warning(
+            f"lobby: {needed} bots needed but only {len(available)} unused participants "
+            f"with id_in_session {BOT_IDS.start}-{BOT_IDS.stop - 1} in this session"
+        )
+        return []
+
+    bots = []
+    for role, count in shortage.items():
+        for p in available[len(bots):len(bots) + count]:
+            participant = p.participant
+            participant.initialize(f"bot{participant.id_in_session}")
+            participant.role = role
+            participant.consent = True
+            participant.vars["bot"] = True
+            bots.append(p)
+    return bots
+
+
+def start_bots(bots):
+    """after the nodes are assigned: bots skip every page and are autoplayed as dropouts"""
+    for p in bots:
+        participant = p.participant
+        participant.is_dropout = True
+        participant._index_in_pages = participant._max_page_index + 1
+        logger.info(f"lobby: bot {participant.label} ({participant.role}) takes node {participant.node}")
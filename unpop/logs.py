@@ -0,0 +1,39 @@
+"""
+The log file of the unpop app (otree_log/otree_log_<time the process started>.txt).
+
+The file and the otree_log folder are only created when the first record is written, so
+importing the app (server start, otree test, the benchmarks) touches no files. The
+modules of the app log to their own loggers (unpop.<module>), which end up here.
+"""
+import datetime
+import logging
+import os
+
+log_dir = "otree_log"
+
+
+class LazyFileHandler(logging.FileHandler):
+    """FileHandler that creates its folder and opens its file on the first record"""
+
+    def __init__(self, filename):
+        super().__init__(filename, encoding="utf-8", delay=True)
+
+    def _open(self):
+        os.makedirs(os.path.dirname(self.baseFilename), exist_ok=True)
+        return super()._open()
+
+
+def setup(logger):
+    logger.setLevel(logging.INFO)
+    if logger.handlers:
+        return
+    handler = LazyFileHandler(
+        os.path.join(log_dir, f"otree_log_{datetime.datetime.now():%Y-%m-%d_%H-%M-%S}.txt")
+    )
+    handler.setFormatter(
+        logging.Formatter(
+            "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
+    )
+    logger.addHandler(handler)
@@ -0,0 +1,201 @@
+"""
+Networks shared by all sessions of a server process.
+
+A session only stores a reference to its network in session.vars["network"]
+(the network condition and a hash of the network file), and a participant only
+stores its node. The adjacency itself is loaded once per process and kept here,
+so neither session.vars nor participant.vars grow with the size of the network,
+and nothing of it gets re-pickled when a session or participant is saved.
+
+A network file can make the network change between rounds with a "rewiring" entry,
+either a schedule of edge changes per round:
+    "rewiring": {"schedule": {"5": {"remove": [[0, 1]], "add": [[0, 2]]}}}
+or a seeded rule that rewires a fraction of the edges every round (one end of each
+picked edge moves to a random node; the number of edges stays the same):
+    "rewiring": {"fraction": 0.1, "seed": 7}
+The neighborhood of round r is derived from that of round r-1 by applying only the
+changed edges, once per process, and is the same in every process and session.
+
+Large networks are stored sparse, as an edge list instead of the adjacency matrix:
+    {"edges": [[0, 1], [0, 5], ...], "role_vector": [...]}
+(each undirected edge once; the number of nodes is the length of role_vector).
+analysis/tipping_points.py --random N --save <condition> writes such a file.
+"""
+import hashlib
+import json
+import os
+import random
+import threading
+from functools import lru_cache
+
+network_dir = "networks"
+
+
+class NetworkRound:
+    """neighbors and degrees of the nodes in one round"""
+
+    def __init__(self, neighbors, degree, added=(), removed=()):
+        self.neighbors = neighbors
+        self.degree = degree
+        self.added = added
+        self.removed = removed
+        self._csr = None
+
+    def csr(self):
+        """
+        the neighbor lists as NumPy arrays (built once per round): indices, indptr
+        (node i's neighbors are indices[indptr[i]:indptr[i + 1]]) and rows (the node
+        each entry of indices belongs to), for aggregating over neighbors with bincount
+        """
+        if self._csr is None:
+            import numpy as np
+
+            degree = np.asarray(self.degree, dtype=np.int64)
+            indptr = np.zeros(len(degree) + 1, dtype=np.int64)
+            np.cumsum(degree, out=indptr[1:])
+            indices = np.fromiter(
+                (j for neighbors in self.neighbors for j in neighbors), dtype=np.int64, count=int(indptr[-1])
+            )
+            rows = np.repeat(np.arange(len(degree)), degree)
+            self._csr = indices, indptr, rows
+        return self._csr
+
+
+class Network:
+    """adjacency lists, degrees and roles of a network file (read-only, shared)"""
+
+    def __init__(self, neighbors, role_vector, digest, rewiring=None):
+        self.neighbors = neighbors
+        self.degree = [len(neighbors) for neighbors in self.neighbors]
+        self.role_vector = tuple(role_vector)
+        self.digest = digest
+        self.rewiring = rewiring or {}
+        self._rounds = [NetworkRound(self.neighbors, self.degree)]  # index 0 is round 1
+        self._edges = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.role_vector)
+
+    def at_round(self, round_number):
+        """the network as it is in this round (the same object for all players of the round)"""
+        if not self.rewiring:
+            return self._rounds[0]
+        with self._lock:
+            while len(self._rounds) < round_number:
+                self._rounds.append(self._next_round(len(self._rounds) + 1))
+        return self._rounds[round_number - 1]
+
+    def _next_round(self, round_number):
+        current = self._rounds[-1]
+        if "schedule" in self.rewiring:
+            changes = self.rewiring["schedule"].get(str(round_number), {})
+            removed = [tuple(edge) for edge in changes.get("remove", [])]
+            added = [tuple(edge) for edge in changes.get("add", [])]
+        else:
+            removed, added = self._rewire(current, round_number)
+
+        # only the nodes that lose or gain an edge get a new neighbor tuple
+        changed = {}
+        for i, j in removed:
+            for a, b in ((i, j), (j, i)):
+                changed.setdefault(a, set(current.neighbors[a])).discard(b)
+        for i, j in added:
+            for a, b in ((i, j), (j, i)):
+                changed.setdefault(a, set(current.neighbors[a])).add(b)
+        neighbors = list(current.neighbors)
+        degree = list(current.degree)
+        for node, node_neighbors in changed.items():
+            neighbors[node] = tuple(sorted(node_neighbors))
+            degree[node] = len(node_neighbors)
+
+        if self._edges is not None:
+            self._edges.difference_update(_edge(i, j) for i, j in removed)
+            self._edges.update(_edge(i, j) for i, j in added)
+        return NetworkRound(neighbors, degree, tuple(added), tuple(removed))
+
+    def _rewire(self, current, round_number):
+        if self._edges is None:
+            self._edges = {
+                _edge(i, j) for i, node_neighbors in enumerate(current.neighbors) for j in node_neighbors
+            }
+        # seeded per round, so every process computes the same rewiring
+        rng = random.Random(f"{self.rewiring.get('seed', 0)}:{round_number}")
+        edges = sorted(self._edges)
+        picked = rng.sample(edges, round(self.rewiring["fraction"] * len(edges)))
+        n = len(self)
+        removed, added = [], []
+        taken = set(self._edges)
+        for i, j in picked:
+            if rng.random() < 0.5:
+                i, j = j, i
+            # keep i, move the other end to a node i is not connected to yet
+            for _ in range(10 * n):
+                k = rng.randrange(n)
+                if k != i and _edge(i, k) not in taken:
+                    taken.discard(_edge(i, j))
+                    taken.add(_edge(i, k))
+                    removed.append((i, j))
+                    added.append((i, k))
+                    break
+        return removed, added
+
+
+def _neighbors_from_matrix(adj_matrix):
+    return [
+        tuple(j for j, connection in enumerate(row) if connection == 1)
+        for row in adj_matrix
+    ]
+
+
+def _neighbors_from_edges(edges, n):
+    neighbors = [[] for _ in range(n)]
+    for i, j in edges:
+        neighbors[i].append(j)
+        neighbors[j].append(i)
+    return [tuple(sorted(set(node_neighbors))) for node_neighbors in neighbors]
+
+
+def _edge(i, j):
+    return (i, j) if i < j else (j, i)
+
+
+def network_path(condition):
+    return os.path.join(network_dir, f"network_{condition}.json")
+
+
+@lru_cache(maxsize=None)
+def _load(path, mtime):
+    with open(path, "rb") as f:
+        content = f.read()
+    net = json.loads(content)
+    digest = hashlib.sha1(content).hexdigest()[:12]
+    if "edges" in net:
+        neighbors = _neighbors_from_edges(net["edges"], len(net["role_vector"]))
+    else:
+        neighbors = _neighbors_from_matrix(net["adj_matrix"])
+    return Network(neighbors, net["role_vector"], digest, net.get("rewiring"))
+
+
+def load_network(condition):
+    path = network_path(condition)
+    return _load(path, os.path.getmtime(path))
+
+
+def network_ref(condition):
+    """what a session stores about its network"""
+    return dict(condition=condition, digest=load_network(condition).digest)
+
+
+def session_network(session):
+    """the network of this session (None if it has none)"""
+    ref = session.vars.get("network")
+    if not ref:
+        return None
+    network = load_network(ref["condition"])
+    if network.digest != ref["digest"]:
+        raise RuntimeError(
+            f"{network_path(ref['condition'])} changed after session {session.code} was "
+            f"created (hash {network.digest}, session has {ref['digest']})"
+        )
+    return network
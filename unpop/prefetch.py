@@ -0,0 +1,138 @@
+"""
+Group-scoped prefetch of the rows a page or the round close reads.
+
+Looping over group.get_players() and reading p.participant loads the participants one
+by one, and every p.in_round(...) is another query, so a page cost a number of queries
+that grew with the group. round_rows(group) loads the group's players together with
+their participants in one query and, with previous=True, the same participants' players
+of the previous round in one more. Group.set_first_stage_earnings, which needs them
+all, reads the group through it. A page only needs the player's neighborhood:
+neighborhood_rows(player, network) loads just the player and their neighbors (looked up
+by node in node_index, built once per session and process, and kept for the
+MAX_SESSIONS sessions used last), so what a page loads does not grow with the group
+either. Both cost the same number of queries whatever the size of the group
+(benchmarks/query_count.py checks this).
+
+The rows are kept for the rest of the request: they are cached per Group object, and
+oTree loads new objects for every request.
+
+Code that reads the participants of a whole group reads their vars through read_vars:
+oTree marks a participant as changed on every access to participant.vars (and so to the
+PARTICIPANT_FIELDS such as participant.node), and writes every changed participant back
+at the end of the request, which for a round close was every participant of the group.
+"""
+import weakref
+from functools import lru_cache
+
+from sqlalchemy.orm import joinedload
+
+_cache = weakref.WeakKeyDictionary()
+
+MAX_SESSIONS = 32  # node indexes kept per process; more than the sessions a process runs at once
+
+
+def read_vars(participant):
+    """participant.vars for reading only: does not mark the participant as changed"""
+    return participant._vars
+
+
+def is_playing(player):
+    participant_vars = read_vars(player.participant)
+    return not participant_vars.get("exit_early", False) and not participant_vars.get("failed_checks", False)
+
+
+class RoundRows:
+    def __init__(self, players):
+        self.players = players  # ordered by id_in_group
+        self.by_node = {read_vars(p.participant)["node"]: p for p in players}
+        self.previous = None  # participant id -> player of the previous round
+        self.playing_ids = {p.id for p in players if is_playing(p)}
+
+    def playing(self):
+        return [p for p in self.players if p.id in self.playing_ids]
+
+    def neighbors(self, player, network):
+        """the playing players on the nodes next to player's in network"""
+        return [
+            self.by_node[i]
+            for i in network.neighbors[read_vars(player.participant)["node"]]
+            if self.by_node[i].id in self.playing_ids
+        ]
+
+    def previous_choice(self, player):
+        previous = self.previous.get(player.participant_id)
+        return None if previous is None else previous.field_maybe_none("choice")
+
+
+def round_rows(group, previous=False):
+    """the players of group with their participants (and the previous round's players)"""
+    from . import Player
+
+    rows = _cache.get(group)
+    if rows is None:
+        rows = RoundRows(
+            Player.objects_filter(group=group, round_number=group.round_number)
+            .options(joinedload(Player.participant))
+            .order_by(Player.id_in_group)
+            .all()
+        )
+        _cache[group] = rows
+    if previous and rows.previous is None:
+        rows.previous = {}
+        if group.round_number > 1:
+            # a subquery rather than a list of ids, which would not scale with the group
+            members = Player.objects_filter(group=group, round_number=group.round_number).with_entities(Player.participant_id).subquery()
+            rows.previous = {
+                p.participant_id: p
+                for p in Player.objects_filter(
+                    Player.participant_id.in_(members),
+                    round_number=group.round_number - 1,
+                )
+            }
+    return rows
+
+
+def node_index(session):
+    """node -> participant id of a session whose network is populated (nodes never change after that)"""
+    if session.vars.get("group_formed"):
+        return _formed_node_index(session.code)
+    return _read_node_index(session.code)
+
+
+@lru_cache(maxsize=MAX_SESSIONS)
+def _formed_node_index(session_code):
+    return _read_node_index(session_code)
+
+
+def _read_node_index(session_code):
+    from otree.models import Participant
+
+    query = Participant.objects_filter(_session_code=session_code).with_entities(Participant.id, Participant._vars)
+    return {
+        participant_vars["node"]: participant_id
+        for participant_id, participant_vars in query
+        if participant_vars.get("node") is not None
+    }
+
+
+def neighborhood_rows(player, network, previous=False):
+    """like round_rows, but only player and the players on the nodes next to player's in network"""
+    from . import Player
+
+    index = node_index(player.session)
+    participant_ids = [index[i] for i in network.neighbors[player.participant.node]] + [player.participant_id]
+    rows = RoundRows(
+        Player.objects_filter(Player.participant_id.in_(participant_ids), round_number=player.round_number)
+        .options(joinedload(Player.participant))
+        .order_by(Player.id_in_group)
+        .all()
+    )
+    rows.previous = {}
+    if previous and player.round_number > 1:
+        rows.previous = {
+            p.participant_id: p
+            for p in Player.objects_filter(
+                Player.participant_id.in_(participant_ids), round_number=player.round_number - 1
+            )
+        }
+    return rows
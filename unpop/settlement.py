@@ -0,0 +1,96 @@
+"""
+Bonus settlement of a session: every participant's bonus in one pass.
+
+A participant's points (participant.payoff, the sum of their round payoffs) are converted
+to euros with the points_per_euro of their role and clamped between base_payment and
+max_payment; the bonus is what is above base_payment, in whole cents. Bonuses are paid, as on
+FinalGameResults, to the participants who played in the network and neither dropped out
+(is_dropout, which includes failing the comprehension check) nor left before the network
+was formed (exit_early); never to bots (lobby.py).
+
+settle(session) runs when the last round closes (Group.write_round_result), so every
+bonus is stored whether or not the participant clicks through to the end. It reads the
+payoffs and vars of all participants in one query, computes the bonuses with NumPy,
+stores them on the last round's player.bonus in one bulk UPDATE (FinalGameResults only
+shows them) and writes the payout file otree_payouts/bonus_<session code>.csv: a line
+"<participant label>,<bonus>" per participant with a bonus above 0, the format of
+Prolific's bulk bonus payments (the room's participant labels are the Prolific IDs).
+deploy/settle.py settles a session again from the database.
+"""
+import csv
+import logging
+import os
+
+from otree.models import Participant
+
+from settings import (
+    base_payment as BASE_PAYMENT,
+    max_payment as MAX_PAYMENT,
+    points_per_euro_majority as PPE_MAJORITY,
+    points_per_euro_minority as PPE_MINORITY,
+)
+from shared.payoffs import MAJORITY
+
+from .bulk import bulk_update
+
+payout_dir = os.environ.get("OTREE_PAYOUT_DIR", "otree_payouts")
+
+logger = logging.getLogger(__name__)
+
+
+def payout_path(session_code):
+    return os.path.join(payout_dir, f"bonus_{session_code}.csv")
+
+
+def bonuses(points, is_majority):
+    """bonus in euros for arrays of points and roles, in whole cents (half a cent rounds up)"""
+    import numpy as np
+
+    cents = 100 * points / np.where(is_majority, PPE_MAJORITY, PPE_MINORITY)
+    cents = np.floor(np.clip(cents, 100 * BASE_PAYMENT, 100 * MAX_PAYMENT) + 0.5)
+    return (cents - round(100 * BASE_PAYMENT)) / 100
+
+
+def settle(session, path=None):
+    """
+    store the bonus of every participant of session and write the payout file (to path,
+    default payout_path); returns the number of participants paid and the total
+    """
+    import numpy as np
+
+    from . import Constants, Player
+
+    query = (
+        Player.objects_filter(session=session, round_number=Constants.num_rounds)
+        .join(Participant, Player.participant_id == Participant.id)
+        .with_entities(Player.id, Participant.label, Participant.code, Participant.payoff, Participant._vars)
+        .order_by(Participant.id_in_session)
+    )
+    player_ids, payout_ids, points, is_majority, eligible = [], [], [], [], []
+    for player_id, label, code, payoff, participant_vars in query:
+        player_ids.append(player_id)
+        payout_ids.append(label or code)
+        points.append(float(payoff or 0))
+        is_majority.append(participant_vars.get("role") == MAJORITY)
+        eligible.append(
+            participant_vars.get("node") is not None
+            and not participant_vars.get("bot", False)
+            and not participant_vars.get("exit_early", False)
+            and not participant_vars.get("is_dropout", False)
+        )
+    bonus = np.where(eligible, bonuses(np.array(points), np.array(is_majority, dtype=bool)), 0.0).tolist()
+
+    bulk_update(query.session, Player.__table__, {i: {"bonus": value} for i, value in zip(player_ids, bonus)})
+
+    path = path or payout_path(session.code)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        for payout_id, value in zip(payout_ids, bonus):
+            if value > 0:
+                writer.writerow([payout_id, f"{value:.2f}"])
+
+    num_paid = sum(1 for value in bonus if value > 0)
+    total = round(sum(bonus), 2)
+    logger.info(f"session {session.code}: {num_paid} bonuses, total {total:.2f}, written to {path}")
+    return num_paid, total
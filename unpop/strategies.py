@@ -0,0 +1,107 @@
+"""
+Strategies for playing on behalf of dropouts.
+
+The strategy is chosen with the session config field dropout_strategy. At round close,
+the strategy is evaluated once for all dropout nodes together, on NumPy arrays:
+
+    strategy(nodes, state) -> bool array, True = Blue, one entry per node in nodes
+
+state holds the arrays of the whole network: is_minority, previous_choice
+(1 = Blue, 0 = Red, -1 = no choice last round, e.g. in round 1), blue_neighbors and
+red_neighbors (neighbors' choices last round), and the session's random generator rng.
+The generator is seeded with the session (dropout_seed, or the session code)
+and the round number, so a round close always takes the same draws. choose_for_dropouts
+takes plain values rather than the session, so that it also runs in a worker (closing.py).
+
+New strategies are added with the @strategy("name") decorator.
+"""
+import zlib
+
+import numpy as np
+
+from shared.payoffs import S, wstar, zstar
+
+
+STRATEGIES = {}
+
+
+def strategy(name):
+    def register(func):
+        STRATEGIES[name] = func
+        return func
+
+    return register
+
+
+class RoundState:
+    def __init__(self, network_round, is_minority, previous_choice, rng):
+        self.is_minority = is_minority
+        self.previous_choice = previous_choice
+        self.rng = rng
+        indices, indptr, rows = network_round.csr()
+        n = len(is_minority)
+        neighbor_choice = previous_choice[indices]
+        self.blue_neighbors = np.bincount(rows, weights=neighbor_choice == 1, minlength=n)
+        self.red_neighbors = np.bincount(rows, weights=neighbor_choice == 0, minlength=n)
+
+
+def session_seed(dropout_seed, session_code):
+    """the session config field dropout_seed, or one derived from the session code"""
+    return dropout_seed or zlib.crc32(session_code.encode())
+
+
+@strategy("current")
+def current_rule(nodes, state):
+    """minorities choose Blue, majorities choose Blue with probability p_minority"""
+    from . import p_minority
+
+    draws = state.rng.random(len(nodes)) < p_minority
+    return state.is_minority[nodes] | draws
+
+
+@strategy("fixed_preference")
+def fixed_preference(nodes, state):
+    """everybody sticks to their own preference: minorities Blue, majorities Red"""
+    return state.is_minority[nodes].copy()
+
+
+@strategy("imitate_majority")
+def imitate_majority(nodes, state):
+    """the color most neighbors chose last round; own preference on a tie or without information"""
+    blue = state.blue_neighbors[nodes]
+    red = state.red_neighbors[nodes]
+    return np.where(blue == red, state.is_minority[nodes], blue > red)
+
+
+@strategy("best_response")
+def best_response(nodes, state):
+    """
+    the choice with the highest payoff (compute_utility) against the neighbors'
+    choices last round; minorities always get more for Blue (e > 0)
+    """
+    blue = state.blue_neighbors[nodes]
+    red = state.red_neighbors[nodes]
+    observed = blue + red
+    with np.errstate(invalid="ignore", divide="ignore"):
+        p_blue = np.where(observed > 0, blue / observed, 0.0)
+        p_red = np.where(observed > 0, red / observed, 0.0)
+    blue_payoff = zstar(p_blue, exp=np.exp)
+    red_payoff = S + wstar(p_red, exp=np.exp)
+    # without any neighbor information, compute_utility pays s for Red and 0 for Blue
+    blue_payoff = np.where(observed > 0, blue_payoff, 0.0)
+    return state.is_minority[nodes] | (blue_payoff > red_payoff)
+
+
+def choose_for_dropouts(name, seed, round_number, network_round, nodes, is_minority, previous_choice):
+    """
+    choices (True = Blue) of the dropouts at these nodes, with strategy name (the session's
+    dropout_strategy) and the session's seed (session_seed)
+    """
+    name = name or "current"
+    if name not in STRATEGIES:
+        raise ValueError(f"unknown dropout_strategy {name!r}, choose from {sorted(STRATEGIES)}")
+    nodes = np.asarray(nodes, dtype=np.int64)
+    if not len(nodes):
+        return np.zeros(0, dtype=bool)
+    state = RoundState(network_round, is_minority, previous_choice, np.random.default_rng([seed, round_number]))
+    return STRATEGIES[name](nodes, state)
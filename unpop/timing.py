@@ -0,0 +1,100 @@
+"""
+Where the time of a round goes (critical path of a round).
+
+Every player records when their DecisionPage was first shown (decision_shown_at), when
+they submitted it (decision_submitted_at) and when they reached the ResultsWaitPage
+(wait_arrived_at; for the player whose arrival closes the round, the close time). The
+group records when the round was closed (closed_at). A round lasts until its last
+arrival, so the critical path runs through that participant.
+
+For every round, round_timing() names the critical participant, how far the last arrival
+trailed the median one, and how much of that tail was spent waiting for autoplayed
+dropouts (timeouts) rather than for slow humans. With the decision times of the humans,
+this is what the page timeouts and the adaptive deadlines are tuned on.
+
+The timing of a round is computed once, when the round closes (Group.write_round_result),
+and stored in the Group fields named after the keys of round_timing(); the admin report
+only reads the Group rows (session_timing).
+"""
+import statistics
+
+
+def round_timing(records, closed_at):
+    """
+    records: one dict per player of the round with name, shown, submitted, arrived
+    (timestamps, None if missing) and autoplayed (dropout or missed deadline this round);
+    returns the values of the round's timing fields of Group (None: no arrival recorded)
+    """
+    arrivals = sorted((r for r in records if r["arrived"] is not None), key=lambda r: r["arrived"])
+    if not arrivals:
+        return None
+    shown = [r["shown"] for r in arrivals if r["shown"] is not None]
+    start = min(shown) if shown else arrivals[0]["arrived"]
+    median = statistics.median(r["arrived"] for r in arrivals)
+    last = arrivals[-1]
+    humans = [r["arrived"] for r in arrivals if not r["autoplayed"]]
+    last_human = max(humans) if humans else median
+
+    # the tail after the median arrival: up to the last human it is spent waiting for
+    # slow humans, after that for the dropouts the round had to time out
+    human_seconds = max(min(last_human, last["arrived"]) - median, 0)
+    dropout_seconds = max(last["arrived"] - max(last_human, median), 0)
+    timing = dict(
+        critical_participant=last["name"],
+        critical_autoplayed=last["autoplayed"],
+        duration=round((closed_at or last["arrived"]) - start, 1),
+        spread=round(last["arrived"] - median, 1),
+        human_seconds=round(human_seconds, 1),
+        dropout_seconds=round(dropout_seconds, 1),
+    )
+
+    # how long the humans took to decide (timeouts left out)
+    decision_times = [
+        r["submitted"] - r["shown"]
+        for r in records
+        if not r["autoplayed"] and r["shown"] is not None and r["submitted"] is not None
+    ]
+    timing.update(num_decisions=len(decision_times))
+    if decision_times:
+        import numpy as np
+
+        p50, p95 = np.percentile(decision_times, [50, 95])
+        timing.update(
+            decision_p50=round(float(p50), 1),
+            decision_p95=round(float(p95), 1),
+            decision_max=round(max(decision_times), 1),
+        )
+    return timing
+
+
+def session_timing(groups):
+    """
+    per-round timing of the closed rounds and totals for the session, from the
+    session's closed Group rows (the fields written by round_timing at round close)
+    """
+    rounds = [
+        dict(
+            round_number=g.round_number,
+            critical_participant=g.field_maybe_none("critical_participant"),
+            critical_autoplayed=g.critical_autoplayed,
+            duration=g.field_maybe_none("duration"),
+            spread=g.field_maybe_none("spread"),
+            human_seconds=g.field_maybe_none("human_seconds"),
+            dropout_seconds=g.field_maybe_none("dropout_seconds"),
+            num_decisions=g.num_decisions,
+            decision_p50=g.field_maybe_none("decision_p50"),
+            decision_p95=g.field_maybe_none("decision_p95"),
+            decision_max=g.field_maybe_none("decision_max"),
+        )
+        for g in groups
+        if g.field_maybe_none("duration") is not None
+    ]
+    totals = dict(
+        spread=round(sum(r["spread"] for r in rounds), 1),
+        human_seconds=round(sum(r["human_seconds"] for r in rounds), 1),
+        dropout_seconds=round(sum(r["dropout_seconds"] for r in rounds), 1),
+        decisions=sum(r["num_decisions"] for r in rounds),
+    )
+    if totals["decisions"]:
+        totals.update(decision_max=max(r["decision_max"] for r in rounds if r["num_decisions"]))
+    return rounds, totals